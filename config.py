@@ -1,4 +1,6 @@
 import os
+import re
+import json
 
 # =============== БАЗОВЫЙ ПУТЬ ===============
 BASIC_PATH = r'C:\Users\cu-nazarov-na\Desktop\Nipper__доработка'
@@ -39,6 +41,15 @@ SCANNED_DEVICE = '--procurve'
     --nortel-switch  Nortel Ethernet Routing Switch 8300
     --sonicos        SonicWall SonicOS Firewall
 """
+# Формат отчета nipper: 'html' (по умолчанию) или 'xml'.
+# XML разбирается потоковым парсером (xml.etree.iterparse) быстрее и надежнее, чем HTML.
+# NIPPER_FORMAT_OPTIONS - дополнительные аргументы nipper для каждого формата.
+NIPPER_OUTPUT_FORMAT = 'html'
+NIPPER_FORMAT_OPTIONS = {
+    'html': [],
+    'xml': ['--xml'],
+}
+
 # ============================================
 # Настройка логирования
 LOG_LEVEL = 'INFO'
@@ -51,18 +62,82 @@ LOG_BACKUP_COUNT = 5
 # Удаление лишних папок после выполнения скрипта
 CLEANUP_AFTER_SUCCESS = False
 
+# ============================================
+# Рабочая папка в памяти (scratch.py)
+# SCRATCH_DIR - папка на tmpfs (например '/dev/shm/nipper'); '' - выключено.
+# Вывод nipper до сжатия и конфигурации до переименования пишутся туда, а в
+# REPORTS_DIR и CONFIGS_DIR попадают только сохраняемые файлы. Что не помещается
+# в SCRATCH_BUDGET_MB (или в свободное место tmpfs), пишется сразу на диск.
+SCRATCH_DIR = ''
+SCRATCH_BUDGET_MB = 1024
+
+# ============================================
+# Дедупликация конфигураций перед сканированием
+# При DEDUP_CONFIGS = True эквивалентные конфигурации сканируются один раз,
+# а результат распространяется на все хосты группы.
+# Без правил для SCANNED_DEVICE эквивалентными считаются только побайтно одинаковые файлы.
+# Правила - регулярные выражения строк, которые не учитываются при сравнении
+# (комментарии, метки времени), или пары [выражение, замена], применяемые к
+# каждой строке ([r'\s+$', ''] - без пробелов в конце строк). Включайте только
+# проверенные правила: слишком широкое правило склеит разные конфигурации.
+DEDUP_CONFIGS = False
+CONFIG_NORMALIZATION_RULES = {
+    '--procurve': [
+        r'^; .*Configuration Editor; Created on release',   # заголовок с моделью/прошивкой
+        r'^; Ver #',
+        [r'\s+$', ''],                                        # пробелы и CR в конце строк
+    ],
+    '--ios-catalyst': [
+        r'^! Last configuration change at',
+        r'^! NVRAM config last updated at',
+        r'^ntp clock-period',
+        [r'\s+$', ''],
+    ],
+    '--ios-router': [
+        r'^! Last configuration change at',
+        r'^! NVRAM config last updated at',
+        r'^ntp clock-period',
+        [r'\s+$', ''],
+    ],
+}
+
+# ============================================
+# Хранение HTML-отчетов nipper
+# REPORT_COMPRESSION: 'gzip', 'zstd' (нужен пакет zstandard) или None - без сжатия
+# REPORT_DEDUP: одинаковые отчеты хранятся один раз (жесткие ссылки на REPORTS_DIR/.store)
+REPORT_COMPRESSION = 'gzip'
+REPORT_DEDUP = True
+
 # ============================================
 # Создание структуры задач
 CREATE_TASK_STRUCTURE = True
+# Вид структуры задач:
+#   'folders'  - папка на каждую проблему с Excel-файлом и описание.txt
+#   'workbook' - одна книга задачи.xlsx (оглавление и лист на каждую проблему)
+#                и один файл описания.txt: число создаваемых файлов не зависит
+#                от числа проблем, что быстрее на сетевых папках
+TASK_OUTPUT_MODE = 'folders'
 
 # ============================================
 # Настройка режима работы
 FILE_SOURCE_MODE = 'recent_files'
 MAX_FILE_AGE_DAYS = 60
 
-VALID_MODES = ['latest_folder', 'recent_files', 'both']
-if FILE_SOURCE_MODE not in VALID_MODES:
-    raise ValueError(f"Invalid FILE_SOURCE_MODE. Must be one of: {', '.join(VALID_MODES)}")
+# Несколько источников конфигураций (резервные копии разных площадок) за один запуск.
+# Если список пуст, используется один источник NETWORK_DIR с FILE_SOURCE_MODE.
+# Поля источника (кроме path - необязательные):
+#   name           - имя для логов и журнала запуска
+#   path           - папка источника
+#   mode           - 'latest_folder', 'recent_files' или 'both' (по умолчанию FILE_SOURCE_MODE)
+#   max_age_days   - возраст файлов для recent_files/both (по умолчанию MAX_FILE_AGE_DAYS)
+#   max_mb_per_sec - предел скорости копирования из источника, МБ/с (0 - без ограничения)
+#   workers        - потоков копирования из источника (по умолчанию 1)
+# Источники обрабатываются параллельно; конфигурации сводятся по хосту (IP из имени
+# файла), при совпадении берется самая свежая.
+CONFIG_SOURCES = [
+    # {'name': 'msk', 'path': r'\\uni-imc\cfgbak$', 'mode': 'recent_files'},
+    # {'name': 'spb', 'path': r'\\spb-fs\cfgbak$', 'mode': 'latest_folder', 'max_mb_per_sec': 20},
+]
 
 # ============================================
 # Настройка сравнения отчётов
@@ -70,10 +145,139 @@ COMPARE_WITH_PREVIOUS = True
 COMPARISON_REPORT_PREFIX = 'comparison_report'
 REPORT_PREFIX = 'scan_summary'
 
+# Разбиение итогового отчета на части (для тысяч хостов: у листа Excel не больше 16384 колонок)
+#   SUMMARY_SHARD_BY      - None (один файл), 'subnet' (по подсетям) или 'site' (по площадкам)
+#   SUMMARY_SHARD_PREFIX  - длина префикса подсети для 'subnet'
+#   SUMMARY_SITES         - площадки для 'site' в формате PRIORITY_TIERS: {'name': ..., 'hosts': [...]}
+#   SUMMARY_WRITE_WORKERS - процессов для параллельной записи частей
+# Части сохраняются в <REPORT_PREFIX>_<время>_shards/, а <REPORT_PREFIX>_<время>.xlsx
+# становится оглавлением: лист проблем и лист Shards со списком частей.
+SUMMARY_SHARD_BY = None
+SUMMARY_SHARD_PREFIX = 24
+SUMMARY_SITES = []
+SUMMARY_WRITE_WORKERS = 4
+
+# Компактные отпечатки сканирований (битовые маски проблем по хостам).
+# Сравнение выполняется по ним, без открытия Excel-отчетов.
+FINGERPRINT_DIR = os.path.join(FINAL_RESULTS_DIR, 'fingerprints')
+# С чем сравнивать: 'previous' - предыдущий запуск, 'baseline' - зафиксированный эталон,
+# '7d' - запуск не позже 7 дней назад, '20240101' - запуск не позже указанной даты
+COMPARE_AGAINST = 'previous'
+
+# ============================================
+# История сканирований (SQLite-индекс по всем запускам, см. history.py)
+UPDATE_HISTORY = True
+HISTORY_DB = os.path.join(FINAL_RESULTS_DIR, 'history.sqlite')
+
+# Журнал запусков: для каждого запуска main.py в RUN_RECORD_DIR сохраняется
+# run_<YYYYMMDD_HHMMSS>.json - выбранные этапы, их длительность и результат
+RUN_RECORD_DIR = os.path.join(FINAL_RESULTS_DIR, 'runs')
+# Планирование (python main.py --plan): оценка длительности по истории запусков.
+# MAINTENANCE_WINDOW_MINUTES - окно обслуживания для проверки плана (0 - не проверять)
+MAINTENANCE_WINDOW_MINUTES = 0
+# Контроль деградации (regressions.py): длительность этапов и nipper по хостам
+# сравнивается с медианой REGRESSION_BASELINE_RUNS предыдущих успешных запусков.
+# Деградация - рост больше чем на REGRESSION_THRESHOLD_PCT % и не меньше чем на
+# REGRESSION_MIN_SECONDS сек; отчет - RUN_RECORD_DIR/regressions_<время>.json
+REGRESSION_CHECK = True
+REGRESSION_BASELINE_RUNS = 10
+REGRESSION_THRESHOLD_PCT = 50
+REGRESSION_MIN_SECONDS = 5.0
+# PROFILE_MEMORY = True - на границе каждого этапа записывать в журнал запуска
+# пиковый RSS и PROFILE_TOP_ALLOCATIONS крупнейших мест выделения памяти (tracemalloc).
+# Замедляет Python-код; при False накладных расходов нет
+PROFILE_MEMORY = False
+PROFILE_TOP_ALLOCATIONS = 10
+
 # ============================================
 # Параллельная обработка
 MAX_WORKERS = 1
 
+# Движок запуска nipper:
+#   'threads' - пул потоков, nipper запускается через subprocess.Popen
+#   'asyncio' - asyncio-подпроцессы, рекомендации извлекаются сразу по
+#               завершении каждой задачи
+# В обоих движках вывод nipper пишется потоком в лог задачи
+NIPPER_ENGINE = 'threads'
+# Вывод nipper по каждой задаче (оба движка); в общем логе - только ссылка на файл
+NIPPER_JOB_LOG_DIR = os.path.join(LOG_DIR, 'nipper_jobs')
+# Разбор отчета сразу после nipper в рабочем потоке (оба движка): рекомендации и
+# описания хоста записываются в REPORTS_DIR/.findings/<отчет>.json, а итоговый отчет
+# и задачи строятся по этим записям без повторного разбора HTML/XML
+FINDINGS_RECORDS = True
+
+# Ограничения ресурсов задач nipper (0 - без ограничения)
+#   NIPPER_MEMORY_LIMIT_MB  - предел памяти одного процесса nipper (Linux)
+#   NIPPER_CPU_TIME_LIMIT   - предел процессорного времени одного процесса, сек (Linux)
+#   NIPPER_NICE             - понижение приоритета CPU 0..19 (в Windows нужен psutil)
+#   NIPPER_LOW_IO_PRIORITY  - пониженный приоритет диска (нужен psutil)
+#   NIPPER_MEMORY_BUDGET_MB - общий бюджет памяти: новые задачи не запускаются, пока
+#                             сумма оценок памяти выполняемых задач не освободит место
+#   NIPPER_JOB_MEMORY_MB    - оценка памяти задачи для бюджета, если предел не задан
+NIPPER_MEMORY_LIMIT_MB = 0
+NIPPER_CPU_TIME_LIMIT = 0
+NIPPER_NICE = 0
+NIPPER_LOW_IO_PRIORITY = False
+NIPPER_MEMORY_BUDGET_MB = 0
+NIPPER_JOB_MEMORY_MB = 512
+
+# ============================================
+# Уровни приоритета хостов (tiers.py)
+# PRIORITY_TIERS - уровни в порядке приоритета: {'name': имя, 'hosts': [адреса]}.
+# Адрес - IP ('10.0.0.1'), подсеть ('10.0.0.0/24') или шаблон имени ('10.1.*').
+# Конфигурации более приоритетных уровней сканируются первыми. По завершении уровня
+# в PARTIAL_RESULTS_DIR сохраняются частичный отчет <REPORT_PREFIX>_<имя>_<время>.xlsx
+# и структура задач tasks_<имя>. Хосты вне уровней сканируются последними и попадают
+# только в полный итоговый отчет, который, как обычно, строится этапом summarize.
+PRIORITY_TIERS = [
+    # {'name': 'core', 'hosts': ['10.0.0.1', '10.0.0.2']},
+    # {'name': 'dc', 'hosts': ['10.10.0.0/16', '10.20.*']},
+]
+PARTIAL_RESULTS_DIR = os.path.join(FINAL_RESULTS_DIR, 'partial')
+
+# ============================================
+# Быстрый анализ конфигураций без nipper (triage.py)
+# TRIAGE_PREPASS = True - перед запуском nipper быстро проверить конфигурации
+# и сохранить предварительный отчет с префиксом TRIAGE_REPORT_PREFIX.
+# Режим без nipper: python main.py --quick  или  python triage.py
+TRIAGE_PREPASS = False
+TRIAGE_REPORT_PREFIX = 'triage_summary'
+
+# Правило срабатывает, если есть строка, совпадающая с 'match',
+# или если нет ни одной строки, совпадающей с 'absent'.
+TRIAGE_RULES = [
+    {
+        'Issue': 'Clear Text HTTP Service Enabled',
+        'absent': r'^\s*no web-management',
+        'Overall': 'Medium', 'Impact': 'Critical', 'Ease': 'Moderate', 'Fix': 'Quick',
+        'Recommendation': 'Отключить HTTP-управление (no web-management) или включить только HTTPS',
+    },
+    {
+        'Issue': 'SNMP Community String Configured',
+        'match': r'^\s*snmp-server community\s',
+        'Overall': 'High', 'Impact': 'Critical', 'Ease': 'Moderate', 'Fix': 'Planned',
+        'Recommendation': 'Перейти на SNMPv3 и удалить community-строки',
+    },
+    {
+        'Issue': 'Default SNMP Community String',
+        'match': r'^\s*snmp-server community\s+"?(public|private)"?',
+        'Overall': 'Critical', 'Impact': 'Critical', 'Ease': 'Easy', 'Fix': 'Quick',
+        'Recommendation': 'Удалить community-строки public/private',
+    },
+    {
+        'Issue': 'No Syslog Logging Configured',
+        'absent': r'^\s*logging\s+\d{1,3}(\.\d{1,3}){3}',
+        'Overall': 'Medium', 'Impact': 'Medium', 'Ease': 'N/A', 'Fix': 'Quick',
+        'Recommendation': 'Настроить отправку журналов на syslog-сервер (logging <адрес>)',
+    },
+    {
+        'Issue': 'Weak Minimum Password Length Policy Setting',
+        'absent': r'^\s*password minimum-length\s+([89]|[1-9]\d)\b',
+        'Overall': 'Medium', 'Impact': 'High', 'Ease': 'Challenging', 'Fix': 'Quick',
+        'Recommendation': 'Задать минимальную длину пароля не менее 8 символов (password minimum-length)',
+    },
+]
+
 # ============================================
 # Исключение правил из финального отчёта
 # Каждая строка интерпретируется как регулярное выражение (Python re).
@@ -95,7 +299,151 @@ EXCLUDED_ISSUES = [
 ]
 
 # ============================================
-# Дополнительные проверки
-for dir_path in [CONFIGS_DIR, REPORTS_DIR, LOG_DIR, FINAL_RESULTS_DIR,
-                 COMPARISON_DIR, TASK_DISTRIBUTION_DIR]:
-    os.makedirs(dir_path, exist_ok=True)
\ No newline at end of file
+# Загрузка настроек
+#
+# Импорт этого модуля не создает папок и не читает внешних источников.
+# Значения выше - настройки по умолчанию; load_settings() собирает из них
+# объект Settings и применяет переопределения:
+#   1. JSON-файл (аргумент config_file или переменная окружения NIPPER_CONFIG)
+#   2. переменные окружения NIPPER_<ИМЯ>, например NIPPER_MAX_WORKERS=8
+#   3. переопределения из командной строки (main.py --set ИМЯ=ЗНАЧЕНИЕ)
+# Пути, построенные от BASIC_PATH, следуют за переопределенным BASIC_PATH.
+
+VALID_VALUES = {
+    'FILE_SOURCE_MODE': ['latest_folder', 'recent_files', 'both'],
+    'NIPPER_ENGINE': ['asyncio', 'threads'],
+    'NIPPER_OUTPUT_FORMAT': ['html', 'xml'],
+    'SUMMARY_SHARD_BY': [None, 'subnet', 'site'],
+    'TASK_OUTPUT_MODE': ['folders', 'workbook'],
+}
+
+ENV_PREFIX = 'NIPPER_'
+
+
+class Settings:
+    """Набор настроек запуска; атрибуты совпадают с именами констант config.py"""
+    def __init__(self, values):
+        self.__dict__.update(values)
+
+    def as_dict(self):
+        return dict(self.__dict__)
+
+
+def default_settings():
+    """Настройки по умолчанию - все константы этого модуля в верхнем регистре"""
+    return {name: value for name, value in globals().items()
+            if name.isupper() and name not in ('VALID_VALUES', 'ENV_PREFIX')}
+
+
+def parse_value(raw, default):
+    """Приведение строкового значения (окружение, командная строка) к типу значения по умолчанию"""
+    if isinstance(default, bool):
+        return raw.strip().lower() in ('1', 'true', 'yes', 'on', 'да')
+    if isinstance(default, int):
+        return int(raw)
+    if isinstance(default, float):
+        return float(raw)
+    if isinstance(default, (list, dict)):
+        return json.loads(raw)
+    if raw.strip().lower() in ('none', 'null'):
+        return None
+    return raw
+
+
+def validate_settings(values):
+    """Проверка допустимых значений настроек"""
+    for name, allowed in VALID_VALUES.items():
+        if values.get(name) not in allowed:
+            raise ValueError(f"Invalid {name}. Must be one of: {', '.join(map(str, allowed))}")
+    if not isinstance(values.get('SUMMARY_SHARD_PREFIX'), int) or not 0 <= values['SUMMARY_SHARD_PREFIX'] <= 32:
+        raise ValueError("Invalid SUMMARY_SHARD_PREFIX. Must be an integer from 0 to 32")
+    if not isinstance(values.get('SUMMARY_WRITE_WORKERS'), int) or values['SUMMARY_WRITE_WORKERS'] < 1:
+        raise ValueError("Invalid SUMMARY_WRITE_WORKERS. Must be a positive integer")
+    for name in ('NIPPER_MEMORY_LIMIT_MB', 'NIPPER_CPU_TIME_LIMIT', 'NIPPER_MEMORY_BUDGET_MB', 'NIPPER_JOB_MEMORY_MB'):
+        if not isinstance(values.get(name), (int, float)) or values[name] < 0:
+            raise ValueError(f"Invalid {name}. Must be a non-negative number")
+    if not isinstance(values.get('MAINTENANCE_WINDOW_MINUTES'), (int, float)) or values['MAINTENANCE_WINDOW_MINUTES'] < 0:
+        raise ValueError("Invalid MAINTENANCE_WINDOW_MINUTES. Must be a non-negative number")
+    for name in ('REGRESSION_BASELINE_RUNS', 'REGRESSION_THRESHOLD_PCT', 'REGRESSION_MIN_SECONDS'):
+        if not isinstance(values.get(name), (int, float)) or values[name] < 0:
+            raise ValueError(f"Invalid {name}. Must be a non-negative number")
+    if not isinstance(values.get('SCRATCH_DIR'), str):
+        raise ValueError("Invalid SCRATCH_DIR. Must be a path or ''")
+    if not isinstance(values.get('SCRATCH_BUDGET_MB'), (int, float)) or values['SCRATCH_BUDGET_MB'] <= 0:
+        raise ValueError("Invalid SCRATCH_BUDGET_MB. Must be a positive number")
+    if not isinstance(values.get('NIPPER_NICE'), int) or not 0 <= values['NIPPER_NICE'] <= 19:
+        raise ValueError("Invalid NIPPER_NICE. Must be an integer from 0 to 19")
+    for source in values.get('CONFIG_SOURCES') or []:
+        if (not isinstance(source, dict) or not isinstance(source.get('path'), str)
+                or source.get('mode', values['FILE_SOURCE_MODE']) not in VALID_VALUES['FILE_SOURCE_MODE']
+                or not isinstance(source.get('max_age_days', 0), (int, float)) or source.get('max_age_days', 0) < 0
+                or not isinstance(source.get('max_mb_per_sec', 0), (int, float)) or source.get('max_mb_per_sec', 0) < 0
+                or not isinstance(source.get('workers', 1), int) or source.get('workers', 1) < 1):
+            raise ValueError(f"Invalid CONFIG_SOURCES entry: {source}. Expected {{'path': ..., 'mode': "
+                             f"{'/'.join(VALID_VALUES['FILE_SOURCE_MODE'])}, 'max_age_days': >= 0, "
+                             f"'max_mb_per_sec': >= 0, 'workers': >= 1}}")
+    names = set()
+    for tier in values.get('PRIORITY_TIERS') or []:
+        name = tier.get('name') if isinstance(tier, dict) else None
+        if (not isinstance(name, str) or not re.fullmatch(r'[\w.-]+', name)
+                or name == 'other' or name in names or not isinstance(tier.get('hosts'), list)):
+            raise ValueError(f"Invalid PRIORITY_TIERS entry: {tier}. Expected {{'name': unique name "
+                             f"(letters, digits, '_', '-', '.'; not 'other'), 'hosts': [addresses]}}")
+        names.add(name)
+
+
+def load_settings(config_file=None, overrides=None, environ=None):
+    """Сборка настроек: значения по умолчанию, JSON-файл, окружение, командная строка"""
+    environ = os.environ if environ is None else environ
+    defaults = default_settings()
+    values = dict(defaults)
+    explicit = set()
+
+    config_file = config_file or environ.get(ENV_PREFIX + 'CONFIG')
+    if config_file:
+        with open(config_file, 'r', encoding='utf-8') as f:
+            file_values = json.load(f)
+        for name, value in file_values.items():
+            if name not in defaults:
+                raise ValueError(f"Unknown setting in {config_file}: {name}")
+            values[name] = value
+            explicit.add(name)
+
+    for name, default in defaults.items():
+        raw = environ.get(ENV_PREFIX + name)
+        if raw is not None:
+            values[name] = parse_value(raw, default)
+            explicit.add(name)
+
+    for name, value in (overrides or {}).items():
+        if name not in defaults:
+            raise ValueError(f"Unknown setting: {name}")
+        values[name] = parse_value(value, defaults[name]) if isinstance(value, str) else value
+        explicit.add(name)
+
+    # Пути от BASIC_PATH, не заданные явно, переносятся на новый базовый путь
+    base = defaults['BASIC_PATH']
+    if values['BASIC_PATH'] != base:
+        for name, default in defaults.items():
+            if name not in explicit and isinstance(default, str) and default.startswith(base + os.sep):
+                values[name] = values['BASIC_PATH'] + default[len(base):]
+
+    # Пути, построенные от других папок (например, FINGERPRINT_DIR от FINAL_RESULTS_DIR)
+    for parent in ('FINAL_RESULTS_DIR', 'LOG_DIR'):
+        if values[parent] != defaults[parent]:
+            for name, default in defaults.items():
+                if (name not in explicit and isinstance(default, str)
+                        and default.startswith(defaults[parent] + os.sep)):
+                    values[name] = values[parent] + default[len(defaults[parent]):]
+
+    validate_settings(values)
+    return Settings(values)
+
+
+def ensure_directories(settings):
+    """Создание рабочих папок (вызывается явно в начале запуска)"""
+    for dir_path in [settings.CONFIGS_DIR, settings.REPORTS_DIR, settings.LOG_DIR,
+                     settings.FINAL_RESULTS_DIR, settings.COMPARISON_DIR,
+                     settings.TASK_DISTRIBUTION_DIR, settings.NIPPER_JOB_LOG_DIR,
+                     settings.FINGERPRINT_DIR, settings.RUN_RECORD_DIR]:
+        os.makedirs(dir_path, exist_ok=True)
@@ -0,0 +1,133 @@
+import math
+
+try:
+    import python_calamine
+except ImportError:  # необязательная зависимость
+    python_calamine = None
+
+
+def read_engine():
+    """Движок чтения Excel: 'calamine' (пакет python-calamine) или 'openpyxl' (только чтение)"""
+    return 'calamine' if python_calamine is not None else 'openpyxl'
+
+
+def _calamine_cell(value):
+    # calamine возвращает все числа как float, а пустые ячейки - как ''
+    if value == '':
+        return None
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+
+def _column_names(header):
+    return [f'Unnamed: {i}' if name is None or (isinstance(name, float) and math.isnan(name)) else name
+            for i, name in enumerate(header)]
+
+
+class ExcelBook:
+    """Книга Excel, открытая только для чтения, с потоковым чтением листов.
+
+    engine - 'calamine' или 'openpyxl' (по умолчанию read_engine()). calamine
+    быстрее загружает лист целиком, но не умеет читать его частично; openpyxl в
+    режиме read_only разбирает лист потоково, поэтому для header и peek (только
+    первые строки) используется он. Пустые ячейки возвращаются как None
+    (в таблицах read - как NaN).
+    """
+    def __init__(self, path, engine=None):
+        self.path = path
+        self.engine = engine or read_engine()
+        if self.engine == 'calamine':
+            self._book = python_calamine.CalamineWorkbook.from_path(path)
+            self.sheet_names = list(self._book.sheet_names)
+        else:
+            from openpyxl import load_workbook
+            self._book = load_workbook(path, read_only=True, data_only=True, keep_links=False)
+            self.sheet_names = list(self._book.sheetnames)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if self.engine == 'openpyxl':
+            self._book.close()
+
+    def rows(self, sheet=None):
+        """Строки листа (по умолчанию первого) как кортежи значений"""
+        name = sheet if sheet is not None else self.sheet_names[0]
+        if self.engine == 'calamine':
+            for row in self._book.get_sheet_by_name(name).iter_rows():
+                yield tuple(_calamine_cell(value) for value in row)
+        else:
+            yield from self._book[name].iter_rows(values_only=True)
+
+    def peek(self, sheet=None, nrows=1):
+        """Заголовок листа и до nrows первых строк данных (пустые строки пропускаются)"""
+        rows = self.rows(sheet)
+        header = _column_names(next(rows, ()))
+        data = []
+        for row in rows:
+            if len(data) >= nrows:
+                break
+            if any(value is not None for value in row):
+                data.append(row)
+        return header, data
+
+    def header(self, sheet=None):
+        """Названия колонок листа (первая строка)"""
+        return self.peek(sheet, 0)[0]
+
+    def read(self, sheet=None, columns=None):
+        """Лист как DataFrame; columns - загружать только эти колонки"""
+        import pandas as pd
+        from operator import itemgetter
+
+        rows = self.rows(sheet)
+        header = _column_names(next(rows, ()))
+        if columns is not None:
+            missing = [col for col in columns if col not in header]
+            if missing:
+                raise ValueError(f"нет колонок {', '.join(map(str, missing))}")
+            indexes = [header.index(col) for col in columns]
+            header = list(columns)
+            pick = itemgetter(*indexes) if len(indexes) > 1 else lambda row: (row[indexes[0]],)
+        width = len(header)
+
+        data = []
+        for row in rows:
+            if len(row) < width:
+                row = tuple(row) + (None,) * (width - len(row))
+            row = pick(row) if columns is not None else row[:width]
+            if any(value is not None for value in row):
+                data.append(row)
+
+        df = pd.DataFrame(data, columns=header)
+        return df.fillna(value=math.nan) if len(df) else df
+
+
+def sheet_names(path):
+    """Названия листов книги"""
+    with ExcelBook(path, 'openpyxl') as book:
+        return book.sheet_names
+
+
+def read_header(path, sheet=None):
+    """Названия колонок листа без чтения данных"""
+    with ExcelBook(path, 'openpyxl') as book:
+        return book.header(sheet)
+
+
+def peek_sheet(path, sheet=None, nrows=1):
+    """Заголовок и первые строки листа (проверка колонок и того, что лист не пуст)"""
+    with ExcelBook(path, 'openpyxl') as book:
+        return book.peek(sheet, nrows)
+
+
+def read_sheet(path, sheet=None, columns=None):
+    """Лист как DataFrame (аналог pd.read_excel с usecols по названиям колонок)"""
+    with ExcelBook(path) as book:
+        return book.read(sheet, columns)
+
@@ -3,6 +3,16 @@ import glob
 import logging
 import re
 import time
+import shutil
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from utils import ProgressBar, file_size, format_bytes
+from scratch import move_files
+
+# Имя конфигурации в CONFIGS_DIR: IP-адрес из начала имени файла (или имя без расширения)
+IP_PREFIX_PATTERN = re.compile(r'^\d{1,3}(\.\d{1,3}){3}')
 
 def find_latest_folder(network_dir):
     """Поиск последней созданной папки в сетевой директории"""
@@ -70,6 +80,12 @@ def get_config_files(source, configs_dir):
         logging.exception(f"{'Ошибка получения файлов:':<50} {str(e)}")
         return []
 
+def host_key(filename):
+    """Хост конфигурации по имени файла: IP-адрес из начала имени или имя без расширения"""
+    ip_match = IP_PREFIX_PATTERN.match(filename)
+    return ip_match.group(0) if ip_match else os.path.splitext(filename)[0]
+
+
 def rename_configs(configs_dir):
     """Переименование файлов: извлечение IP и перезапись дубликатов"""
     try:
@@ -87,15 +103,12 @@ def rename_configs(configs_dir):
         # Сортируем по времени создания (старые -> новые)
         files_with_time.sort(key=lambda x: x[1])
         
-        ip_pattern = re.compile(r'^\d{1,3}(\.\d{1,3}){3}')  # Регулярка для поиска IP
-        
         renamed_count = 0
         for filename, _ in files_with_time:
             file_path = os.path.join(configs_dir, filename)
             
             # Извлечение части с IP
-            ip_match = ip_pattern.match(filename)
-            new_name = ip_match.group(0) + '.txt' if ip_match else os.path.splitext(filename)[0] + '.txt'
+            new_name = host_key(filename) + '.txt'
             new_path = os.path.join(configs_dir, new_name)
             
             # Удаляем существующий файл перед переименованием
@@ -111,4 +124,258 @@ def rename_configs(configs_dir):
         return True
     except Exception as e:
         logging.exception(f"{'Ошибка переименования:':<50} {str(e)}")
-        return False
\ No newline at end of file
+        return False
+
+
+def compile_normalization_rules(rules):
+    """Правила нормализации: строка - регулярное выражение удаляемых строк,
+    пара [выражение, замена] - замена в каждой строке (например, [r'\s+$', '']
+    убирает пробелы в конце строк). Возвращает (удаляющие, заменяющие)."""
+    patterns, substitutions = [], []
+    for rule in rules or []:
+        try:
+            if isinstance(rule, str):
+                patterns.append(re.compile(rule))
+            else:
+                pattern, replacement = rule
+                substitutions.append((re.compile(pattern), replacement))
+        except (re.error, TypeError, ValueError):
+            logging.warning(f"Некорректное правило нормализации конфигураций: {rule}")
+    return patterns, substitutions
+
+
+def normalize_config(data, patterns, substitutions=()):
+    """Нормализация содержимого конфигурации: удаление строк, совпадающих с
+    patterns, и замены substitutions в остальных строках. Без правил
+    содержимое не меняется"""
+    if not patterns and not substitutions:
+        return data
+    kept = []
+    for line in data.decode('utf-8', errors='replace').split('\n'):
+        if any(p.search(line) for p in patterns):
+            continue
+        for pattern, replacement in substitutions:
+            line = pattern.sub(replacement, line)
+        kept.append(line)
+    return '\n'.join(kept).encode('utf-8')
+
+
+def group_equivalent_configs(configs_dir, normalization_rules=None, files=None):
+    """Группировка эквивалентных конфигураций перед сканированием.
+
+    Конфигурации считаются эквивалентными при совпадении хеша содержимого после
+    нормализации правилами normalization_rules (см. compile_normalization_rules).
+    Без правил группируются только побайтно одинаковые файлы.
+    Возвращает словарь {представитель группы: [остальные файлы группы]}.
+    """
+    try:
+        if files is None:
+            files = [f for f in os.listdir(configs_dir) if f.lower().endswith('.txt')]
+
+        patterns, substitutions = compile_normalization_rules(normalization_rules)
+
+        by_hash = {}
+        for filename in sorted(files):
+            with open(os.path.join(configs_dir, filename), 'rb') as f:
+                digest = hashlib.sha256(normalize_config(f.read(), patterns, substitutions)).hexdigest()
+            by_hash.setdefault(digest, []).append(filename)
+
+        groups = {members[0]: members[1:] for members in by_hash.values()}
+        duplicates = sum(len(members) for members in groups.values())
+        logging.info(f"{'Уникальных конфигураций:':<50} {len(groups)} из {len(files)}")
+        if duplicates:
+            logging.info(f"{'Эквивалентных (без сканирования):':<50} {duplicates}")
+        return groups
+    except Exception as e:
+        logging.exception(f"{'Ошибка группировки конфигураций:':<50} {str(e)}")
+        return None
+
+
+def fan_out_reports(groups, reports_dir):
+    """Распространение отчета представителя группы на все эквивалентные хосты.
+
+    Возвращает словарь {путь к отчету хоста: путь к отчету представителя}.
+    """
+    from report_store import list_reports, report_stem, link_or_copy, remove_report_variants
+
+    reports = {report_stem(os.path.basename(path)): path for path in list_reports(reports_dir)}
+    fanned = {}
+    for representative, members in groups.items():
+        source = reports.get(os.path.splitext(representative)[0] + '_report')
+        if not members:
+            continue
+        if not source:
+            logging.warning(f"{'Нет отчета представителя группы:':<50} {representative}")
+            continue
+        extension = os.path.basename(source)[len(report_stem(os.path.basename(source))):]
+        for member in members:
+            target = os.path.join(reports_dir, os.path.splitext(member)[0] + '_report' + extension)
+            try:
+                link_or_copy(source, target)
+                remove_report_variants(target)
+                fanned[target] = source
+            except OSError as e:
+                logging.error(f"{'Ошибка копирования отчета:':<50} {member}\n{str(e)}")
+    if fanned:
+        logging.info(f"{'Отчетов распространено на группы:':<50} {len(fanned)}")
+    return fanned
+
+
+class Throttle:
+    """Ограничение скорости копирования (байт/сек), общее для всех потоков одного источника"""
+    def __init__(self, bytes_per_sec=0):
+        self.rate = bytes_per_sec
+        self._lock = threading.Lock()
+        self._next = time.monotonic()
+
+    def consume(self, nbytes):
+        """Учет переданных байт; ждет, пока средняя скорость не уложится в предел"""
+        if not self.rate:
+            return
+        with self._lock:
+            now = time.monotonic()
+            self._next = max(self._next, now) + nbytes / self.rate
+            delay = self._next - now
+        if delay > 0:
+            time.sleep(delay)
+
+
+def copy_throttled(source_path, target_path, throttle=None, chunk_size=1024 * 1024):
+    """Копирование файла с ограничением скорости; файл появляется в target_path целиком"""
+    if throttle is None or not throttle.rate:
+        shutil.copy2(source_path, target_path)
+        return os.path.getsize(target_path)
+
+    tmp_path = target_path + '.tmp'
+    copied = 0
+    with open(source_path, 'rb') as src, open(tmp_path, 'wb') as dst:
+        while True:
+            chunk = src.read(chunk_size)
+            if not chunk:
+                break
+            dst.write(chunk)
+            copied += len(chunk)
+            throttle.consume(len(chunk))
+    shutil.copystat(source_path, tmp_path)
+    os.replace(tmp_path, target_path)
+    return copied
+
+
+def discover_source_files(source):
+    """Поиск .cfg файлов одного источника по его режиму (latest_folder, recent_files, both)"""
+    path, mode = source['path'], source['mode']
+    files = []
+    if mode in ('latest_folder', 'both'):
+        folder = find_latest_folder(path)
+        if folder:
+            files.extend(glob.glob(os.path.join(folder, '*.cfg')))
+    if mode in ('recent_files', 'both'):
+        files.extend(get_recent_files(path, source['max_age_days']))
+    return sorted(set(files))
+
+
+def _copy_source(source, files, configs_dir, progress):
+    """Копирование выбранных файлов одного источника в staging-папку под именами <хост>.txt"""
+    throttle = Throttle(source['max_mb_per_sec'] * 1024 * 1024)
+    stats = {'name': source['name'], 'files': 0, 'bytes': 0, 'errors': 0}
+    start_time = time.time()
+
+    def copy_one(item):
+        host, path = item
+        try:
+            nbytes = copy_throttled(path, os.path.join(configs_dir, host + '.txt'), throttle)
+        except Exception as e:
+            logging.error(f"{'Ошибка копирования:':<50} {path}\n{str(e)}")
+            nbytes = None
+        progress.update(1, nbytes or 0)
+        return nbytes
+
+    with ThreadPoolExecutor(max_workers=source['workers']) as pool:
+        for nbytes in pool.map(copy_one, files):
+            if nbytes is None:
+                stats['errors'] += 1
+            else:
+                stats['files'] += 1
+                stats['bytes'] += nbytes
+
+    stats['seconds'] = round(time.time() - start_time, 3)
+    rate = stats['bytes'] / max(stats['seconds'], 1e-6)
+    logging.info(f"{'Источник ' + source['name'] + ':':<50} {stats['files']} файлов, "
+                 f"{format_bytes(stats['bytes'])}, {format_bytes(rate)}/с")
+    return stats
+
+
+def newest_per_host(found):
+    """Самая свежая конфигурация каждого хоста из списков файлов по источникам.
+
+    found - списки путей по источникам; возвращает {хост: (mtime, индекс источника, путь)}.
+    """
+    selected = {}
+    for index, files in enumerate(found):
+        for path in files:
+            try:
+                mtime = os.path.getmtime(path)
+            except OSError:
+                continue
+            host = host_key(os.path.basename(path))
+            if host not in selected or mtime > selected[host][0]:
+                selected[host] = (mtime, index, path)
+    return selected
+
+
+def ingest_sources(sources, configs_dir, scratch=None):
+    """Получение конфигураций из нескольких источников в одну staging-папку.
+
+    sources - список источников с полями name, path, mode, max_age_days,
+    max_mb_per_sec (0 - без ограничения) и workers (потоков копирования).
+    Поиск файлов и копирование выполняются параллельно по источникам. Файлы
+    сводятся по хосту (IP из имени файла): если хост есть в нескольких источниках,
+    копируется самая свежая по времени изменения конфигурация. В configs_dir
+    файлы сохраняются сразу как <хост>.txt, переименование не требуется.
+    scratch (scratch.ScratchWorkspace) - копирование в рабочую папку в памяти с
+    переносом в configs_dir, если все выбранные конфигурации помещаются.
+    Возвращает список статистики по источникам или None при ошибке.
+    """
+    try:
+        os.makedirs(configs_dir, exist_ok=True)
+        logging.info(f"{'Поиск файлов в источниках:':<50} {len(sources)}")
+        with ThreadPoolExecutor(max_workers=len(sources)) as pool:
+            found = list(pool.map(discover_source_files, sources))
+
+        selected = newest_per_host(found)
+
+        per_source = [[] for _ in sources]
+        for host, (_, index, path) in sorted(selected.items()):
+            per_source[index].append((host, path))
+        duplicates = sum(len(files) for files in found) - len(selected)
+        logging.info(f"{'Найдено хостов:':<50} {len(selected)}")
+        if duplicates > 0:
+            logging.info(f"{'Устаревших копий (не копируются):':<50} {duplicates}")
+        if not selected:
+            logging.warning(f"{'Файлы в источниках:':<50} не найдены")
+            return []
+
+        staging_dir = configs_dir
+        staged_bytes = sum(file_size(path) for _, _, path in selected.values())
+        if scratch is not None and scratch.reserve(staged_bytes):
+            staging_dir = scratch.subdir('configs')
+            logging.info(f"{'Конфигурации в памяти:':<50} {format_bytes(staged_bytes)}")
+        elif scratch:
+            logging.info(f"{'Конфигурации в памяти:':<50} не помещаются ({format_bytes(staged_bytes)}), запись на диск")
+
+        try:
+            progress = ProgressBar(len(selected), "Копирование файлов")
+            with ThreadPoolExecutor(max_workers=len(sources)) as pool:
+                stats = list(pool.map(lambda args: _copy_source(*args, staging_dir, progress),
+                                      zip(sources, per_source)))
+            progress.close()
+        finally:
+            if staging_dir != configs_dir:
+                # На диск переносятся только скопированные целиком <хост>.txt
+                moved = move_files(staging_dir, configs_dir, '.txt')
+                scratch.release(staged_bytes)
+                logging.info(f"{'Перенесено в папку конфигураций:':<50} {moved}")
+        return stats
+    except Exception as e:
+        logging.exception(f"{'Ошибка получения файлов:':<50} {str(e)}")
+        return None
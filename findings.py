@@ -0,0 +1,177 @@
+import os
+import logging
+
+from fingerprints import (build_fingerprint, decode_host_issues, fingerprint_path_for_report,
+                          load_fingerprint, META_COLUMNS)
+
+
+# Лист оглавления итогового отчета, разбитого на части (reporting.export_sharded_report)
+SHARD_INDEX_SHEET = 'Shards'
+
+
+class Findings:
+    """Результат этапа summarize в памяти: какие проблемы найдены на каких хостах.
+
+    host_issues - {проблема: {хост: 1}}, issue_meta - {проблема: поля Overall,
+    Impact, Ease, Fix, Recommendation}. Итоговый Excel-отчет и отпечаток - только
+    выгрузки этих данных; этапы tasks и compare работают с объектом напрямую.
+    scanned_hosts - все хосты, отчеты которых вошли в сводку (в том числе без
+    проблем); None, если неизвестно (находки прочитаны из Excel-отчета).
+    """
+    def __init__(self, host_issues, issue_meta, total_recommendations=0, scanned_hosts=None):
+        self.host_issues = host_issues
+        self.issue_meta = issue_meta
+        self.total_recommendations = total_recommendations
+        self.scanned_hosts = set(scanned_hosts) if scanned_hosts is not None else None
+        self.report_path = None     # путь к выгруженному Excel-отчету
+        self._fingerprint = None
+
+    def __len__(self):
+        return len(self.host_issues)
+
+    @property
+    def issues(self):
+        return list(self.host_issues)
+
+    @property
+    def hosts(self):
+        return sorted({host for hosts in self.host_issues.values() for host in hosts})
+
+    def hosts_for(self, issue):
+        """Хосты, на которых найдена проблема"""
+        return sorted(self.host_issues.get(issue, {}))
+
+    def subset(self, hosts):
+        """Находки только по указанным хостам (проблемы без этих хостов отбрасываются)"""
+        hosts = set(hosts)
+        host_issues = {}
+        for issue, issue_hosts in self.host_issues.items():
+            selected = {host: 1 for host in issue_hosts if host in hosts}
+            if selected:
+                host_issues[issue] = selected
+        scanned = self.scanned_hosts & hosts if self.scanned_hosts is not None else None
+        return Findings(host_issues, {issue: self.issue_meta[issue] for issue in host_issues},
+                        scanned_hosts=scanned)
+
+    @classmethod
+    def merge(cls, parts):
+        """Объединение находок по непересекающимся наборам хостов (частям отчета)"""
+        host_issues = {}
+        issue_meta = {}
+        for part in parts:
+            for issue, hosts in part.host_issues.items():
+                host_issues.setdefault(issue, {}).update(hosts)
+                issue_meta.setdefault(issue, part.issue_meta[issue])
+        scanned = None
+        if all(part.scanned_hosts is not None for part in parts):
+            scanned = set().union(*(part.scanned_hosts for part in parts))
+        return cls(host_issues, issue_meta, sum(part.total_recommendations for part in parts), scanned)
+
+    def to_dataframe(self):
+        """Таблица итогового отчета: проблема, флаги хостов, поля рекомендации"""
+        import pandas as pd
+
+        all_hosts = self.hosts
+        rows = []
+        for issue, hosts in self.host_issues.items():
+            rows.append({
+                'Issue': issue,
+                **{host: 1 if host in hosts else 0 for host in all_hosts},
+                **self.issue_meta[issue]
+            })
+
+        df = pd.DataFrame(rows, columns=['Issue'] + all_hosts + META_COLUMNS[1:])
+        df.fillna(0, inplace=True)
+        return df
+
+    def fingerprint(self):
+        """Отпечаток сканирования (см. fingerprints.py), строится один раз"""
+        if self._fingerprint is None:
+            self._fingerprint = build_fingerprint(self.host_issues, self.issue_meta, self.scanned_hosts)
+        return self._fingerprint
+
+    @classmethod
+    def from_fingerprint(cls, fingerprint):
+        host_issues = {issue: {} for issue in fingerprint['issues']}
+        for host in fingerprint['hosts']:
+            for issue in decode_host_issues(fingerprint, host):
+                host_issues[issue][host] = 1
+        findings = cls({issue: hosts for issue, hosts in host_issues.items() if hosts},
+                       fingerprint['meta'], scanned_hosts=fingerprint.get('scanned'))
+        findings._fingerprint = fingerprint
+        return findings
+
+    @classmethod
+    def from_dataframe(cls, df):
+        hosts = [col for col in df.columns if col not in META_COLUMNS]
+        # Флаги хостов - одной матрицей: построчный iterrows на тысячах колонок очень медленный
+        flags = (df[hosts] == 1).to_numpy()
+        meta = df[META_COLUMNS[1:]].to_dict('records')
+        host_issues = {}
+        issue_meta = {}
+        for i, issue in enumerate(df['Issue']):
+            issue_meta[issue] = meta[i]
+            host_issues[issue] = {str(hosts[j]): 1 for j in flags[i].nonzero()[0]}
+        return cls(host_issues, issue_meta)
+
+
+def load_findings(report_path, fingerprint_dir=None):
+    """Находки сохраненного итогового отчета.
+
+    Если рядом сохранен отпечаток запуска, данные берутся из него (без чтения
+    Excel), иначе - из самого отчета. Возвращает None, если отчет некорректен.
+    """
+    try:
+        fingerprint_path = fingerprint_path_for_report(report_path, fingerprint_dir) if fingerprint_dir else None
+        if fingerprint_path and os.path.exists(fingerprint_path):
+            fingerprint = load_fingerprint(fingerprint_path)
+            if fingerprint:
+                findings = Findings.from_fingerprint(fingerprint)
+                findings.report_path = report_path
+                return findings
+
+        from excel_reader import ExcelBook
+
+        with ExcelBook(report_path) as book:
+            if SHARD_INDEX_SHEET in book.sheet_names:
+                paths = shard_paths(report_path, book)
+                parts = [load_findings(path) for path in paths]
+                if not paths or not all(parts):
+                    logging.error(f"{'Части отчета не прочитаны:':<50} {os.path.basename(report_path)}")
+                    return None
+                findings = Findings.merge(parts)
+                findings.report_path = report_path
+                return findings
+            df = book.read()
+        for col in META_COLUMNS:
+            if col not in df.columns:
+                logging.error(f"{'Отсутствует колонка:':<50} {col} в {os.path.basename(report_path)}")
+                return None
+        if df.empty:
+            logging.error(f"{'Отчет пуст:':<50} {os.path.basename(report_path)}")
+            return None
+
+        findings = Findings.from_dataframe(df)
+        findings.report_path = report_path
+        return findings
+    except Exception as e:
+        logging.error(f"{'Ошибка чтения отчета:':<50} {os.path.basename(report_path)}\n{str(e)}")
+        return None
+
+
+def shard_paths(report_path, book=None):
+    """Пути к частям итогового отчета по листу оглавления (пустой список, если отчет не разбит).
+
+    Каждая часть - обычный итоговый отчет по своим хостам, поэтому ее можно
+    передать в load_findings, create_tasks или compare_reports отдельно.
+    """
+    from excel_reader import ExcelBook
+
+    if book is None:
+        with ExcelBook(report_path) as book:
+            return shard_paths(report_path, book)
+    if SHARD_INDEX_SHEET not in book.sheet_names:
+        return []
+    index = book.read(SHARD_INDEX_SHEET, ['File'])
+    base_dir = os.path.dirname(report_path)
+    return [os.path.join(base_dir, str(name)) for name in index['File']]
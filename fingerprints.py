@@ -0,0 +1,282 @@
+import os
+import glob
+import json
+import time
+import shutil
+import hashlib
+import logging
+import re
+from datetime import datetime, timedelta
+
+
+FINGERPRINT_PREFIX = 'fingerprint'
+BASELINE_NAME = f'{FINGERPRINT_PREFIX}_baseline.json'
+# Итоговые отчеты, по которым не удалось построить отпечаток (backfill_fingerprints)
+BACKFILL_FAILED_FILE = 'backfill_failed.json'
+TIMESTAMP_FORMAT = '%Y%m%d_%H%M%S'
+
+META_COLUMNS = ['Issue', 'Overall', 'Impact', 'Ease', 'Fix', 'Recommendation']
+
+
+def _issues_hash(issues):
+    """Хеш набора проблем хоста, не зависящий от порядка и каталога проблем"""
+    return hashlib.sha1('\n'.join(sorted(issues)).encode('utf-8')).hexdigest()
+
+
+def build_fingerprint(host_issues, issue_meta, scanned=None):
+    """Построение компактного отпечатка сканирования.
+
+    host_issues - {проблема: {хост: 1}}, issue_meta - {проблема: поля рекомендации}.
+    Для каждого хоста хранится битовая маска проблем (индексы в каталоге 'issues')
+    и хеш набора названий проблем. scanned - все хосты, отчеты которых вошли в
+    сводку (в том числе без проблем); сохраняется в 'scanned'.
+    """
+    issues = sorted(issue_meta)
+    index = {issue: i for i, issue in enumerate(issues)}
+
+    bits = {}
+    for issue, hosts in host_issues.items():
+        for host in hosts:
+            bits[host] = bits.get(host, 0) | (1 << index[issue])
+
+    hosts = {}
+    for host, mask in bits.items():
+        host_set = [issues[i] for i in range(len(issues)) if mask >> i & 1]
+        hosts[host] = {'bits': format(mask, 'x'), 'hash': _issues_hash(host_set)}
+
+    fingerprint = {
+        'version': 1,
+        'issues': issues,
+        'meta': {issue: issue_meta[issue] for issue in issues},
+        'hosts': hosts,
+    }
+    if scanned is not None:
+        fingerprint['scanned'] = sorted(set(scanned) | set(hosts))
+    return fingerprint
+
+
+def scanned_hosts(fingerprint):
+    """Хосты, вошедшие в сводку запуска. В отпечатках без 'scanned' известны
+    только хосты с проблемами"""
+    return set(fingerprint.get('scanned') or fingerprint['hosts'])
+
+
+def decode_host_issues(fingerprint, host):
+    """Множество проблем хоста из битовой маски отпечатка"""
+    entry = fingerprint['hosts'].get(host)
+    if not entry:
+        return set()
+    mask = int(entry['bits'], 16)
+    issues = fingerprint['issues']
+    return {issues[i] for i in range(len(issues)) if mask >> i & 1}
+
+
+def fingerprint_path_for_report(report_path, fingerprint_dir):
+    """Путь к отпечатку, соответствующему итоговому отчету (по метке времени в имени)"""
+    match = re.search(r'(\d{8}_\d{6})\.xlsx$', os.path.basename(report_path))
+    if not match:
+        return None
+    return os.path.join(fingerprint_dir, f'{FINGERPRINT_PREFIX}_{match.group(1)}.json')
+
+
+def save_fingerprint(fingerprint, fingerprint_dir, timestamp):
+    """Сохранение отпечатка в fingerprint_<timestamp>.json"""
+    try:
+        os.makedirs(fingerprint_dir, exist_ok=True)
+        path = os.path.join(fingerprint_dir, f'{FINGERPRINT_PREFIX}_{timestamp}.json')
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(fingerprint, f, ensure_ascii=False, separators=(',', ':'))
+        os.replace(tmp_path, path)
+        logging.info(f"{'Отпечаток сканирования сохранен:':<50} {path} ({len(fingerprint['hosts'])} хостов)")
+        return path
+    except Exception as e:
+        logging.error(f"{'Ошибка сохранения отпечатка:':<50} {str(e)}")
+        return None
+
+
+def load_fingerprint(path):
+    """Загрузка отпечатка из JSON"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except Exception as e:
+        logging.error(f"{'Ошибка чтения отпечатка:':<50} {path}\n{str(e)}")
+        return None
+
+
+def _fingerprint_time(path):
+    """Метка времени запуска из имени отпечатка"""
+    match = re.search(r'_(\d{8}_\d{6})\.json$', os.path.basename(path))
+    if not match:
+        return None
+    return datetime.strptime(match.group(1), TIMESTAMP_FORMAT)
+
+
+def list_fingerprints(fingerprint_dir):
+    """Список (время, путь) сохраненных отпечатков, от старых к новым"""
+    items = []
+    for path in glob.glob(os.path.join(fingerprint_dir, f'{FINGERPRINT_PREFIX}_*.json')):
+        ts = _fingerprint_time(path)
+        if ts:
+            items.append((ts, path))
+    items.sort()
+    return items
+
+
+def find_fingerprint(fingerprint_dir, reference='previous', exclude_path=None):
+    """Поиск отпечатка для сравнения.
+
+    reference:
+      'previous'                  - последний сохраненный запуск
+      'baseline'                  - зафиксированный эталон (fingerprint_baseline.json)
+      'Nd'                        - последний запуск не позже, чем N дней назад ('7d' - неделя)
+      'YYYYMMDD[_HHMMSS]'         - последний запуск не позже указанной даты
+      путь к файлу                - конкретный отпечаток
+    """
+    try:
+        reference = str(reference).strip()
+        if reference == 'baseline':
+            path = os.path.join(fingerprint_dir, BASELINE_NAME)
+            return path if os.path.exists(path) else None
+        if os.path.isfile(reference):
+            return reference
+
+        cutoff = None
+        days_match = re.fullmatch(r'(\d+)d', reference)
+        if days_match:
+            cutoff = datetime.now() - timedelta(days=int(days_match.group(1)))
+        elif re.fullmatch(r'\d{8}', reference):
+            cutoff = datetime.strptime(reference, '%Y%m%d') + timedelta(days=1) - timedelta(seconds=1)
+        elif re.fullmatch(r'\d{8}_\d{6}', reference):
+            cutoff = datetime.strptime(reference, TIMESTAMP_FORMAT)
+        elif reference != 'previous':
+            logging.error(f"{'Неизвестная точка сравнения:':<50} {reference}")
+            return None
+
+        exclude = os.path.normpath(exclude_path) if exclude_path else None
+        for ts, path in reversed(list_fingerprints(fingerprint_dir)):
+            if exclude and os.path.normpath(path) == exclude:
+                continue
+            if cutoff is None or ts <= cutoff:
+                return path
+        return None
+    except Exception as e:
+        logging.error(f"{'Ошибка поиска отпечатка:':<50} {str(e)}")
+        return None
+
+
+def set_baseline(fingerprint_path, fingerprint_dir):
+    """Фиксация отпечатка как эталона для сравнения с reference='baseline'"""
+    try:
+        baseline_path = os.path.join(fingerprint_dir, BASELINE_NAME)
+        shutil.copy2(fingerprint_path, baseline_path)
+        logging.info(f"{'Эталон сравнения зафиксирован:':<50} {os.path.basename(fingerprint_path)}")
+        return baseline_path
+    except Exception as e:
+        logging.error(f"{'Ошибка фиксации эталона:':<50} {str(e)}")
+        return None
+
+
+def fingerprint_from_report(report_path):
+    """Построение отпечатка по существующему итоговому Excel-отчету"""
+    from findings import load_findings
+
+    findings = load_findings(report_path)
+    if not findings:
+        raise ValueError('отчет не прочитан')
+    return findings.fingerprint()
+
+
+def _report_stamp(report_path):
+    stat = os.stat(report_path)
+    return [stat.st_size, int(stat.st_mtime)]
+
+
+def backfill_fingerprints(final_results_dir, report_prefix, fingerprint_dir):
+    """Однократное создание отпечатков для итоговых отчетов, сохраненных до их появления.
+
+    Отчеты, которые не удалось прочитать, запоминаются в BACKFILL_FAILED_FILE
+    (с размером и временем изменения) и не читаются повторно, пока не изменятся.
+    """
+    failed_path = os.path.join(fingerprint_dir, BACKFILL_FAILED_FILE)
+    try:
+        with open(failed_path, 'r', encoding='utf-8') as f:
+            failed = json.load(f)
+    except (OSError, ValueError):
+        failed = {}
+
+    created = 0
+    changed = False
+    for report_path in glob.glob(os.path.join(final_results_dir, f'{report_prefix}_*.xlsx')):
+        path = fingerprint_path_for_report(report_path, fingerprint_dir)
+        if not path or os.path.exists(path):
+            continue
+        name = os.path.basename(report_path)
+        try:
+            stamp = _report_stamp(report_path)
+            if failed.get(name) == stamp:
+                continue
+            fingerprint = fingerprint_from_report(report_path)
+            timestamp = os.path.basename(path)[len(FINGERPRINT_PREFIX) + 1:-len('.json')]
+            if save_fingerprint(fingerprint, fingerprint_dir, timestamp):
+                created += 1
+                changed = failed.pop(name, None) is not None or changed
+        except Exception as e:
+            logging.warning(f"{'Отпечаток не построен:':<50} {name} ({str(e)})")
+            if os.path.exists(report_path):
+                failed[name] = _report_stamp(report_path)
+                changed = True
+    if created:
+        logging.info(f"{'Создано отпечатков по старым отчетам:':<50} {created}")
+    if changed:
+        try:
+            os.makedirs(fingerprint_dir, exist_ok=True)
+            with open(failed_path, 'w', encoding='utf-8') as f:
+                json.dump(failed, f, ensure_ascii=False, indent=1)
+        except OSError as e:
+            logging.warning(f"{'Список непрочитанных отчетов не сохранен:':<50} {str(e)}")
+    return created
+
+
+def compare_fingerprints(new_fp, old_fp):
+    """Сравнение двух отпечатков.
+
+    Хосты с совпадающим хешем набора проблем пропускаются без декодирования.
+    Возвращает словарь в формате reporting.write_comparison_report.
+    """
+    start_time = time.time()
+    new_hosts = set(new_fp['hosts'])
+    old_hosts = set(old_fp['hosts'])
+    new_catalog = set(new_fp['issues'])
+    old_catalog = set(old_fp['issues'])
+    common_issues = new_catalog & old_catalog
+
+    fixed_vulnerabilities = []
+    new_vulnerabilities = []
+    unchanged = 0
+
+    for host in sorted(new_hosts & old_hosts):
+        if new_fp['hosts'][host]['hash'] == old_fp['hosts'][host]['hash']:
+            unchanged += 1
+            continue
+
+        issues_new = decode_host_issues(new_fp, host) & common_issues
+        issues_old = decode_host_issues(old_fp, host) & common_issues
+
+        for issue in sorted(issues_old - issues_new):
+            fixed_vulnerabilities.append({'Issue': issue, 'Device': host, 'Статус': 'Исправлено'})
+        for issue in sorted(issues_new - issues_old):
+            new_vulnerabilities.append({'Issue': issue, 'Device': host, 'Статус': 'Появилось'})
+
+    logging.info(f"{'Хостов без изменений (пропущено):':<50} {unchanged}")
+    logging.debug(f"{'Сравнение отпечатков:':<50} {time.time() - start_time:.3f} сек")
+
+    return {
+        'new_devices': sorted(new_hosts - old_hosts),
+        'removed_devices': sorted(old_hosts - new_hosts),
+        'new_issues': sorted(new_catalog - old_catalog),
+        'fixed_issues': sorted(old_catalog - new_catalog),
+        'fixed_vulnerabilities': fixed_vulnerabilities,
+        'new_vulnerabilities': new_vulnerabilities,
+    }
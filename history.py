@@ -0,0 +1,279 @@
+import os
+import csv
+import sqlite3
+import logging
+import argparse
+from datetime import datetime
+
+from fingerprints import (list_fingerprints, load_fingerprint, decode_host_issues, scanned_hosts,
+                          backfill_fingerprints, TIMESTAMP_FORMAT)
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id      TEXT PRIMARY KEY,       -- метка времени запуска YYYYMMDD_HHMMSS
+    host_count  INTEGER NOT NULL,
+    open_count  INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS intervals (
+    host        TEXT NOT NULL,
+    issue       TEXT NOT NULL,
+    opened_run  TEXT NOT NULL,          -- первый запуск, в котором проблема обнаружена
+    last_seen   TEXT NOT NULL,          -- последний запуск, в котором проблема была
+    closed_run  TEXT                    -- первый запуск без проблемы (NULL - открыта)
+);
+CREATE TABLE IF NOT EXISTS issue_counts (
+    run_id      TEXT NOT NULL,
+    issue       TEXT NOT NULL,
+    open_count  INTEGER NOT NULL,
+    PRIMARY KEY (run_id, issue)
+);
+CREATE INDEX IF NOT EXISTS idx_intervals_host ON intervals (host, issue);
+CREATE INDEX IF NOT EXISTS idx_intervals_issue ON intervals (issue, host);
+CREATE INDEX IF NOT EXISTS idx_intervals_open ON intervals (closed_run);
+"""
+
+
+def _run_time(run_id):
+    return datetime.strptime(run_id, TIMESTAMP_FORMAT)
+
+
+def _days_between(start_run, end_run):
+    return round((_run_time(end_run) - _run_time(start_run)).total_seconds() / 86400, 2)
+
+
+def open_history(db_path):
+    """Открытие (и при необходимости создание) базы истории сканирований"""
+    os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+    conn = sqlite3.connect(db_path)
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def _run_id_from_path(fingerprint_path):
+    name = os.path.basename(fingerprint_path)
+    return name[name.index('_') + 1:-len('.json')]
+
+
+def apply_fingerprint(conn, fingerprint, run_id):
+    """Добавление одного запуска в историю: открытие новых и закрытие исчезнувших проблем.
+
+    Запуски добавляются строго по возрастанию времени; уже учтенные и более ранние
+    запуски пропускаются. Закрываются только проблемы хостов, вошедших в сводку
+    запуска: хост, не попавший в запуск (нет свежей конфигурации, ошибка nipper),
+    проблемы не исправил. Возвращает True, если запуск добавлен.
+    """
+    last_run = conn.execute("SELECT MAX(run_id) FROM runs").fetchone()[0]
+    if last_run and run_id <= last_run:
+        return False
+
+    scanned = scanned_hosts(fingerprint)
+    current = set()
+    for host in fingerprint['hosts']:
+        for issue in decode_host_issues(fingerprint, host):
+            current.add((host, issue))
+
+    with conn:
+        open_rows = conn.execute(
+            "SELECT rowid, host, issue FROM intervals WHERE closed_run IS NULL"
+        ).fetchall()
+        still_open = set()
+        closed_ids = []
+        seen_ids = []
+        for rowid, host, issue in open_rows:
+            if host not in scanned:
+                continue
+            if (host, issue) in current:
+                still_open.add((host, issue))
+                seen_ids.append((run_id, rowid))
+            else:
+                closed_ids.append((run_id, rowid))
+
+        conn.executemany("UPDATE intervals SET last_seen = ? WHERE rowid = ?", seen_ids)
+        conn.executemany("UPDATE intervals SET closed_run = ? WHERE rowid = ?", closed_ids)
+        conn.executemany(
+            "INSERT INTO intervals (host, issue, opened_run, last_seen) VALUES (?, ?, ?, ?)",
+            [(host, issue, run_id, run_id) for host, issue in sorted(current - still_open)]
+        )
+
+        counts = {}
+        for _, issue in current:
+            counts[issue] = counts.get(issue, 0) + 1
+        conn.executemany(
+            "INSERT INTO issue_counts (run_id, issue, open_count) VALUES (?, ?, ?)",
+            [(run_id, issue, count) for issue, count in counts.items()]
+        )
+        conn.execute("INSERT INTO runs (run_id, host_count, open_count) VALUES (?, ?, ?)",
+                     (run_id, len(scanned), len(current)))
+    return True
+
+
+def update_history(db_path, fingerprint_dir):
+    """Инкрементальное обновление истории всеми еще не учтенными отпечатками"""
+    try:
+        conn = open_history(db_path)
+        try:
+            last_run = conn.execute("SELECT MAX(run_id) FROM runs").fetchone()[0]
+            added = 0
+            for _, path in list_fingerprints(fingerprint_dir):
+                run_id = _run_id_from_path(path)
+                if last_run and run_id <= last_run:
+                    continue
+                fingerprint = load_fingerprint(path)
+                if fingerprint and apply_fingerprint(conn, fingerprint, run_id):
+                    added += 1
+        finally:
+            conn.close()
+        logging.info(f"{'История сканирований обновлена:':<50} +{added} запусков")
+        return True
+    except Exception as e:
+        logging.exception(f"{'Ошибка обновления истории:':<50} {str(e)}")
+        return False
+
+
+def backfill_history(db_path, final_results_dir, report_prefix, fingerprint_dir):
+    """Однократное наполнение истории по всем сохраненным итоговым отчетам"""
+    backfill_fingerprints(final_results_dir, report_prefix, fingerprint_dir)
+    return update_history(db_path, fingerprint_dir)
+
+
+def _interval_rows(rows):
+    result = []
+    for host, issue, opened_run, last_seen, closed_run in rows:
+        result.append({
+            'Host': host,
+            'Issue': issue,
+            'First seen': opened_run,
+            'Last seen': last_seen,
+            'Fixed': closed_run or '',
+            'Days open': _days_between(opened_run, closed_run or last_seen),
+        })
+    return result
+
+
+def host_timeline(conn, host):
+    """Все интервалы проблем хоста: когда появилась, когда исправлена, сколько была открыта"""
+    return _interval_rows(conn.execute(
+        "SELECT host, issue, opened_run, last_seen, closed_run FROM intervals "
+        "WHERE host = ? ORDER BY issue, opened_run", (host,)
+    ).fetchall())
+
+
+def issue_timeline(conn, issue):
+    """Все интервалы проблемы по хостам"""
+    return _interval_rows(conn.execute(
+        "SELECT host, issue, opened_run, last_seen, closed_run FROM intervals "
+        "WHERE issue = ? ORDER BY host, opened_run", (issue,)
+    ).fetchall())
+
+
+def time_to_fix(conn, issue=None):
+    """Статистика времени до исправления (в днях) по проблемам"""
+    query = ("SELECT issue, opened_run, closed_run FROM intervals WHERE closed_run IS NOT NULL"
+             + (" AND issue = ?" if issue else ""))
+    durations = {}
+    for name, opened_run, closed_run in conn.execute(query, (issue,) if issue else ()):
+        durations.setdefault(name, []).append(_days_between(opened_run, closed_run))
+
+    result = []
+    for name, values in sorted(durations.items()):
+        values.sort()
+        result.append({
+            'Issue': name,
+            'Fixed count': len(values),
+            'Mean days': round(sum(values) / len(values), 2),
+            'Median days': values[len(values) // 2],
+            'Max days': values[-1],
+        })
+    return result
+
+
+def open_count_series(conn, issue=None):
+    """Временной ряд числа открытых проблем (всех или одной) по запускам"""
+    if issue:
+        rows = conn.execute(
+            "SELECT r.run_id, COALESCE(c.open_count, 0) FROM runs r "
+            "LEFT JOIN issue_counts c ON c.run_id = r.run_id AND c.issue = ? "
+            "ORDER BY r.run_id", (issue,)
+        ).fetchall()
+    else:
+        rows = conn.execute("SELECT run_id, open_count FROM runs ORDER BY run_id").fetchall()
+    return [{'Run': run_id, 'Open': count} for run_id, count in rows]
+
+
+def export_history(conn, output_path):
+    """Выгрузка истории: .xlsx (листы интервалов, времени исправления и ряда) или .csv (интервалы)"""
+    intervals = _interval_rows(conn.execute(
+        "SELECT host, issue, opened_run, last_seen, closed_run FROM intervals ORDER BY host, issue, opened_run"
+    ).fetchall())
+
+    if output_path.lower().endswith('.csv'):
+        with open(output_path, 'w', encoding='utf-8-sig', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=['Host', 'Issue', 'First seen', 'Last seen', 'Fixed', 'Days open'])
+            writer.writeheader()
+            writer.writerows(intervals)
+    else:
+        import pandas as pd
+
+        with pd.ExcelWriter(output_path) as writer:
+            pd.DataFrame(intervals).to_excel(writer, sheet_name='Интервалы', index=False)
+            pd.DataFrame(time_to_fix(conn)).to_excel(writer, sheet_name='Время исправления', index=False)
+            pd.DataFrame(open_count_series(conn)).to_excel(writer, sheet_name='Открытые проблемы', index=False)
+    return output_path
+
+
+def _print_rows(rows):
+    if not rows:
+        print("Нет данных")
+        return
+    columns = list(rows[0])
+    widths = {c: max(len(c), *(len(str(r[c])) for r in rows)) for c in columns}
+    print('  '.join(c.ljust(widths[c]) for c in columns))
+    for row in rows:
+        print('  '.join(str(row[c]).ljust(widths[c]) for c in columns))
+
+
+def main():
+    from config import load_settings
+
+    settings = load_settings()
+
+    parser = argparse.ArgumentParser(description='История сканирований Nipper')
+    parser.add_argument('--db', default=settings.HISTORY_DB, help='Путь к базе истории')
+    sub = parser.add_subparsers(dest='command', required=True)
+    sub.add_parser('backfill', help='Наполнить историю по всем сохраненным отчетам')
+    sub.add_parser('update', help='Добавить новые запуски')
+    sub.add_parser('host', help='Хронология проблем хоста').add_argument('host')
+    sub.add_parser('issue', help='Хронология проблемы по хостам').add_argument('issue')
+    sub.add_parser('ttf', help='Время до исправления').add_argument('issue', nargs='?')
+    sub.add_parser('series', help='Число открытых проблем по запускам').add_argument('issue', nargs='?')
+    sub.add_parser('export', help='Выгрузка в .xlsx или .csv').add_argument('output')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+
+    if args.command == 'backfill':
+        backfill_history(args.db, settings.FINAL_RESULTS_DIR, settings.REPORT_PREFIX, settings.FINGERPRINT_DIR)
+        return
+    if args.command == 'update':
+        update_history(args.db, settings.FINGERPRINT_DIR)
+        return
+
+    conn = open_history(args.db)
+    try:
+        if args.command == 'host':
+            _print_rows(host_timeline(conn, args.host))
+        elif args.command == 'issue':
+            _print_rows(issue_timeline(conn, args.issue))
+        elif args.command == 'ttf':
+            _print_rows(time_to_fix(conn, args.issue))
+        elif args.command == 'series':
+            _print_rows(open_count_series(conn, args.issue))
+        elif args.command == 'export':
+            print(export_history(conn, args.output))
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
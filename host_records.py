@@ -0,0 +1,174 @@
+import os
+import json
+import logging
+import threading
+
+from report_store import is_xml_report, open_report, host_from_report_name
+
+
+# Записи находок хранятся рядом с отчетами: <reports_dir>/.findings/<имя файла отчета>.json
+RECORD_DIR_NAME = '.findings'
+
+
+def record_dir_for(reports_dir):
+    return os.path.join(reports_dir, RECORD_DIR_NAME)
+
+
+def _record_path(record_dir, report_path):
+    return os.path.join(record_dir, os.path.basename(report_path) + '.json')
+
+
+def _report_stamp(report_path):
+    """Размер и время изменения отчета: запись действительна, пока отчет не изменился"""
+    stat = os.stat(report_path)
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+class DescribedIssues:
+    """Уязвимости, описания которых уже записаны при сканировании (общий для рабочих потоков).
+
+    Описание каждой уязвимости извлекается из отчета только одного хоста: поиск
+    описаний в отчете ограничивается уязвимостями, которые еще никто не взял.
+    Не найденное в отчете описание снова ищется в отчетах следующих хостов;
+    предупреждение о нем выводится один раз на уязвимость.
+    """
+    def __init__(self):
+        self._claimed = set()
+        self._warned = set()
+        self._lock = threading.Lock()
+
+    def claim(self, issues):
+        """Уязвимости из issues, описания которых еще не ищутся другими потоками"""
+        with self._lock:
+            new = [issue for issue in dict.fromkeys(issues) if issue not in self._claimed]
+            self._claimed.update(new)
+            return new
+
+    def missing(self, report_path, issues):
+        """Описания issues не найдены в отчете - их можно искать в других отчетах"""
+        with self._lock:
+            self._claimed.difference_update(issues)
+            new = [issue for issue in issues if issue not in self._warned]
+            self._warned.update(new)
+        for issue in new:
+            logging.warning(f"Уязвимость не найдена в отчете: {issue} ({os.path.basename(report_path)})")
+
+
+def extract_report_findings(report_path, described=None):
+    """Рекомендации и (при described) описания уязвимостей за один разбор отчета.
+
+    described - DescribedIssues запуска: извлекаются описания только тех
+    уязвимостей хоста, которые еще не описаны по отчетам других хостов.
+    Возвращает (рекомендации, {уязвимость: описание}).
+    """
+    from nipper_processing import extract_recommendations, recommendations_from_soup
+    from task_distribution import extract_vulnerability_descriptions, descriptions_from_soup
+
+    def claimed(recommendations):
+        return described.claim([rec['Issue'] for rec in recommendations]) if described is not None else []
+
+    def report_missing(issues, descriptions):
+        if described is not None:
+            described.missing(report_path, [issue for issue in issues if issue not in descriptions])
+
+    if is_xml_report(report_path):
+        recommendations = extract_recommendations(report_path)
+        issues = claimed(recommendations)
+        descriptions = extract_vulnerability_descriptions(report_path, issues, warn_missing=False)
+        report_missing(issues, descriptions)
+        return recommendations, descriptions
+
+    from bs4 import BeautifulSoup
+
+    with open_report(report_path) as f:
+        soup = BeautifulSoup(f, 'html.parser')
+    recommendations = recommendations_from_soup(soup)
+    issues = claimed(recommendations)
+    descriptions = descriptions_from_soup(soup, issues, warn_missing=False)
+    report_missing(issues, descriptions)
+    return recommendations, descriptions
+
+
+def write_host_record(record_dir, report_path, recommendations, descriptions=None):
+    """Запись находок хоста для сохраненного отчета report_path"""
+    os.makedirs(record_dir, exist_ok=True)
+    record = {
+        'host': host_from_report_name(os.path.basename(report_path)),
+        'report': os.path.basename(report_path),
+        'stamp': _report_stamp(report_path),
+        'recommendations': recommendations,
+        'descriptions': descriptions or {},
+    }
+    path = _record_path(record_dir, report_path)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(record, f, ensure_ascii=False, separators=(',', ':'))
+    os.replace(tmp_path, path)
+    return path
+
+
+def copy_host_records(fanned_reports, record_dir):
+    """Записи для отчетов, распространенных на эквивалентные хосты (file_operations.fan_out_reports)"""
+    records = HostRecords(record_dir)
+    copied = 0
+    for member_report, source_report in fanned_reports.items():
+        record = records.get(source_report)
+        if record:
+            write_host_record(record_dir, member_report, record['recommendations'], record['descriptions'])
+            copied += 1
+    return copied
+
+
+class HostRecords:
+    """Чтение записей находок по хостам, сделанных рабочими потоками при сканировании.
+
+    Запись используется, только если отчет не менялся после ее создания; иначе
+    (и при отсутствии записи) вызывающий код разбирает отчет сам.
+    """
+    def __init__(self, record_dir):
+        self.record_dir = record_dir
+        self._cache = {}
+
+    def get(self, report_path):
+        key = os.path.normpath(report_path)
+        if key not in self._cache:
+            self._cache[key] = self._load(report_path)
+        return self._cache[key]
+
+    def _load(self, report_path):
+        path = _record_path(self.record_dir, report_path)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                record = json.load(f)
+            if record.get('stamp') != _report_stamp(report_path):
+                return None
+            return record
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logging.debug(f"{'Запись находок не прочитана:':<50} {path} ({str(e)})")
+            return None
+
+    def recommendations(self, report_path):
+        record = self.get(report_path)
+        return record['recommendations'] if record else None
+
+    def description(self, report_path, issue):
+        record = self.get(report_path)
+        return record['descriptions'].get(issue) if record else None
+
+
+def record_report(report_path, record_dir, described=None):
+    """Разбор только что сохраненного отчета и запись находок хоста.
+
+    Вызывается в рабочем потоке сразу после nipper, пока отчет в кэше ОС.
+    described - DescribedIssues запуска, если нужны и описания уязвимостей.
+    Возвращает рекомендации (None при ошибке разбора).
+    """
+    try:
+        recommendations, descriptions = extract_report_findings(report_path, described)
+        write_host_record(record_dir, report_path, recommendations, descriptions)
+        return recommendations
+    except Exception as e:
+        logging.error(f"{'Ошибка записи находок хоста:':<50} {os.path.basename(report_path)}\n{str(e)}")
+        return None
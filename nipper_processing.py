@@ -1,103 +1,471 @@
 import os
+import time
+import asyncio
 import subprocess
 import logging
-from bs4 import BeautifulSoup
 from functools import lru_cache
 from concurrent.futures import ThreadPoolExecutor, as_completed
+from report_store import open_report, store_report, prune_store, is_xml_report
+from utils import ProgressBar, file_size
+from resources import apply_job_limits, job_preexec_fn
+from host_records import record_report
 
 
-def process_single_file(args):
-    """Обработка одного файла утилитой nipper с выводом полного лога при ошибках"""
-    filename, configs_dir, reports_dir, nipper_exe, scanned_device = args
+def _read_log_tail(log_path, max_bytes=4096):
+    """Чтение последних байт лога задачи nipper для быстрой диагностики"""
     try:
-        input_path = os.path.join(configs_dir, filename)
-        report_name = os.path.splitext(filename)[0] + '_report.html'
-        output_path = os.path.join(reports_dir, report_name)
-
-        command = [
-            nipper_exe,
-            f'--input={input_path}',
-            f'--output={output_path}',
-            scanned_device
-        ]
+        with open(log_path, 'rb') as f:
+            f.seek(0, os.SEEK_END)
+            size = f.tell()
+            f.seek(max(0, size - max_bytes))
+            return f.read().decode('utf-8', errors='replace')
+    except OSError:
+        return ''
+
+
+def _job_output_path(reports_dir, report_name, scratch):
+    """Путь вывода nipper: рабочая папка в памяти, если в ней есть место, иначе reports_dir.
+
+    Возвращает (путь, зарезервированный в scratch объем).
+    """
+    if scratch:
+        reserved = scratch.report_estimate
+        if scratch.reserve(reserved):
+            return os.path.join(scratch.subdir('reports'), report_name), reserved
+    return os.path.join(reports_dir, report_name), 0
+
+
+def _spill_job_output(filename, output_path, reports_dir, scratch, reserved):
+    """Повтор задачи с выводом в reports_dir, если nipper завершился ошибкой, а в
+    рабочей папке кончилось место (запись отчета в tmpfs могла не поместиться).
+
+    Возвращает (новый путь вывода, зарезервированный объем) или None, если повтор не нужен.
+    """
+    if not reserved or not scratch.exhausted():
+        return None
+    logging.warning(f"{'Нет места в рабочей папке, повтор на диске:':<50} {filename}")
+    _release_job_output(output_path, scratch, reserved)
+    scratch.record_retry()
+    return os.path.join(reports_dir, os.path.basename(output_path)), 0
 
-        result = subprocess.run(
+
+def _nipper_command(nipper_exe, input_path, output_path, scanned_device, format_options):
+    return [
+        nipper_exe,
+        f'--input={input_path}',
+        f'--output={output_path}',
+        scanned_device,
+        *format_options
+    ]
+
+
+def _run_nipper(command, log_path, limits):
+    """Запуск nipper с выводом в лог задачи; возвращает (код возврата, время работы, сек)"""
+    preexec = job_preexec_fn(limits)
+    # stdout/stderr пишутся ОС напрямую в файл, без буферизации в памяти
+    with open(log_path, 'wb') as log_file:
+        started = time.monotonic()
+        process = subprocess.Popen(
             command,
-            check=True,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True
+            stdin=subprocess.DEVNULL,
+            stdout=log_file,
+            stderr=subprocess.STDOUT,
+            preexec_fn=preexec
         )
+        apply_job_limits(process.pid, limits, in_child=preexec is not None)
+        returncode = process.wait()
+    return returncode, round(time.monotonic() - started, 3)
 
-        logging.debug(f"{'Успешно обработан:':<50} {filename}")
-        if result.stdout.strip():
-            logging.debug(f"stdout:\n{result.stdout}")
-        if result.stderr.strip():
-            logging.debug(f"stderr:\n{result.stderr}")
 
-        return True
-    except subprocess.CalledProcessError as e:
-        logging.error(f"Nipper ошибка при обработке файла {filename}:\n"
-                      f"stdout:\n{e.stdout}\nstderr:\n{e.stderr}\nОшибка: {str(e)}")
-
-        # Вывод в консоль для удобства немедленной диагностики
-        print(f"\n----- Ошибка nipper.exe для файла {filename} -----")
-        if e.stdout:
-            print("stdout:")
-            print(e.stdout)
-        if e.stderr:
-            print("stderr:")
-            print(e.stderr)
-        print("--------------------------------------------------\n")
+def _release_job_output(output_path, scratch, reserved):
+    """Освобождение места в рабочей папке (вывод неудачной задачи удаляется)"""
+    if reserved:
+        try:
+            if os.path.exists(output_path):
+                os.remove(output_path)
+        except OSError:
+            pass
+        scratch.release(reserved)
 
-        return False
+
+def _store_job_report(output_path, reports_dir, compression, dedup, scratch, reserved):
+    """Сохранение отчета в reports_dir (из рабочей папки - сразу сжатым)"""
+    if reserved:
+        scratch.observe_report(os.path.getsize(output_path))
+    return store_report(output_path, compression, dedup, reports_dir)
+
+
+def process_single_file(args):
+    """Обработка одного файла утилитой nipper.
+
+    Вывод nipper пишется в лог задачи <job_log_dir>/<хост>.log; при ошибке в общий
+    лог попадает только ссылка на этот файл. При заданном record_dir отчет сразу
+    разбирается и находки хоста записываются в record_dir (host_records.py).
+    При заданном scratch (scratch.ScratchWorkspace) nipper пишет отчет в рабочую
+    папку в памяти, а в reports_dir попадает только сохраненный (сжатый) отчет;
+    если рабочая папка переполнилась, задача повторяется с выводом в reports_dir.
+    В durations (если задан) записывается время работы процесса nipper, сек.
+    """
+    (filename, configs_dir, reports_dir, nipper_exe, scanned_device,
+     compression, dedup, output_format, format_options, job_log_dir,
+     limits, memory_budget, job_memory_mb, record_dir, record_descriptions, scratch, durations) = args
+    output_path, reserved = None, 0
+    try:
+        input_path = os.path.join(configs_dir, filename)
+        report_name = os.path.splitext(filename)[0] + f'_report.{output_format}'
+        output_path, reserved = _job_output_path(reports_dir, report_name, scratch)
+        log_path = os.path.join(job_log_dir, os.path.splitext(filename)[0] + '.log')
+
+        if memory_budget:
+            memory_budget.acquire(job_memory_mb)
+        try:
+            returncode, seconds = _run_nipper(
+                _nipper_command(nipper_exe, input_path, output_path, scanned_device, format_options),
+                log_path, limits)
+            spilled = returncode != 0 and _spill_job_output(filename, output_path, reports_dir, scratch, reserved)
+            if spilled:
+                output_path, reserved = spilled
+                returncode, seconds = _run_nipper(
+                    _nipper_command(nipper_exe, input_path, output_path, scanned_device, format_options),
+                    log_path, limits)
+            if durations is not None:
+                durations[filename] = seconds
+        finally:
+            if memory_budget:
+                memory_budget.release(job_memory_mb)
+
+        if returncode != 0:
+            logging.error(f"Nipper ошибка при обработке файла {filename}: "
+                          f"код возврата {returncode}, лог задачи: {log_path}")
+
+            # Вывод хвоста лога в консоль для удобства немедленной диагностики
+            print(f"\n----- Ошибка nipper.exe для файла {filename} (код {returncode}) -----")
+            print(_read_log_tail(log_path))
+            print(f"Полный вывод: {log_path}")
+            print("--------------------------------------------------\n")
+            return False
+
+        logging.debug(f"{'Успешно обработан:':<50} {filename} (лог: {log_path})")
+        report_path = _store_job_report(output_path, reports_dir, compression, dedup, scratch, reserved)
+        if record_dir:
+            record_report(report_path, record_dir, record_descriptions)
+        return True
     except Exception as e:
         logging.error(f"Ошибка обработки файла {filename}: {str(e)}")
         print(f"Ошибка обработки файла {filename}: {str(e)}")
         return False
+    finally:
+        _release_job_output(output_path, scratch, reserved)
+
 
+def process_with_nipper(configs_dir, reports_dir, nipper_exe, scanned_device, max_workers=4,
+                        compression=None, dedup=True, files=None, output_format='html', format_options=(),
+                        job_log_dir=None, limits=None, memory_budget=None, job_memory_mb=0, on_done=None,
+                        record_dir=None, record_descriptions=None, scratch=None, durations=None):
+    """Обработка файлов утилитой nipper с использованием пула потоков
 
-def process_with_nipper(configs_dir, reports_dir, nipper_exe, scanned_device, max_workers=4):
-    """Обработка файлов утилитой nipper с использованием пула потоков"""
+    limits - ограничения каждой задачи (resources.JobLimits), memory_budget - общий
+    бюджет памяти (resources.MemoryBudget), job_memory_mb - оценка памяти одной задачи.
+    Задачи запускаются в порядке списка files. on_done(файл, успех) вызывается в
+    вызывающем потоке по завершении каждой задачи.
+    record_dir - папка записей находок по хостам (host_records.py): отчет разбирается
+    в рабочем потоке сразу после nipper; record_descriptions - host_records.DescribedIssues,
+    если нужны и описания уязвимостей.
+    scratch - рабочая папка в памяти для вывода nipper (scratch.ScratchWorkspace).
+    durations - словарь, в который записывается время работы nipper по файлам, сек.
+    """
     try:
-        files = [f for f in os.listdir(configs_dir) if f.lower().endswith('.txt')]
+        if files is None:
+            files = [f for f in os.listdir(configs_dir) if f.lower().endswith('.txt')]
 
         if not files:
             logging.warning(f"{'Файлы для обработки:':<50} не найдены")
             return False
 
+        job_log_dir = job_log_dir or os.path.join(reports_dir, 'nipper_jobs')
+        os.makedirs(job_log_dir, exist_ok=True)
+
         logging.info(f"{'Обработка файлов:':<50} {len(files)} файлов в {max_workers} потоках")
+        logging.info(f"{'Логи задач nipper:':<50} {job_log_dir}")
 
         task_args = [
-            (f, configs_dir, reports_dir, nipper_exe, scanned_device)
+            (f, configs_dir, reports_dir, nipper_exe, scanned_device, compression, dedup,
+             output_format, format_options, job_log_dir, limits, memory_budget, job_memory_mb,
+             record_dir, record_descriptions, scratch, durations)
             for f in files
         ]
 
         success_count = 0
+        progress = ProgressBar(len(files), "Обработка nipper")
         with ThreadPoolExecutor(max_workers=max_workers) as executor:
-            futures = [executor.submit(process_single_file, args) for args in task_args]
+            futures = {executor.submit(process_single_file, args): args[0] for args in task_args}
             for future in as_completed(futures):
-                if future.result():
+                ok = future.result()
+                if ok:
                     success_count += 1
+                progress.update(1, file_size(os.path.join(configs_dir, futures[future])))
+                if on_done:
+                    on_done(futures[future], ok)
+        progress.close()
 
         logging.info(f"{'Успешно обработано:':<50} {success_count}/{len(files)} файлов")
+        prune_store(reports_dir)
         return success_count > 0
     except Exception as e:
         logging.exception(f"{'Ошибка обработки:':<50} {str(e)}")
         return False
 
 
+async def _run_nipper_job(filename, configs_dir, reports_dir, nipper_exe, scanned_device,
+                          job_log_dir, semaphore, compression, dedup, output_format, format_options,
+                          limits=None, memory_budget=None, job_memory_mb=0, scratch=None,
+                          durations=None):
+    """Асинхронный запуск nipper для одного файла с потоковой записью вывода в лог задачи.
+
+    Возвращает путь к отчету при успехе, иначе None.
+    """
+    async with semaphore:
+        if memory_budget:
+            await memory_budget.acquire_async(job_memory_mb)
+        try:
+            return await _run_nipper_process(filename, configs_dir, reports_dir, nipper_exe,
+                                             scanned_device, job_log_dir, compression, dedup,
+                                             output_format, format_options, limits, scratch,
+                                             durations)
+        finally:
+            if memory_budget:
+                await memory_budget.release_async(job_memory_mb)
+
+
+async def _run_nipper_process(filename, configs_dir, reports_dir, nipper_exe, scanned_device,
+                              job_log_dir, compression, dedup, output_format, format_options, limits,
+                              scratch=None, durations=None):
+    """Запуск процесса nipper с ограничениями ресурсов; возвращает путь к отчету или None"""
+    input_path = os.path.join(configs_dir, filename)
+    report_name = os.path.splitext(filename)[0] + f'_report.{output_format}'
+    output_path, reserved = _job_output_path(reports_dir, report_name, scratch)
+    try:
+        report_path = await _run_nipper_command(filename, input_path, output_path, reports_dir, nipper_exe,
+                                                scanned_device, job_log_dir, compression, dedup,
+                                                format_options, limits, scratch, reserved, durations)
+        spilled = report_path is None and _spill_job_output(filename, output_path, reports_dir, scratch, reserved)
+        if spilled:
+            output_path, reserved = spilled
+            report_path = await _run_nipper_command(filename, input_path, output_path, reports_dir, nipper_exe,
+                                                    scanned_device, job_log_dir, compression, dedup,
+                                                    format_options, limits, scratch, reserved, durations)
+        return report_path
+    finally:
+        _release_job_output(output_path, scratch, reserved)
+
+
+async def _run_nipper_command(filename, input_path, output_path, reports_dir, nipper_exe, scanned_device,
+                              job_log_dir, compression, dedup, format_options, limits, scratch, reserved,
+                              durations):
+    """Выполнение nipper и сохранение отчета в reports_dir; возвращает путь к отчету или None"""
+    log_path = os.path.join(job_log_dir, os.path.splitext(filename)[0] + '.log')
+    command = _nipper_command(nipper_exe, input_path, output_path, scanned_device, format_options)
+
+    try:
+        # stdout/stderr пишутся ОС напрямую в файл, без буферизации в памяти
+        preexec = job_preexec_fn(limits)
+        with open(log_path, 'wb') as log_file:
+            started = time.monotonic()
+            process = await asyncio.create_subprocess_exec(
+                *command,
+                stdin=asyncio.subprocess.DEVNULL,
+                stdout=log_file,
+                stderr=asyncio.subprocess.STDOUT,
+                preexec_fn=preexec
+            )
+            apply_job_limits(process.pid, limits, in_child=preexec is not None)
+            try:
+                returncode = await process.wait()
+            except asyncio.CancelledError:
+                # Прерывание (Ctrl-C): не оставляем дочерние процессы nipper
+                try:
+                    process.kill()
+                except ProcessLookupError:
+                    pass
+                await process.wait()
+                raise
+            if durations is not None:
+                durations[filename] = round(time.monotonic() - started, 3)
+    except asyncio.CancelledError:
+        logging.warning(f"{'Задача nipper прервана:':<50} {filename}")
+        raise
+    except Exception as e:
+        logging.error(f"Ошибка запуска nipper для файла {filename}: {str(e)}")
+        print(f"Ошибка обработки файла {filename}: {str(e)}")
+        return None
+
+    if returncode != 0:
+        logging.error(f"Nipper ошибка при обработке файла {filename}: "
+                      f"код возврата {returncode}, лог задачи: {log_path}")
+
+        # Вывод хвоста лога в консоль для удобства немедленной диагностики
+        print(f"\n----- Ошибка nipper.exe для файла {filename} (код {returncode}) -----")
+        print(_read_log_tail(log_path))
+        print(f"Полный вывод: {log_path}")
+        print("--------------------------------------------------\n")
+        return None
+
+    logging.debug(f"{'Успешно обработан:':<50} {filename} (лог: {log_path})")
+    try:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, _store_job_report, output_path, reports_dir,
+                                          compression, dedup, scratch, reserved)
+    except Exception as e:
+        logging.error(f"{'Ошибка сохранения отчета:':<50} {output_path}\n{str(e)}")
+        if not os.path.exists(output_path):
+            return None
+        # Отчет остается несжатым в reports_dir
+        return store_report(output_path, None, reports_dir=reports_dir)
+
+
+async def _process_with_nipper_async(files, configs_dir, reports_dir, nipper_exe, scanned_device,
+                                     max_workers, job_log_dir, extract, compression, dedup,
+                                     output_format, format_options, limits=None, memory_budget=None,
+                                     job_memory_mb=0, on_done=None, record_dir=None,
+                                     record_descriptions=None, scratch=None, durations=None):
+    """Оркестрация задач nipper: ограничение параллелизма семафором и извлечение
+    рекомендаций по мере завершения задач"""
+    loop = asyncio.get_running_loop()
+    semaphore = asyncio.Semaphore(max_workers)
+    extracted = {}
+    extraction_futures = []
+    success_count = 0
+
+    async def extract_report(report_path):
+        if record_dir:
+            recommendations = await loop.run_in_executor(
+                None, record_report, report_path, record_dir, record_descriptions
+            )
+            if extract:
+                extracted[report_path] = recommendations
+        else:
+            extracted[report_path] = await loop.run_in_executor(
+                None, extract_recommendations, report_path
+            )
+
+    async def run_job(filename):
+        report_path = await _run_nipper_job(filename, configs_dir, reports_dir, nipper_exe,
+                                            scanned_device, job_log_dir, semaphore,
+                                            compression, dedup, output_format, format_options,
+                                            limits, memory_budget, job_memory_mb, scratch, durations)
+        progress.update(1, file_size(os.path.join(configs_dir, filename)))
+        if on_done:
+            on_done(filename, report_path is not None)
+        return report_path
+
+    progress = ProgressBar(len(files), "Обработка nipper")
+    jobs = [asyncio.ensure_future(run_job(f)) for f in files]
+    try:
+        for job in asyncio.as_completed(jobs):
+            report_path = await job
+            if not report_path:
+                continue
+            success_count += 1
+            if extract or record_dir:
+                # Отчет еще "горячий" в кэше ОС - сразу передаем его на разбор
+                extraction_futures.append(asyncio.ensure_future(extract_report(report_path)))
+
+        if extraction_futures:
+            await asyncio.gather(*extraction_futures)
+    finally:
+        for job in jobs + extraction_futures:
+            if not job.done():
+                job.cancel()
+        await asyncio.gather(*jobs, *extraction_futures, return_exceptions=True)
+        progress.close()
+
+    return success_count, extracted
+
+
+def process_with_nipper_async(configs_dir, reports_dir, nipper_exe, scanned_device, max_workers=4,
+                              job_log_dir=None, extract=True, compression=None, dedup=True, files=None,
+                              output_format='html', format_options=(), limits=None, memory_budget=None,
+                              job_memory_mb=0, on_done=None, record_dir=None, record_descriptions=None,
+                              scratch=None, durations=None):
+    """Обработка файлов утилитой nipper на asyncio с потоковым выводом в логи задач.
+
+    Возвращает словарь {путь к отчету: список рекомендаций} (пустой при
+    extract=False) или None, если ни один файл не обработан.
+    files - необязательный список файлов из configs_dir (по умолчанию все .txt).
+    limits, memory_budget, job_memory_mb, on_done, record_dir, record_descriptions, scratch,
+    durations - как у process_with_nipper
+    (on_done вызывается в цикле событий и не должен блокировать).
+    """
+    try:
+        if files is None:
+            files = [f for f in os.listdir(configs_dir) if f.lower().endswith('.txt')]
+
+        if not files:
+            logging.warning(f"{'Файлы для обработки:':<50} не найдены")
+            return None
+
+        os.makedirs(reports_dir, exist_ok=True)
+        job_log_dir = job_log_dir or os.path.join(reports_dir, 'nipper_jobs')
+        os.makedirs(job_log_dir, exist_ok=True)
+
+        logging.info(f"{'Обработка файлов (asyncio):':<50} {len(files)} файлов, до {max_workers} одновременно")
+        logging.info(f"{'Логи задач nipper:':<50} {job_log_dir}")
+
+        success_count, extracted = asyncio.run(_process_with_nipper_async(
+            files, configs_dir, reports_dir, nipper_exe, scanned_device,
+            max(1, max_workers), job_log_dir, extract, compression, dedup,
+            output_format, format_options, limits, memory_budget, job_memory_mb, on_done,
+            record_dir, record_descriptions, scratch, durations
+        ))
+
+        logging.info(f"{'Успешно обработано:':<50} {success_count}/{len(files)} файлов")
+        prune_store(reports_dir)
+        if not success_count:
+            return None
+        return extracted
+    except KeyboardInterrupt:
+        logging.warning(f"{'Обработка nipper прервана:':<50} задачи остановлены (Ctrl-C)")
+        raise
+    except Exception as e:
+        logging.exception(f"{'Ошибка обработки:':<50} {str(e)}")
+        return None
+
+
 @lru_cache(maxsize=100)
 def parse_html(html_path):
     """Кэшированный парсинг HTML с BeautifulSoup"""
+    from bs4 import BeautifulSoup
+
     try:
-        with open(html_path, 'r', encoding='utf-8') as f:
+        with open_report(html_path) as f:
             return BeautifulSoup(f, 'html.parser')
     except Exception as e:
         logging.error(f"{'Ошибка чтения HTML:':<50} {html_path}\n{str(e)}")
         return None
 
 
+def recommendations_from_soup(soup):
+    """Таблица Recommendations разобранного HTML-отчета nipper"""
+    recommendations = []
+    for header in soup.find_all(['h1', 'h2', 'h3', 'h4', 'h5', 'h6']):
+        if 'Recommendations' in header.text:
+            table = header.find_next('table')
+            if table:
+                for row in table.find_all('tr')[1:]:
+                    cols = row.find_all('td')
+                    if len(cols) >= 6:
+                        recommendations.append({
+                            'Issue':          cols[0].get_text(strip=True),
+                            'Overall':        cols[1].get_text(strip=True),
+                            'Impact':         cols[2].get_text(strip=True),
+                            'Ease':           cols[3].get_text(strip=True),
+                            'Fix':            cols[4].get_text(strip=True),
+                            'Recommendation': cols[5].get_text(strip=True),
+                        })
+            break
+    return recommendations
+
+
 def extract_recommendations_from_html(html_path):
     """Извлечение рекомендаций из HTML-отчета"""
     try:
@@ -105,26 +473,17 @@ def extract_recommendations_from_html(html_path):
         if not soup:
             return []
 
-        recommendations = []
-        for header in soup.find_all(['h1', 'h2', 'h3', 'h4', 'h5', 'h6']):
-            if 'Recommendations' in header.text:
-                table = header.find_next('table')
-                if table:
-                    for row in table.find_all('tr')[1:]:
-                        cols = row.find_all('td')
-                        if len(cols) >= 6:
-                            recommendations.append({
-                                'Issue':          cols[0].get_text(strip=True),
-                                'Overall':        cols[1].get_text(strip=True),
-                                'Impact':         cols[2].get_text(strip=True),
-                                'Ease':           cols[3].get_text(strip=True),
-                                'Fix':            cols[4].get_text(strip=True),
-                                'Recommendation': cols[5].get_text(strip=True),
-                            })
-                break
-
+        recommendations = recommendations_from_soup(soup)
         logging.debug(f"{'Извлечено рекомендаций:':<50} {len(recommendations)} из {html_path}")
         return recommendations
     except Exception as e:
         logging.error(f"{'Ошибка обработки HTML:':<50} {html_path}\n{str(e)}")
         return []
+
+
+def extract_recommendations(report_path):
+    """Извлечение рекомендаций из отчета nipper в формате HTML или XML"""
+    if is_xml_report(report_path):
+        from nipper_xml import extract_recommendations_from_xml
+        return extract_recommendations_from_xml(report_path)
+    return extract_recommendations_from_html(report_path)
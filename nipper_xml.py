@@ -0,0 +1,189 @@
+import re
+import logging
+import xml.etree.ElementTree as ET
+
+from report_store import open_report
+
+
+# Структура XML-отчета nipper:
+#   <section title="Recommendations">
+#     <table><headings>...</headings>
+#       <tablebody><tablerow><tablecell><item>Issue</item></tablecell>...</tablerow></tablebody>
+#     </table>
+#   </section>
+#   <section title="2.3. Clear Text Telnet Service Enabled">
+#     <ratings>...</ratings>
+#     <section title="Finding"><text>...</text><code>...</code></section>
+#     ...
+#   </section>
+SECTION_TAG = 'section'
+ROW_TAG = 'tablerow'
+CELL_TAG = 'tablecell'
+RATINGS_TAG = 'ratings'
+TEXT_TAGS = ('text', 'listitem')
+CODE_TAGS = ('code',)
+
+RECOMMENDATIONS_TITLE = 'Recommendations'
+
+
+def _local(tag):
+    """Имя тега без пространства имен"""
+    return tag.rsplit('}', 1)[-1]
+
+
+def _text(element):
+    return ' '.join(''.join(element.itertext()).split())
+
+
+def extract_recommendations_from_xml(xml_path):
+    """Потоковое извлечение рекомендаций из XML-отчета nipper.
+
+    Возвращает записи в формате extract_recommendations_from_html. Разбор
+    прекращается сразу после секции Recommendations.
+    """
+    try:
+        recommendations = []
+        in_recommendations = False
+        depth = 0
+
+        with open_report(xml_path, binary=True) as f:
+            for event, element in ET.iterparse(f, events=('start', 'end')):
+                tag = _local(element.tag)
+
+                if event == 'start':
+                    if tag == SECTION_TAG:
+                        if in_recommendations:
+                            depth += 1
+                        elif RECOMMENDATIONS_TITLE in element.get('title', ''):
+                            in_recommendations = True
+                            depth = 1
+                    continue
+
+                if in_recommendations and tag == ROW_TAG:
+                    cols = [_text(cell) for cell in element if _local(cell.tag) == CELL_TAG]
+                    if len(cols) >= 6:
+                        recommendations.append({
+                            'Issue':          cols[0],
+                            'Overall':        cols[1],
+                            'Impact':         cols[2],
+                            'Ease':           cols[3],
+                            'Fix':            cols[4],
+                            'Recommendation': cols[5],
+                        })
+                    element.clear()
+                elif tag == SECTION_TAG:
+                    if in_recommendations:
+                        depth -= 1
+                        if depth == 0:
+                            break
+                    element.clear()
+
+        logging.debug(f"{'Извлечено рекомендаций:':<50} {len(recommendations)} из {xml_path}")
+        return recommendations
+    except Exception as e:
+        logging.error(f"{'Ошибка обработки XML:':<50} {xml_path}\n{str(e)}")
+        return []
+
+
+def _format_section(section):
+    """Текст секции уязвимости в том же виде, что и описание из HTML"""
+    text_elements = [section.get('title', '').strip()]
+
+    for element in section.iter():
+        tag = _local(element.tag)
+        if element is section:
+            continue
+        if tag == RATINGS_TAG:
+            text_elements.append(_text(element))
+        elif tag == SECTION_TAG:
+            text_elements.append(f"\n{element.get('title', '').strip()}")
+        elif tag in TEXT_TAGS:
+            text = _text(element)
+            if text:
+                text_elements.append(f"  {text}")
+        elif tag in CODE_TAGS:
+            text = ''.join(element.itertext())
+            if text:
+                text_elements.append(f"\n  Команда:\n{text}")
+
+    full_text = '\n'.join(text_elements)
+    full_text = re.sub(r'\n\s*\n', '\n\n', full_text)
+    full_text = re.sub(r'[ \t]+', ' ', full_text)
+    return full_text
+
+
+def extract_vulnerability_description_from_xml(xml_path, issue_name):
+    """Потоковое извлечение описания уязвимости из XML-отчета nipper.
+
+    Сначала ищется секция, заголовок которой содержит issue_name, затем -
+    совпадение без учета регистра и номера раздела ("2.3. ").
+    """
+    return extract_vulnerability_descriptions_from_xml(xml_path, [issue_name]).get(issue_name)
+
+
+def extract_vulnerability_descriptions_from_xml(xml_path, issue_names, warn_missing=True):
+    """Описания нескольких уязвимостей за один потоковый проход по XML-отчету.
+
+    Правила совпадения - как у extract_vulnerability_description_from_xml.
+    Возвращает словарь {уязвимость: описание}; ненайденные уязвимости отсутствуют.
+    Заголовок секции проверяется при ее открытии: в памяти остаются только
+    поддеревья секций, описание которых собирается, остальное освобождается сразу.
+    """
+    if not issue_names:
+        return {}
+    try:
+        pending = set(issue_names)
+        found = {}
+        fallback = {}
+        open_sections = []   # для каждой открытой секции: собирается ли ее описание
+        collecting = 0       # число открытых собираемых секций
+
+        def matches(title):
+            clean_title = re.sub(r'^\d+\.\d+\.\s*', '', title.strip()).lower()
+            for issue_name in list(pending):
+                if issue_name in title:
+                    yield issue_name, True
+                elif issue_name not in fallback and issue_name.lower() in clean_title:
+                    yield issue_name, False
+
+        with open_report(xml_path, binary=True) as f:
+            for event, element in ET.iterparse(f, events=('start', 'end')):
+                is_section = _local(element.tag) == SECTION_TAG
+                if event == 'start':
+                    if is_section:
+                        collect = next(matches(element.get('title', '')), None) is not None
+                        open_sections.append(collect)
+                        collecting += collect
+                    continue
+
+                if not is_section:
+                    # Содержимое несобираемых секций не нужно
+                    if not collecting:
+                        element.clear()
+                    continue
+
+                if open_sections.pop():
+                    collecting -= 1
+                    for issue_name, exact in matches(element.get('title', '')):
+                        if exact:
+                            logging.debug(f"Извлечено описание уязвимости: {issue_name}")
+                            found[issue_name] = _format_section(element)
+                            pending.discard(issue_name)
+                        else:
+                            fallback[issue_name] = _format_section(element)
+
+                # Собираемой секции вложенные секции нужны целиком
+                if not collecting:
+                    element.clear()
+                if not pending:
+                    break
+
+        for issue_name in pending:
+            if issue_name in fallback:
+                found[issue_name] = fallback[issue_name]
+            elif warn_missing:
+                logging.warning(f"Уязвимость не найдена в отчете: {issue_name}")
+        return found
+    except Exception as e:
+        logging.error(f"Ошибка извлечения описания из {xml_path}: {str(e)}")
+        return {}
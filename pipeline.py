@@ -0,0 +1,607 @@
+import os
+import glob
+import time
+import shutil
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from file_operations import (find_latest_folder, get_recent_files, get_config_files, rename_configs,
+                             group_equivalent_configs, fan_out_reports, ingest_sources)
+from nipper_processing import process_with_nipper, process_with_nipper_async
+from reporting import (build_final_report, generate_findings, export_final_report, export_sharded_report,
+                       compare_reports, get_latest_report, write_comparison_report)
+from fingerprints import (backfill_fingerprints, compare_fingerprints, find_fingerprint,
+                          fingerprint_path_for_report, load_fingerprint, set_baseline)
+from findings import load_findings
+from task_distribution import create_tasks, verify_task_structure
+from history import backfill_history
+from report_store import list_reports, host_from_report_name, HostIndex
+from triage import compile_rules, triage_configs
+from utils import ProgressBar, file_size, format_bytes
+from resources import JobLimits, MemoryBudget, job_memory_mb
+from run_record import RunRecord
+from host_records import DescribedIssues, HostRecords, copy_host_records, record_dir_for
+from tiers import PriorityTiers, TierTracker, DEFAULT_TIER, host_shard_function
+from scratch import ScratchWorkspace, move_files
+
+
+# Этапы обработки в порядке выполнения
+STAGES = ('ingest', 'scan', 'summarize', 'tasks', 'compare')
+
+
+class PipelineRun:
+    """Состояние одного запуска: настройки, параметры командной строки и результаты этапов.
+
+    Этапы, не выбранные для запуска, заменяются артефактами предыдущих запусков:
+    конфигурациями в CONFIGS_DIR, отчетами nipper в REPORTS_DIR и итоговым
+    отчетом в FINAL_RESULTS_DIR (или указанным в summary_path).
+    Находки этапа summarize передаются в tasks и compare в памяти.
+    """
+    def __init__(self, settings, stages=STAGES, force=False, quick=False,
+                 compare_against=None, set_baseline=False, summary_path=None):
+        self.settings = settings
+        self.stages = [stage for stage in STAGES if stage in stages]
+        self.force = force
+        self.quick = quick
+        self.compare_against = compare_against or settings.COMPARE_AGAINST
+        self.set_baseline = set_baseline
+        self.summary_path = summary_path
+        self.extracted = None      # {отчет nipper: рекомендации} от асинхронного движка
+        self.scanned = None        # конфигурации, успешно обработанные nipper в этом запуске
+        self.findings = None       # находки этапа summarize (findings.Findings)
+        self._host_index = None
+        self._host_records = None
+        # Рабочая папка в памяти для промежуточных файлов (выключена без SCRATCH_DIR)
+        self.scratch = ScratchWorkspace(settings.SCRATCH_DIR, settings.SCRATCH_BUDGET_MB)
+        self.record = RunRecord(self.stages, settings.PROFILE_MEMORY, settings.PROFILE_TOP_ALLOCATIONS)
+
+    @property
+    def full_run(self):
+        return list(self.stages) == list(STAGES)
+
+    @property
+    def host_index(self):
+        """Индекс хост -> отчет/конфигурация (строится один раз, после этапа scan)"""
+        if self._host_index is None:
+            self._host_index = HostIndex(self.settings.REPORTS_DIR, self.settings.CONFIGS_DIR)
+        return self._host_index
+
+    @property
+    def host_records(self):
+        """Записи находок по хостам, сделанные при сканировании (None, если выключены)"""
+        if self._host_records is None and self.settings.FINDINGS_RECORDS:
+            self._host_records = HostRecords(record_dir_for(self.settings.REPORTS_DIR))
+        return self._host_records
+
+
+def select_stages(stages=None, first=None, last=None):
+    """Список этапов по перечню и/или границам диапазона (first..last включительно)"""
+    selected = [stage for stage in STAGES if not stages or stage in stages]
+    if first:
+        selected = [stage for stage in selected if STAGES.index(stage) >= STAGES.index(first)]
+    if last:
+        selected = [stage for stage in selected if STAGES.index(stage) <= STAGES.index(last)]
+    return selected
+
+
+def _stage_failed(run, message):
+    """Обработка ошибки этапа: с --force выполнение продолжается"""
+    if run.force:
+        logging.warning(f"{'Продолжаем:':<50} {message} (--force)")
+        return True
+    logging.error(f"{'Остановка:':<50} {message}")
+    return False
+
+
+def check_dependencies(run):
+    """Проверка, что для каждого выбранного этапа есть входные данные.
+
+    Входы этапа берутся либо из предыдущего выбранного этапа, либо из
+    сохраненных артефактов. Возвращает список описаний недостающих данных.
+    """
+    settings = run.settings
+    selected = set(run.stages)
+    missing = []
+
+    if 'scan' in selected and 'ingest' not in selected:
+        configs = glob.glob(os.path.join(settings.CONFIGS_DIR, '*.txt'))
+        if not configs:
+            missing.append(f"scan: нет конфигураций в {settings.CONFIGS_DIR} (запустите этап ingest)")
+
+    if 'summarize' in selected and 'scan' not in selected:
+        if not list_reports(settings.REPORTS_DIR):
+            missing.append(f"summarize: нет отчетов nipper в {settings.REPORTS_DIR} (запустите этап scan)")
+
+    if selected & {'tasks', 'compare'} and 'summarize' not in selected:
+        if run.summary_path:
+            if not os.path.isfile(run.summary_path):
+                missing.append(f"tasks/compare: итоговый отчет не найден: {run.summary_path}")
+        else:
+            run.summary_path = get_latest_report(settings.FINAL_RESULTS_DIR, settings.REPORT_PREFIX)
+            if not run.summary_path:
+                missing.append(f"tasks/compare: нет итоговых отчетов в {settings.FINAL_RESULTS_DIR} (запустите этап summarize)")
+
+    return missing
+
+
+def config_sources(settings):
+    """Источники CONFIG_SOURCES со значениями по умолчанию для необязательных полей"""
+    return [{
+        'name': source.get('name') or f'source{index + 1}',
+        'path': source['path'],
+        'mode': source.get('mode', settings.FILE_SOURCE_MODE),
+        'max_age_days': source.get('max_age_days', settings.MAX_FILE_AGE_DAYS),
+        'max_mb_per_sec': source.get('max_mb_per_sec', 0),
+        'workers': source.get('workers', 1),
+    } for index, source in enumerate(settings.CONFIG_SOURCES)]
+
+
+def run_ingest_sources(run):
+    """Параллельное получение конфигураций из нескольких источников (CONFIG_SOURCES)"""
+    settings = run.settings
+    sources = config_sources(settings)
+    for source in sources:
+        limit = f", до {source['max_mb_per_sec']} МБ/с" if source['max_mb_per_sec'] else ''
+        logging.info(f"{'Источник ' + source['name'] + ':':<50} {source['path']} ({source['mode']}{limit})")
+
+    stats = ingest_sources(sources, settings.CONFIGS_DIR, run.scratch)
+    if stats is None:
+        return _stage_failed(run, 'ошибка получения файлов')
+    run.record.set('sources', stats)
+
+    copied = sum(source_stats['files'] for source_stats in stats)
+    run.record.set('ingest', {'configs': copied})
+    logging.info(f"{'Файлов скопировано:':<50} {copied}")
+    if not copied:
+        if run.force:
+            logging.warning(f"{'Продолжаем без файлов:':<50} (--force)")
+        else:
+            logging.error(f"{'Остановка:':<50} файлы не найдены")
+            return False
+    return True
+
+
+def select_source(settings):
+    """Источник конфигураций по FILE_SOURCE_MODE: папка или список файлов (None при ошибке)"""
+    source = None
+
+    if settings.FILE_SOURCE_MODE == 'latest_folder':
+        logging.info(f"{'Режим:':<50} последняя папка")
+        source = find_latest_folder(settings.NETWORK_DIR)
+
+    elif settings.FILE_SOURCE_MODE == 'recent_files':
+        logging.info(f"{'Режим:':<50} последние файлы")
+        source = get_recent_files(settings.NETWORK_DIR, settings.MAX_FILE_AGE_DAYS)
+
+    elif settings.FILE_SOURCE_MODE == 'both':
+        logging.info(f"{'Режим:':<50} комбинированный")
+        folder = find_latest_folder(settings.NETWORK_DIR)
+        folder_files = glob.glob(os.path.join(folder, '*.cfg')) if folder else []
+        recent_files = get_recent_files(settings.NETWORK_DIR, settings.MAX_FILE_AGE_DAYS)
+        source = list(set(folder_files + recent_files))
+
+    else:
+        logging.error(f"{'Ошибка режима:':<50} {settings.FILE_SOURCE_MODE}")
+    return source
+
+
+def run_ingest(run):
+    """Выбор источника, копирование и переименование конфигураций"""
+    settings = run.settings
+    if settings.CONFIG_SOURCES:
+        return run_ingest_sources(run)
+
+    start_step = time.time()
+
+    # ========================================================================
+    # Шаг 1: Выбор источника конфигураций
+    # ========================================================================
+    logging.info(f"{'Выбор источника:':<50} начат")
+    source = select_source(settings)
+    if not source and not run.force:
+        return False
+
+    step_time = time.time() - start_step
+    logging.info(f"{'Выбор источника завершен:':<50} {step_time:.2f} сек")
+    start_step = time.time()
+
+    # ========================================================================
+    # Шаг 2: Получение и копирование файлов конфигураций
+    # ========================================================================
+    logging.info(f"{'Получение файлов:':<50} начато")
+    cfg_files = get_config_files(source, settings.CONFIGS_DIR)
+    if not cfg_files:
+        if run.force:
+            logging.warning(f"{'Продолжаем без файлов:':<50} (--force)")
+        else:
+            logging.error(f"{'Остановка:':<50} файлы не найдены")
+            return False
+
+    # Копирование и переименование - в рабочей папке в памяти, если конфигурации помещаются
+    staging_dir = settings.CONFIGS_DIR
+    staged_bytes = sum(file_size(file_path) for file_path in cfg_files)
+    if run.scratch.reserve(staged_bytes):
+        staging_dir = run.scratch.subdir('configs')
+        logging.info(f"{'Конфигурации в памяти:':<50} {format_bytes(staged_bytes)}")
+    elif run.scratch:
+        logging.info(f"{'Конфигурации в памяти:':<50} не помещаются ({format_bytes(staged_bytes)}), запись на диск")
+
+    logging.info(f"{'Копирование файлов...':<50}")
+    progress_copy = ProgressBar(len(cfg_files), "Копирование файлов")
+    for file_path in cfg_files:
+        try:
+            shutil.copy2(file_path, staging_dir)
+        except Exception as e:
+            logging.error(f"{'Ошибка копирования:':<50} {file_path}\n{str(e)}")
+        progress_copy.update(1, file_size(file_path))
+
+    step_time = time.time() - start_step
+    run.record.set('ingest', {'configs': len(cfg_files)})
+    logging.info(f"{'Файлов скопировано:':<50} {len(cfg_files)}")
+    logging.info(f"{'Копирование завершено:':<50} {step_time:.2f} сек")
+    start_step = time.time()
+
+    # ========================================================================
+    # Шаг 3: Переименование файлов
+    # ========================================================================
+    logging.info(f"{'Переименование файлов:':<50} начато")
+    renamed = rename_configs(staging_dir)
+    if staging_dir != settings.CONFIGS_DIR:
+        # На диск переносятся только итоговые <хост>.txt
+        moved = move_files(staging_dir, settings.CONFIGS_DIR, '.txt')
+        run.scratch.release(staged_bytes)
+        logging.info(f"{'Перенесено в папку конфигураций:':<50} {moved}")
+    if not renamed and not _stage_failed(run, 'ошибка переименования'):
+        return False
+
+    step_time = time.time() - start_step
+    logging.info(f"{'Переименование завершено:':<50} {step_time:.2f} сек")
+    return True
+
+
+def run_triage(run):
+    """Быстрый анализ конфигураций правилами TRIAGE_RULES"""
+    settings = run.settings
+    logging.info(f"{'Быстрый анализ:':<50} начат")
+    triage_results = triage_configs(settings.CONFIGS_DIR,
+                                    compile_rules(settings.TRIAGE_RULES, settings.EXCLUDED_ISSUES))
+    triage_report_path = build_final_report(triage_results, settings.FINAL_RESULTS_DIR,
+                                            settings.TRIAGE_REPORT_PREFIX,
+                                            excluded_issues=settings.EXCLUDED_ISSUES)
+    if not triage_report_path and run.quick:
+        return _stage_failed(run, 'отчет быстрого анализа не создан')
+    return True
+
+
+def publish_tier(run, tier, files, config_groups=None, started=None):
+    """Частичный итоговый отчет и структура задач по хостам одного уровня приоритета.
+
+    Результаты пишутся в PARTIAL_RESULTS_DIR, поэтому не подменяют полный итоговый
+    отчет при поиске последнего отчета и сравнении. Отпечаток не сохраняется.
+    """
+    settings = run.settings
+    try:
+        if config_groups:
+            # Хостам уровня, эквивалентным представителям групп, нужны их отчеты уже сейчас
+            fan_out_reports(scanned_groups(run, config_groups, set(files)), settings.REPORTS_DIR)
+
+        # Хост - как в именах отчетов: '<имя конфигурации без .txt>_report.*'
+        hosts = {host_from_report_name(os.path.splitext(filename)[0]) for filename in files}
+        entry = {'hosts': len(hosts)}
+        if started:
+            entry['ready_after'] = round(time.time() - started, 3)
+        run.record.data.setdefault('tiers', {})[tier] = entry
+
+        # Свой экземпляр: публикация идет в отдельном потоке
+        records = HostRecords(record_dir_for(settings.REPORTS_DIR)) if settings.FINDINGS_RECORDS else None
+        findings = generate_findings(settings.REPORTS_DIR, None, settings.EXCLUDED_ISSUES, hosts=hosts,
+                                     records=records)
+        if not findings:
+            logging.warning(f"{'Частичный отчет уровня ' + tier + ':':<50} нет данных")
+            return
+        entry['summary'] = export_final_report(findings, settings.PARTIAL_RESULTS_DIR,
+                                               f'{settings.REPORT_PREFIX}_{tier}')
+        if settings.CREATE_TASK_STRUCTURE:
+            # Индекс строится заново: отчеты следующих уровней еще появляются
+            create_tasks(findings, os.path.join(settings.PARTIAL_RESULTS_DIR, f'tasks_{tier}'), settings.REPORTS_DIR,
+                         HostIndex(settings.REPORTS_DIR, settings.CONFIGS_DIR), settings.TASK_OUTPUT_MODE,
+                         records)
+        logging.info(f"{'Уровень ' + tier + ' готов:':<50} {len(hosts)} хостов, {len(findings)} проблем, "
+                     f"{entry.get('ready_after', 0):.1f} сек от начала сканирования")
+    except Exception as e:
+        logging.exception(f"{'Ошибка частичного отчета уровня:':<50} {tier}\n{str(e)}")
+
+
+def scanned_groups(run, config_groups, members=None):
+    """Группы эквивалентных конфигураций, представители которых успешно обработаны
+    nipper в этом запуске: отчет неудавшегося представителя в REPORTS_DIR остался
+    от прошлых запусков и не должен копироваться хостам группы.
+    members - ограничение состава групп (хосты уровня)."""
+    scanned = run.scanned or set()
+    groups = {}
+    for representative, group in config_groups.items():
+        if members is not None:
+            group = [m for m in group if m in members]
+        if representative in scanned:
+            groups[representative] = group
+        elif group:
+            logging.warning(f"{'Отчет группы не скопирован (ошибка nipper):':<50} "
+                            f"{representative}, {len(group)} хостов")
+    return groups
+
+
+def plan_tiers(run, config_groups=None):
+    """Порядок задач сканирования по уровням приоритета и отслеживание готовности уровней.
+
+    Возвращает (файлы для сканирования, TierTracker, пул публикации частичных отчетов)
+    или (None, None, None), если уровни не заданы. При дедупликации задача группы
+    выполняется в самом приоритетном из уровней ее хостов.
+    """
+    settings = run.settings
+    tiers = PriorityTiers(settings.PRIORITY_TIERS)
+    if not tiers:
+        return None, None, None
+
+    config_files = sorted(f for f in os.listdir(settings.CONFIGS_DIR) if f.lower().endswith('.txt'))
+    representative = {}
+    for group_head, group in (config_groups or {}).items():
+        for filename in [group_head] + group:
+            representative[filename] = group_head
+
+    tier_files = tiers.split(config_files)
+    tier_jobs = {tier: list(dict.fromkeys(representative.get(f, f) for f in files))
+                 for tier, files in tier_files.items()}
+    scan_files = list(dict.fromkeys(job for jobs in tier_jobs.values() for job in jobs))
+    for tier, files in tier_files.items():
+        logging.info(f"{'Уровень ' + tier + ':':<50} {len(files)} хостов, {len(tier_jobs[tier])} задач")
+
+    started = time.time()
+    publisher = ThreadPoolExecutor(max_workers=1, thread_name_prefix='tier')
+    tracker = TierTracker(
+        {tier: jobs for tier, jobs in tier_jobs.items() if tier != DEFAULT_TIER},
+        # Публикация - в отдельном потоке, чтобы не задерживать запуск следующих задач
+        lambda tier: publisher.submit(publish_tier, run, tier, tier_files[tier], config_groups, started)
+    )
+    return scan_files, tracker, publisher
+
+
+def nipper_build(nipper_exe):
+    """Признак сборки nipper: размер и время изменения исполняемого файла"""
+    try:
+        stat = os.stat(nipper_exe)
+        return [stat.st_size, int(stat.st_mtime)]
+    except OSError:
+        return None
+
+
+def run_scan(run):
+    """Запуск nipper (или только быстрый анализ в режиме --quick)"""
+    settings = run.settings
+
+    if run.quick or settings.TRIAGE_PREPASS:
+        if not run_triage(run):
+            return False
+        if run.quick:
+            return True
+
+    logging.info(f"{'Обработка nipper:':<50} начата")
+    config_groups = None
+    scan_files = None
+    if settings.DEDUP_CONFIGS:
+        config_groups = group_equivalent_configs(settings.CONFIGS_DIR, settings.CONFIG_NORMALIZATION_RULES.get(settings.SCANNED_DEVICE))
+        if config_groups is not None:
+            scan_files = list(config_groups)
+
+    tier_scan_files, tracker, publisher = plan_tiers(run, config_groups)
+    if tier_scan_files is not None:
+        scan_files = tier_scan_files
+
+    format_options = settings.NIPPER_FORMAT_OPTIONS[settings.NIPPER_OUTPUT_FORMAT]
+    limits = JobLimits.from_settings(settings)
+    memory_budget = MemoryBudget(settings.NIPPER_MEMORY_BUDGET_MB) if settings.NIPPER_MEMORY_BUDGET_MB else None
+    record_dir = record_dir_for(settings.REPORTS_DIR) if settings.FINDINGS_RECORDS else None
+
+    run.scanned = set()
+
+    def job_done(filename, ok):
+        # Успешные задачи - до уведомления уровней: публикация уровня копирует их отчеты
+        if ok:
+            run.scanned.add(filename)
+        if tracker:
+            tracker.job_done(filename, ok)
+
+    job_options = {
+        'limits': limits,
+        'memory_budget': memory_budget,
+        'job_memory_mb': job_memory_mb(limits, settings.NIPPER_JOB_MEMORY_MB),
+        'on_done': job_done,
+        # Описания нужны только для структуры задач: каждой уязвимости - одно
+        'record_dir': record_dir,
+        'record_descriptions': DescribedIssues() if settings.CREATE_TASK_STRUCTURE else None,
+        'scratch': run.scratch or None,
+        'durations': {},
+    }
+    try:
+        if settings.NIPPER_ENGINE == 'asyncio':
+            # Рекомендации извлекаются по мере завершения задач и передаются в этап summarize
+            run.extracted = process_with_nipper_async(settings.CONFIGS_DIR, settings.REPORTS_DIR, settings.NIPPER_EXE, settings.SCANNED_DEVICE,
+                                                      settings.MAX_WORKERS, settings.NIPPER_JOB_LOG_DIR,
+                                                      compression=settings.REPORT_COMPRESSION, dedup=settings.REPORT_DEDUP,
+                                                      files=scan_files, output_format=settings.NIPPER_OUTPUT_FORMAT,
+                                                      format_options=format_options, **job_options)
+            scan_ok = run.extracted is not None
+        else:
+            scan_ok = process_with_nipper(settings.CONFIGS_DIR, settings.REPORTS_DIR, settings.NIPPER_EXE, settings.SCANNED_DEVICE, settings.MAX_WORKERS,
+                                          compression=settings.REPORT_COMPRESSION, dedup=settings.REPORT_DEDUP,
+                                          files=scan_files, output_format=settings.NIPPER_OUTPUT_FORMAT,
+                                          format_options=format_options, job_log_dir=settings.NIPPER_JOB_LOG_DIR,
+                                          **job_options)
+    finally:
+        if publisher:
+            # Дожидаемся частичных отчетов уже завершенных уровней
+            publisher.shutdown(wait=True)
+
+    # Время nipper по хостам - для планирования (planner.py) и контроля деградации
+    scanned = scan_files if scan_files is not None else [
+        f for f in os.listdir(settings.CONFIGS_DIR) if f.lower().endswith('.txt')]
+    configs = sum(1 + len(group) for group in config_groups.values()) if config_groups else len(scanned)
+    run.record.set('scan', {
+        'configs': configs,
+        'jobs': len(scanned),
+        'workers': settings.MAX_WORKERS,
+        'cpus': os.cpu_count() or 1,
+        'durations': {os.path.splitext(filename)[0]: seconds
+                      for filename, seconds in sorted(job_options['durations'].items())},
+        # Размер конфигураций и сборка nipper - чтобы объяснять изменение длительности
+        'config_bytes': {os.path.splitext(filename)[0]: file_size(os.path.join(settings.CONFIGS_DIR, filename))
+                         for filename in sorted(job_options['durations'])},
+        'nipper_build': nipper_build(settings.NIPPER_EXE),
+    })
+
+    if scan_ok and config_groups:
+        # Результаты представителя группы получают все эквивалентные хосты
+        fanned = fan_out_reports(scanned_groups(run, config_groups), settings.REPORTS_DIR)
+        for member_report, source_report in fanned.items():
+            if run.extracted and source_report in run.extracted:
+                run.extracted[member_report] = run.extracted[source_report]
+        if record_dir:
+            copy_host_records(fanned, record_dir)
+
+    if not scan_ok:
+        return _stage_failed(run, 'ошибки обработки')
+    return True
+
+
+def run_summarize(run):
+    """Итоговый отчет по отчетам nipper в REPORTS_DIR, отпечаток и история"""
+    settings = run.settings
+    logging.info(f"{'Генерация отчета:':<50} начата")
+    run.findings = generate_findings(settings.REPORTS_DIR, run.extracted, settings.EXCLUDED_ISSUES,
+                                     records=run.host_records)
+    shard_of = host_shard_function(settings.SUMMARY_SHARD_BY, settings.SUMMARY_SHARD_PREFIX, settings.SUMMARY_SITES)
+    if run.findings and shard_of:
+        run.summary_path = export_sharded_report(run.findings, settings.FINAL_RESULTS_DIR, settings.REPORT_PREFIX,
+                                                 shard_of, settings.FINGERPRINT_DIR, settings.SUMMARY_WRITE_WORKERS,
+                                                 settings.PROFILE_TOP_ALLOCATIONS if settings.PROFILE_MEMORY else 0)
+    elif run.findings:
+        run.summary_path = export_final_report(run.findings, settings.FINAL_RESULTS_DIR,
+                                               settings.REPORT_PREFIX, settings.FINGERPRINT_DIR)
+    if not run.summary_path:
+        run.findings = None
+        return _stage_failed(run, 'ошибка генерации отчета')
+
+    run.record.set('summary', {'path': run.summary_path, 'hosts': len(run.findings.hosts),
+                               'issues': len(run.findings)})
+
+    fingerprint_path = fingerprint_path_for_report(run.summary_path, settings.FINGERPRINT_DIR)
+    if run.set_baseline and fingerprint_path and os.path.exists(fingerprint_path):
+        set_baseline(fingerprint_path, settings.FINGERPRINT_DIR)
+
+    if settings.UPDATE_HISTORY:
+        # При первом запуске история наполняется по всем сохраненным отчетам
+        backfill_history(settings.HISTORY_DB, settings.FINAL_RESULTS_DIR, settings.REPORT_PREFIX, settings.FINGERPRINT_DIR)
+    return True
+
+
+def _load_summary(run):
+    """Находки текущего запуска или сохраненного итогового отчета (читаются один раз)"""
+    if run.findings is None and run.summary_path:
+        logging.info(f"{'Итоговый отчет:':<50} {os.path.basename(run.summary_path)}")
+        run.findings = load_findings(run.summary_path, run.settings.FINGERPRINT_DIR)
+    return run.findings
+
+
+def run_tasks(run):
+    """Структура задач по итоговому отчету"""
+    settings = run.settings
+    if not settings.CREATE_TASK_STRUCTURE or not run.summary_path:
+        logging.info(f"{'Создание структуры задач:':<50} пропущено")
+        return True
+
+    logging.info(f"{'Создание структуры задач:':<50} начато")
+    findings = _load_summary(run)
+    # Передаем REPORTS_DIR для извлечения описаний из HTML отчетов
+    if not findings or not create_tasks(findings, settings.TASK_DISTRIBUTION_DIR, settings.REPORTS_DIR,
+                                        run.host_index, settings.TASK_OUTPUT_MODE, run.host_records):
+        return _stage_failed(run, 'ошибка создания структуры задач')
+
+    # Проверка созданной структуры
+    if not verify_task_structure(settings.TASK_DISTRIBUTION_DIR):
+        logging.warning(f"{'Проверка структуры задач:':<50} обнаружены проблемы")
+    return True
+
+
+def run_compare(run):
+    """Сравнение итогового отчета с выбранной точкой сравнения"""
+    settings = run.settings
+    if not settings.COMPARE_WITH_PREVIOUS or not run.summary_path:
+        logging.info(f"{'Сравнение отчетов:':<50} пропущено")
+        return True
+
+    logging.info(f"{'Сравнение отчетов:':<50} начато")
+    findings = _load_summary(run)
+    if not findings:
+        return _stage_failed(run, 'итоговый отчет не прочитан')
+
+    new_fingerprint_path = fingerprint_path_for_report(run.summary_path, settings.FINGERPRINT_DIR)
+    if not settings.UPDATE_HISTORY or 'summarize' not in run.stages:
+        # Отпечатки для отчетов, сохраненных до появления отпечатков (однократно)
+        backfill_fingerprints(settings.FINAL_RESULTS_DIR, settings.REPORT_PREFIX, settings.FINGERPRINT_DIR)
+    old_fingerprint_path = find_fingerprint(settings.FINGERPRINT_DIR, run.compare_against,
+                                            exclude_path=new_fingerprint_path)
+    if old_fingerprint_path:
+        logging.info(f"{'Сравнение с:':<50} {os.path.basename(old_fingerprint_path)}")
+        old_fingerprint = load_fingerprint(old_fingerprint_path)
+        if old_fingerprint:
+            changes = compare_fingerprints(findings.fingerprint(), old_fingerprint)
+            write_comparison_report(changes, settings.COMPARISON_DIR, settings.COMPARISON_REPORT_PREFIX)
+    elif run.compare_against == 'previous':
+        # Отпечаток предыдущего запуска недоступен - сравнение с его Excel-отчетом
+        old_report_path = get_latest_report(settings.FINAL_RESULTS_DIR, settings.REPORT_PREFIX, exclude_path=run.summary_path)
+        if old_report_path:
+            logging.info(f"{'Сравнение с:':<50} {os.path.basename(old_report_path)}")
+            compare_reports(findings, old_report_path, settings.COMPARISON_DIR, settings.COMPARISON_REPORT_PREFIX)
+        else:
+            logging.info(f"{'Предыдущий отчет для сравнения не найден':<50}")
+    else:
+        logging.info(f"{'Отчет для сравнения не найден:':<50} {run.compare_against}")
+    return True
+
+
+STAGE_FUNCTIONS = {
+    'ingest':    run_ingest,
+    'scan':      run_scan,
+    'summarize': run_summarize,
+    'tasks':     run_tasks,
+    'compare':   run_compare,
+}
+
+
+def run_pipeline(run):
+    """Последовательное выполнение выбранных этапов.
+
+    Возвращает True, если все этапы выполнены (или ошибки пропущены с --force).
+    """
+    missing = check_dependencies(run)
+    if missing:
+        for message in missing:
+            logging.error(f"{'Нет входных данных:':<50} {message}")
+        if not run.force:
+            return False
+
+    try:
+        for stage in run.stages:
+            start_step = time.time()
+            with run.record.stage(stage) as entry:
+                entry['ok'] = STAGE_FUNCTIONS[stage](run)
+            if not entry['ok']:
+                return False
+            step_time = time.time() - start_step
+            logging.info(f"{'Этап ' + stage + ' завершен:':<50} {step_time:.2f} сек")
+            if run.quick and stage == 'scan':
+                break
+        return True
+    finally:
+        if run.scratch:
+            run.record.set('scratch', run.scratch.stats())
+            run.scratch.cleanup()
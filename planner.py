@@ -0,0 +1,286 @@
+import os
+import glob
+import json
+import heapq
+import logging
+import statistics
+from datetime import datetime
+
+from fingerprints import TIMESTAMP_FORMAT
+from run_record import list_run_records, load_run_record
+
+
+PLAN_PREFIX = 'plan'
+
+# Сколько последних запусков учитывается при оценке
+HISTORY_RUNS = 10
+
+# Время nipper для хоста без истории, если истории нет совсем, сек
+DEFAULT_JOB_SECONDS = 60
+
+# Рекомендуется наименьшее число потоков, при котором сканирование не более чем
+# на столько медленнее лучшего варианта
+RECOMMEND_TOLERANCE = 0.05
+
+# Этапы, длительность которых оценивается по числу хостов (сек на хост)
+PER_HOST_STAGES = ('summarize', 'tasks', 'compare')
+
+
+def _median(values):
+    values = [value for value in values if value is not None]
+    return statistics.median(values) if values else None
+
+
+def load_history(record_dir, limit=HISTORY_RUNS):
+    """Журналы последних успешных запусков (от старых к новым)"""
+    records = []
+    for path in reversed(list_run_records(record_dir)):
+        record = load_run_record(path)
+        if record and record.get('status') == 'ok':
+            records.append(record)
+            if len(records) >= limit:
+                break
+    return list(reversed(records))
+
+
+def host_durations(records):
+    """Медианное время nipper по хостам, приведенное к одному потоку на ядро.
+
+    Время задачи, измеренное при MAX_WORKERS больше числа ядер, включает
+    ожидание процессора - оно делится на коэффициент перегрузки того запуска.
+    """
+    samples = {}
+    for record in records:
+        scan = record.get('scan') or {}
+        slowdown = max(1.0, scan.get('workers', 1) / (scan.get('cpus') or 1))
+        for host, seconds in (scan.get('durations') or {}).items():
+            samples.setdefault(host, []).append(seconds / slowdown)
+    return {host: _median(values) for host, values in samples.items()}
+
+
+def stage_units(record):
+    """Объем работы этапов запуска: ingest - конфигурации, scan - задачи nipper
+    (нет в режиме --quick), summarize/tasks/compare - хосты"""
+    scan = record.get('scan') or {}
+    hosts = (record.get('summary') or {}).get('hosts') or scan.get('configs')
+    units = {'ingest': (record.get('ingest') or {}).get('configs'), 'scan': scan.get('jobs')}
+    units.update({stage: hosts for stage in PER_HOST_STAGES})
+    return units
+
+
+def stage_rates(records):
+    """Медианная длительность этапов на единицу работы (stage_units)"""
+    samples = {}
+    for record in records:
+        stages = record.get('stages') or {}
+        for stage, count in stage_units(record).items():
+            entry = stages.get(stage)
+            if entry and entry.get('ok') and count:
+                samples.setdefault(stage, []).append(entry['duration'] / count)
+    return {stage: _median(values) for stage, values in samples.items()}
+
+
+def simulate_scan(durations, workers, cpus):
+    """Оценка длительности сканирования: задачи в порядке списка занимают первый
+    освободившийся поток; при потоках больше, чем ядер, задачи замедляются"""
+    if not durations:
+        return 0.0
+    slowdown = max(1.0, workers / cpus)
+    loads = [0.0] * max(1, workers)
+    for seconds in durations:
+        heapq.heapreplace(loads, loads[0] + seconds * slowdown)
+    return max(loads)
+
+
+def recommend_workers(scan_by_workers):
+    """Наименьшее число потоков с длительностью не хуже лучшей более чем на RECOMMEND_TOLERANCE"""
+    best = min(scan_by_workers.values())
+    return min(workers for workers, seconds in scan_by_workers.items()
+               if seconds <= best * (1 + RECOMMEND_TOLERANCE))
+
+
+def discover_configs(settings, with_ingest=True):
+    """Конфигурации, которые будут просканированы: {хост: путь}.
+
+    Этап scan обрабатывает все конфигурации в CONFIGS_DIR, поэтому к найденным в
+    источниках (без копирования) добавляются уже сохраненные там.
+    """
+    from file_operations import discover_source_files, get_config_files, newest_per_host
+    from pipeline import config_sources, select_source
+
+    configs = {}
+    if os.path.isdir(settings.CONFIGS_DIR):
+        configs = {os.path.splitext(name)[0]: os.path.join(settings.CONFIGS_DIR, name)
+                   for name in os.listdir(settings.CONFIGS_DIR) if name.lower().endswith('.txt')}
+    if not with_ingest:
+        return configs, 0
+
+    if settings.CONFIG_SOURCES:
+        found = [discover_source_files(source) for source in config_sources(settings)]
+    else:
+        source = select_source(settings)
+        found = [get_config_files(source, settings.CONFIGS_DIR) if source else []]
+    discovered = {host: path for host, (_, _, path) in newest_per_host(found).items()}
+    configs.update(discovered)
+    return configs, len(discovered)
+
+
+def _format_seconds(seconds):
+    if seconds is None:
+        return 'нет данных'
+    minutes, secs = divmod(int(round(seconds)), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02d}:{secs:02d}"
+
+
+def make_plan(settings, stages):
+    """Оценка длительности запуска по обнаруженным конфигурациям и истории запусков.
+
+    Возвращает план (словарь) и сохраняет его в RUN_RECORD_DIR/plan_<время>.json;
+    при ошибке возвращает None.
+    """
+    try:
+        from file_operations import group_equivalent_configs
+
+        logging.info(f"{'Планирование запуска:':<50} начато")
+        configs, discovered = discover_configs(settings, 'ingest' in stages)
+        if not configs:
+            logging.error(f"{'Планирование:':<50} конфигурации не найдены")
+            return None
+
+        # Задачи nipper: при дедупликации сканируется только представитель группы
+        jobs = sorted(configs)
+        if settings.DEDUP_CONFIGS:
+            by_path = {path: host for host, path in configs.items()}
+            groups = group_equivalent_configs('', settings.CONFIG_NORMALIZATION_RULES.get(settings.SCANNED_DEVICE),
+                                              files=list(by_path))
+            if groups is not None:
+                jobs = sorted(by_path[path] for path in groups)
+
+        records = load_history(settings.RUN_RECORD_DIR)
+        known = host_durations(records)
+        rates = stage_rates(records)
+        default_seconds = _median(known.values()) or DEFAULT_JOB_SECONDS
+        job_seconds = [known.get(host, default_seconds) for host in jobs]
+        with_history = sum(1 for host in jobs if host in known)
+
+        cpus = os.cpu_count() or 1
+        max_candidates = max(2 * cpus, settings.MAX_WORKERS)
+        if settings.NIPPER_MEMORY_BUDGET_MB:
+            job_mb = settings.NIPPER_MEMORY_LIMIT_MB or settings.NIPPER_JOB_MEMORY_MB
+            # Больше задач одновременно бюджет памяти не допустит
+            max_candidates = max(1, min(max_candidates, int(settings.NIPPER_MEMORY_BUDGET_MB // job_mb)))
+        scan_by_workers = {workers: round(simulate_scan(job_seconds, workers, cpus), 3)
+                           for workers in range(1, max_candidates + 1)}
+        workers = min(settings.MAX_WORKERS, max_candidates)
+
+        hosts = len(configs)
+        counts = {'ingest': discovered}
+        predicted = {}
+        for stage in stages:
+            if stage == 'scan':
+                predicted[stage] = scan_by_workers[workers]
+            elif rates.get(stage) is not None:
+                predicted[stage] = round(rates[stage] * counts.get(stage, hosts), 3)
+            else:
+                predicted[stage] = None
+        total = round(sum(seconds for seconds in predicted.values() if seconds), 3)
+
+        plan = {
+            'plan_id': datetime.now().strftime(TIMESTAMP_FORMAT),
+            'created': datetime.now().isoformat(timespec='seconds'),
+            'stages': list(stages),
+            'configs': hosts,
+            'discovered': discovered,
+            'jobs': len(jobs),
+            'jobs_with_history': with_history,
+            'history_runs': len(records),
+            'workers': workers,
+            'cpus': cpus,
+            'predicted': predicted,
+            'predicted_total': total,
+            'scan_by_workers': scan_by_workers,
+            'recommended_workers': recommend_workers(scan_by_workers),
+        }
+
+        logging.info(f"{'Конфигураций:':<50} {hosts} (из источников: {discovered})")
+        logging.info(f"{'Задач nipper:':<50} {len(jobs)} (эквивалентных без сканирования: {hosts - len(jobs)})")
+        logging.info(f"{'Задач с историей длительности:':<50} {with_history} из {len(jobs)} "
+                     f"(запусков в истории: {len(records)})")
+        if not known:
+            logging.warning(f"{'Нет истории длительности nipper:':<50} оценка {DEFAULT_JOB_SECONDS} сек на задачу")
+        for stage, seconds in predicted.items():
+            logging.info(f"{'  Этап ' + stage + ':':<50} {_format_seconds(seconds)}")
+        logging.info(f"{'Оценка запуска (' + str(workers) + ' потоков):':<50} {_format_seconds(total)}")
+        if 'scan' in stages:
+            recommended = plan['recommended_workers']
+            logging.info(f"{'Рекомендуемое MAX_WORKERS:':<50} {recommended} "
+                         f"(сканирование {_format_seconds(scan_by_workers[recommended])}, ядер: {cpus})")
+        if settings.MAINTENANCE_WINDOW_MINUTES:
+            fits = total <= settings.MAINTENANCE_WINDOW_MINUTES * 60
+            plan['fits_window'] = fits
+            log = logging.info if fits else logging.warning
+            log(f"{'Окно обслуживания (' + str(settings.MAINTENANCE_WINDOW_MINUTES) + ' мин):':<50} "
+                f"{'укладывается' if fits else 'НЕ укладывается'}")
+
+        os.makedirs(settings.RUN_RECORD_DIR, exist_ok=True)
+        path = os.path.join(settings.RUN_RECORD_DIR, f"{PLAN_PREFIX}_{plan['plan_id']}.json")
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(plan, f, ensure_ascii=False, indent=1)
+        logging.info(f"{'План сохранен:':<50} {path}")
+        return plan
+    except Exception as e:
+        logging.exception(f"{'Ошибка планирования:':<50} {str(e)}")
+        return None
+
+
+def evaluate_plan(record, record_dir):
+    """Ошибка прогноза: сравнение последнего не проверенного плана с завершенным запуском.
+
+    План проверяется одним (первым после него) запуском; результат добавляется в
+    журнал запуска (раздел 'plan_check') и в сам план ('evaluated_by').
+    """
+    if record.get('status') != 'ok':
+        return None
+    try:
+        plans = sorted(glob.glob(os.path.join(record_dir, f'{PLAN_PREFIX}_*.json')))
+        if not plans:
+            return None
+        path = plans[-1]
+        with open(path, 'r', encoding='utf-8') as f:
+            plan = json.load(f)
+        if plan.get('evaluated_by') or plan['plan_id'] > record['run_id']:
+            return None
+
+        stages = record.get('stages') or {}
+        workers = str((record.get('scan') or {}).get('workers', plan['workers']))
+        predicted = dict(plan['predicted'])
+        if 'scan' in predicted and workers in plan['scan_by_workers']:
+            # Прогноз для фактического числа потоков запуска
+            predicted['scan'] = plan['scan_by_workers'][workers]
+
+        check = {'plan': os.path.basename(path), 'stages': {}}
+        for stage, seconds in predicted.items():
+            actual = (stages.get(stage) or {}).get('duration')
+            if seconds is None or actual is None:
+                continue
+            error = round((actual - seconds) / seconds * 100, 1) if seconds else None
+            check['stages'][stage] = {'predicted': seconds, 'actual': actual, 'error_pct': error}
+            logging.info(f"{'Прогноз этапа ' + stage + ':':<50} {_format_seconds(seconds)}, "
+                         f"факт {_format_seconds(actual)} (ошибка {error}%)")
+        if not check['stages']:
+            return None
+        predicted_total = sum(item['predicted'] for item in check['stages'].values())
+        actual_total = sum(item['actual'] for item in check['stages'].values())
+        check['error_pct'] = round((actual_total - predicted_total) / predicted_total * 100, 1) if predicted_total else None
+        logging.info(f"{'Ошибка прогноза запуска:':<50} {check['error_pct']}%")
+        record['plan_check'] = check
+
+        plan['evaluated_by'] = record['run_id']
+        plan['check'] = check
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(plan, f, ensure_ascii=False, indent=1)
+        return check
+    except Exception as e:
+        logging.error(f"{'Ошибка проверки прогноза:':<50} {str(e)}")
+        return None
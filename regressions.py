@@ -0,0 +1,134 @@
+import os
+import json
+import logging
+import statistics
+
+from planner import load_history, host_durations, stage_rates, stage_units
+
+
+REGRESSIONS_PREFIX = 'regressions'
+
+# Сколько хостов с деградацией выводится в лог (в отчете - все)
+LOG_TOP_HOSTS = 20
+
+
+def _change(value, baseline):
+    """Изменение относительно базового значения, % (None, если база нулевая)"""
+    return round((value - baseline) / baseline * 100, 1) if baseline else None
+
+
+def _format_change(change_pct):
+    return f"{change_pct:+}%" if change_pct is not None else 'было 0'
+
+
+def _regressed(value, baseline, threshold_pct, min_seconds):
+    return (baseline is not None and value - baseline >= min_seconds
+            and (not baseline or (value - baseline) / baseline * 100 > threshold_pct))
+
+
+def _config_bytes_baseline(records):
+    samples = {}
+    for record in records:
+        for host, size in ((record.get('scan') or {}).get('config_bytes') or {}).items():
+            samples.setdefault(host, []).append(size)
+    return {host: statistics.median(sizes) for host, sizes in samples.items()}
+
+
+def detect_regressions(record, baseline, threshold_pct, min_seconds):
+    """Этапы и хосты, длительность которых выросла больше чем на threshold_pct
+    относительно медианы базовых запусков (и не меньше чем на min_seconds).
+
+    Этапы сравниваются по длительности на единицу работы (planner.stage_units):
+    база этапа - медиана базовых запусков, умноженная на объем текущего запуска.
+    """
+    rates = stage_rates(baseline)
+    units = stage_units(record)
+    stages = []
+    for stage, entry in (record.get('stages') or {}).items():
+        count = units.get(stage)
+        if not entry.get('ok') or not count or rates.get(stage) is None:
+            continue
+        base = rates[stage] * count
+        if _regressed(entry['duration'], base, threshold_pct, min_seconds):
+            stages.append({'stage': stage, 'duration': entry['duration'], 'baseline': round(base, 3),
+                           'change_pct': _change(entry['duration'], base), 'units': count,
+                           'rate': round(entry['duration'] / count, 3), 'baseline_rate': round(rates[stage], 3)})
+
+    scan = record.get('scan') or {}
+    current = host_durations([record])
+    base_durations = host_durations(baseline)
+    base_sizes = _config_bytes_baseline(baseline)
+    hosts = []
+    for host, seconds in current.items():
+        base = base_durations.get(host)
+        if not _regressed(seconds, base, threshold_pct, min_seconds):
+            continue
+        size = (scan.get('config_bytes') or {}).get(host)
+        base_size = base_sizes.get(host)
+        hosts.append({
+            'host': host,
+            'seconds': round(seconds, 3),
+            'baseline': round(base, 3),
+            'change_pct': _change(seconds, base),
+            'config_bytes': size,
+            'baseline_config_bytes': base_size,
+            'config_change_pct': _change(size, base_size) if size is not None else None,
+        })
+    hosts.sort(key=lambda item: item['seconds'] - item['baseline'], reverse=True)
+
+    # Смена сборки nipper объясняет деградацию сразу по многим хостам
+    builds = [run['scan']['nipper_build'] for run in baseline if (run.get('scan') or {}).get('nipper_build')]
+    nipper_changed = bool(scan.get('nipper_build') and builds and scan['nipper_build'] != builds[-1])
+
+    return {
+        'run_id': record['run_id'],
+        'baseline_runs': [run['run_id'] for run in baseline],
+        'threshold_pct': threshold_pct,
+        'min_seconds': min_seconds,
+        'nipper_build_changed': nipper_changed,
+        'stages': stages,
+        'hosts': hosts,
+    }
+
+
+def check_regressions(record, record_dir, baseline_runs=10, threshold_pct=50, min_seconds=5.0):
+    """Сравнение завершенного запуска с медианой предыдущих: лог и отчет
+    RUN_RECORD_DIR/regressions_<запуск>.json; краткий итог - в журнал запуска"""
+    try:
+        baseline = load_history(record_dir, baseline_runs)
+        if not baseline:
+            logging.info(f"{'Контроль деградации:':<50} нет предыдущих запусков")
+            return None
+
+        report = detect_regressions(record, baseline, threshold_pct, min_seconds)
+        path = os.path.join(record_dir, f"{REGRESSIONS_PREFIX}_{record['run_id']}.json")
+        os.makedirs(record_dir, exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=1)
+
+        record['regressions'] = {'stages': len(report['stages']), 'hosts': len(report['hosts']),
+                                 'nipper_build_changed': report['nipper_build_changed'], 'report': path}
+        if report['nipper_build_changed']:
+            logging.warning(f"{'Сборка nipper изменилась:':<50} {record['scan']['nipper_build']}")
+        if not report['stages'] and not report['hosts']:
+            logging.info(f"{'Контроль деградации:':<50} не обнаружена (база: {len(baseline)} запусков)")
+            return report
+
+        logging.warning(f"{'Контроль деградации:':<50} этапов {len(report['stages'])}, "
+                        f"хостов {len(report['hosts'])} (база: {len(baseline)} запусков, порог {threshold_pct}%)")
+        for item in report['stages']:
+            logging.warning(f"{'  Этап ' + item['stage'] + ':':<50} {item['duration']:.1f} сек "
+                            f"(база {item['baseline']:.1f} сек, {_format_change(item['change_pct'])})")
+        for item in report['hosts'][:LOG_TOP_HOSTS]:
+            config = ''
+            if item['config_change_pct'] is not None:
+                config = f", конфигурация {_format_change(item['config_change_pct'])}"
+            logging.warning(f"{'  Хост ' + item['host'] + ':':<50} {item['seconds']:.1f} сек "
+                            f"(база {item['baseline']:.1f} сек, {_format_change(item['change_pct'])}{config})")
+        if len(report['hosts']) > LOG_TOP_HOSTS:
+            logging.warning(f"{'  Еще хостов:':<50} {len(report['hosts']) - LOG_TOP_HOSTS}")
+        logging.info(f"{'Отчет о деградации:':<50} {path}")
+        return report
+    except Exception as e:
+        logging.error(f"{'Ошибка контроля деградации:':<50} {str(e)}")
+        return None
@@ -0,0 +1,254 @@
+import os
+import io
+import re
+import gzip
+import shutil
+import hashlib
+import logging
+import threading
+
+try:
+    import zstandard
+except ImportError:  # необязательная зависимость
+    zstandard = None
+
+
+STORE_DIR_NAME = '.store'
+COMPRESSION_SUFFIXES = {'gzip': '.gz', 'zstd': '.zst'}
+REPORT_EXTENSIONS = ('.html', '.html.gz', '.html.zst', '.xml', '.xml.gz', '.xml.zst')
+
+_CHUNK_SIZE = 1024 * 1024
+
+
+def is_report_file(filename):
+    """True для отчетов nipper (HTML или XML), в том числе сжатых"""
+    return filename.lower().endswith(REPORT_EXTENSIONS)
+
+
+def report_stem(filename):
+    """Имя отчета без расширений (.html, .xml и их сжатых вариантов)"""
+    lower = filename.lower()
+    for ext in sorted(REPORT_EXTENSIONS, key=len, reverse=True):
+        if lower.endswith(ext):
+            return filename[:-len(ext)]
+    return os.path.splitext(filename)[0]
+
+
+def list_reports(reports_dir):
+    """Список путей к отчетам в папке (сжатым и несжатым).
+
+    Если от прежних настроек (REPORT_COMPRESSION, NIPPER_OUTPUT_FORMAT) остались
+    другие варианты того же отчета, возвращается только самый новый.
+    """
+    if not os.path.isdir(reports_dir):
+        return []
+    newest = {}
+    for name in os.listdir(reports_dir):
+        path = os.path.join(reports_dir, name)
+        if not is_report_file(name) or not os.path.isfile(path):
+            continue
+        stem = report_stem(name)
+        mtime = os.path.getmtime(path)
+        if stem not in newest or mtime > newest[stem][0]:
+            newest[stem] = (mtime, path)
+    return [path for _, path in newest.values()]
+
+
+def remove_report_variants(report_path):
+    """Удаление других вариантов отчета (формат, сжатие) рядом с report_path"""
+    reports_dir, name = os.path.split(report_path)
+    stem = report_stem(name)
+    removed = 0
+    for ext in REPORT_EXTENSIONS:
+        path = os.path.join(reports_dir, stem + ext)
+        if os.path.normpath(path) != os.path.normpath(report_path) and os.path.isfile(path):
+            os.remove(path)
+            removed += 1
+    if removed:
+        logging.debug(f"{'Удалены прежние варианты отчета:':<50} {stem} ({removed})")
+    return removed
+
+
+def host_from_report_name(filename):
+    """IP-адрес хоста из имени файла отчета (или префикс имени до '_')"""
+    ip_match = re.search(r'^(\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3})', filename)
+    return ip_match.group(1) if ip_match else filename.split('_')[0]
+
+
+class HostIndex:
+    """Индекс хост -> отчет nipper и хост -> конфигурация, строится одним проходом по папкам.
+
+    Правила сопоставления:
+      - хост отчета определяется host_from_report_name по имени файла - так же,
+        как хосты итогового отчета, поэтому поиск по хосту из сводки точный;
+      - если у хоста несколько отчетов, выбирается '<хост>_report.*', затем
+        первый по имени; формат (HTML/XML) и сжатие значения не имеют;
+      - хост конфигурации - имя файла .txt без расширения (после rename_configs).
+    Индекс отражает содержимое папок на момент построения; после сканирования
+    его нужно построить заново.
+    """
+    def __init__(self, reports_dir, configs_dir=None):
+        self.reports = {}
+        self.configs = {}
+
+        for path in sorted(list_reports(reports_dir)):
+            name = os.path.basename(path)
+            host = host_from_report_name(name)
+            current = self.reports.get(host)
+            if current is None or (report_stem(name) == f'{host}_report'
+                                   and report_stem(os.path.basename(current)) != f'{host}_report'):
+                self.reports[host] = path
+
+        if configs_dir and os.path.isdir(configs_dir):
+            for name in sorted(os.listdir(configs_dir)):
+                if name.lower().endswith('.txt'):
+                    self.configs[os.path.splitext(name)[0]] = os.path.join(configs_dir, name)
+
+        logging.debug(f"{'Индекс хостов:':<50} {len(self.reports)} отчетов, {len(self.configs)} конфигураций")
+
+    def __len__(self):
+        return len(self.reports)
+
+    def report(self, host):
+        """Путь к отчету nipper хоста или None"""
+        return self.reports.get(str(host))
+
+    def config(self, host):
+        """Путь к конфигурации хоста или None"""
+        return self.configs.get(str(host))
+
+
+def resolve_compression(compression):
+    """Проверка метода сжатия; zstd без установленного zstandard заменяется на gzip"""
+    if not compression:
+        return None
+    if compression not in COMPRESSION_SUFFIXES:
+        raise ValueError(f"Invalid REPORT_COMPRESSION. Must be one of: {', '.join(COMPRESSION_SUFFIXES)}")
+    if compression == 'zstd' and zstandard is None:
+        logging.warning(f"{'Пакет zstandard не установлен:':<50} используется gzip")
+        return 'gzip'
+    return compression
+
+
+def is_xml_report(path):
+    """True для XML-отчетов nipper (в том числе сжатых)"""
+    return path.lower().endswith(('.xml', '.xml.gz', '.xml.zst'))
+
+
+def open_report(path, binary=False):
+    """Открытие отчета на чтение с потоковой распаковкой.
+
+    По умолчанию возвращает текстовый поток UTF-8, при binary=True - байтовый
+    (например, для xml.etree.ElementTree.iterparse).
+    """
+    lower = path.lower()
+    if lower.endswith('.gz'):
+        return gzip.open(path, 'rb') if binary else gzip.open(path, 'rt', encoding='utf-8')
+    if lower.endswith('.zst'):
+        if zstandard is None:
+            raise RuntimeError(f"Для чтения {path} требуется пакет zstandard")
+        raw = open(path, 'rb')
+        reader = zstandard.ZstdDecompressor().stream_reader(raw, closefd=True)
+        return reader if binary else io.TextIOWrapper(reader, encoding='utf-8')
+    return open(path, 'rb') if binary else open(path, 'r', encoding='utf-8')
+
+
+def _tmp_path(path):
+    """Уникальное временное имя: одинаковые отчеты могут сохраняться параллельно"""
+    return f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+
+
+def _compress_file(source_path, target_path, compression):
+    tmp_path = _tmp_path(target_path)
+    with open(source_path, 'rb') as src:
+        if compression == 'zstd':
+            with open(tmp_path, 'wb') as dst:
+                zstandard.ZstdCompressor(level=9).copy_stream(src, dst)
+        else:
+            with gzip.open(tmp_path, 'wb', compresslevel=6) as dst:
+                shutil.copyfileobj(src, dst, _CHUNK_SIZE)
+    os.replace(tmp_path, target_path)
+
+
+def _file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def link_or_copy(source_path, target_path):
+    """Жесткая ссылка на файл хранилища (копия, если ФС не поддерживает ссылки)"""
+    if os.path.exists(target_path) and os.path.samefile(source_path, target_path):
+        # rename() между ссылками на один файл ничего не делает и оставил бы .tmp
+        return
+    tmp_path = _tmp_path(target_path)
+    try:
+        os.link(source_path, tmp_path)
+    except OSError:
+        shutil.copy2(source_path, tmp_path)
+    os.replace(tmp_path, target_path)
+
+
+def store_report(html_path, compression='gzip', dedup=True, reports_dir=None):
+    """Сжатие отчета nipper (HTML или XML) с дедупликацией по содержимому.
+
+    При dedup=True сжатые данные хранятся один раз в <reports_dir>/.store/<sha256>,
+    а <отчет>.html.gz (.zst) - жесткая ссылка на них. Исходный файл удаляется.
+    reports_dir - папка отчетов, если исходный файл записан в другое место
+    (рабочую папку в памяти, scratch.py); по умолчанию - папка исходного файла.
+    Прежние варианты того же отчета (другой формат или сжатие) удаляются.
+    Возвращает путь к сохраненному отчету (без сжатия - путь к исходному файлу,
+    перенесенному в reports_dir).
+    """
+    reports_dir = reports_dir or os.path.dirname(html_path)
+    compression = resolve_compression(compression)
+    if not compression:
+        target_path = os.path.join(reports_dir, os.path.basename(html_path))
+        if os.path.normpath(target_path) != os.path.normpath(html_path):
+            tmp_path = _tmp_path(target_path)
+            shutil.move(html_path, tmp_path)
+            os.replace(tmp_path, target_path)
+        remove_report_variants(target_path)
+        return target_path
+
+    target_path = os.path.join(reports_dir, os.path.basename(html_path) + COMPRESSION_SUFFIXES[compression])
+    if not dedup:
+        _compress_file(html_path, target_path, compression)
+        os.remove(html_path)
+        remove_report_variants(target_path)
+        return target_path
+
+    store_dir = os.path.join(reports_dir, STORE_DIR_NAME)
+    os.makedirs(store_dir, exist_ok=True)
+    extension = os.path.splitext(html_path)[1]
+    blob_path = os.path.join(store_dir, _file_hash(html_path) + extension + COMPRESSION_SUFFIXES[compression])
+    if os.path.exists(blob_path):
+        logging.debug(f"{'Отчет совпадает с сохраненным:':<50} {os.path.basename(html_path)}")
+    else:
+        _compress_file(html_path, blob_path, compression)
+
+    link_or_copy(blob_path, target_path)
+    os.remove(html_path)
+    remove_report_variants(target_path)
+    return target_path
+
+
+def prune_store(reports_dir):
+    """Удаление из хранилища данных, на которые больше не ссылается ни один отчет"""
+    store_dir = os.path.join(reports_dir, STORE_DIR_NAME)
+    if not os.path.isdir(store_dir):
+        return 0
+    removed = 0
+    for name in os.listdir(store_dir):
+        path = os.path.join(store_dir, name)
+        try:
+            if os.stat(path).st_nlink <= 1:
+                os.remove(path)
+                removed += 1
+        except OSError as e:
+            logging.debug(f"{'Не удалось проверить файл хранилища:':<50} {name} ({str(e)})")
+    if removed:
+        logging.info(f"{'Удалено неиспользуемых данных отчетов:':<50} {removed}")
+    return removed
@@ -1,29 +1,37 @@
 import os
 import glob
-import pandas as pd
 from datetime import datetime
 import logging
 import re
-from utils import ProgressBar
-from config import EXCLUDED_ISSUES   # импортируем список исключений
+from utils import ProgressBar, file_size, get_process_log_queue, init_worker_logging
+from report_store import list_reports, host_from_report_name
+
+
+# Предел числа колонок листа Excel (xlsx)
+EXCEL_MAX_COLUMNS = 16384
 
 
 def verify_report(report_path):
-    """Проверка целостности сгенерированного итогового отчета"""
+    """Проверка целостности сгенерированного итогового отчета
+
+    Читаются только заголовок и первая строка данных, а не весь отчет.
+    """
+    from excel_reader import peek_sheet
+
     try:
         if not os.path.exists(report_path):
             logging.error(f"{'Отчет не существует:':<50} {report_path}")
             return False
 
-        df = pd.read_excel(report_path)
+        columns, rows = peek_sheet(report_path)
 
         required_columns = ['Issue', 'Overall', 'Impact', 'Ease', 'Fix', 'Recommendation']
         for col in required_columns:
-            if col not in df.columns:
+            if col not in columns:
                 logging.error(f"{'Отсутствует колонка:':<50} {col} в {os.path.basename(report_path)}")
                 return False
 
-        if df.empty:
+        if not rows:
             logging.error(f"{'Отчет пуст:':<50} {os.path.basename(report_path)}")
             return False
 
@@ -35,13 +43,14 @@ def verify_report(report_path):
 
 def verify_comparison_report(report_path):
     """Проверка целостности отчета сравнения (меньше строгая)"""
+    from excel_reader import sheet_names
+
     try:
         if not os.path.exists(report_path):
             logging.error(f"Отчет сравнения не существует: {report_path}")
             return False
 
-        xls = pd.ExcelFile(report_path)
-        if not xls.sheet_names:
+        if not sheet_names(report_path):
             logging.error(f"Отчет сравнения пуст: {report_path}")
             return False
 
@@ -51,167 +60,291 @@ def verify_comparison_report(report_path):
         return False
 
 
-def generate_final_report(reports_dir, final_results_dir, report_prefix):
-    """Генерация финального отчёта с возможностью исключения правил"""
+def generate_findings(reports_dir, extracted=None, excluded_issues=(), hosts=None, records=None):
+    """Находки по отчетам nipper (HTML или XML) в памяти
+
+    extracted - необязательный словарь {путь к отчету: рекомендации}, уже полученный
+    при сканировании; такие отчеты повторно не разбираются.
+    excluded_issues - регулярные выражения исключаемых правил (EXCLUDED_ISSUES).
+    hosts - если задан, учитываются только отчеты этих хостов (частичный отчет уровня).
+    records - записи находок по хостам (host_records.HostRecords), сделанные при
+    сканировании; отчеты с действительной записью не разбираются.
+    """
     try:
-        os.makedirs(final_results_dir, exist_ok=True)
-        report_files = glob.glob(os.path.join(reports_dir, '*.html'))
+        report_files = list_reports(reports_dir)
+        if hosts is not None:
+            hosts = set(hosts)
+            report_files = [path for path in report_files
+                            if host_from_report_name(os.path.basename(path)) in hosts]
 
         if not report_files:
-            logging.warning(f"{'HTML отчеты:':<50} не найдены")
+            logging.warning(f"{'Отчеты nipper:':<50} не найдены")
             return None
 
-        # Компилируем регулярные выражения для исключённых правил
-        excluded_patterns = []
-        for pattern in EXCLUDED_ISSUES:
-            try:
-                excluded_patterns.append(re.compile(pattern))
-            except re.error:
-                logging.warning(f"Некорректное регулярное выражение в EXCLUDED_ISSUES: {pattern}")
-
-        def is_issue_excluded(issue):
-            """Возвращает True, если название проблемы подлежит исключению"""
-            for pattern in excluded_patterns:
-                if pattern.search(issue):
-                    return True
-            return False
-
-        if excluded_patterns:
-            logging.info(f"{'Исключаемые правила (паттернов):':<50} {len(excluded_patterns)}")
-            for p in excluded_patterns:
-                logging.debug(f"  {p.pattern}")
-
-        host_issues = {}
-        issue_meta = {}
-        total_recommendations = 0
-        excluded_count = 0
-
         progress = ProgressBar(len(report_files), "Обработка отчетов")
         logging.info(f"{'Обработка отчетов:':<50} {len(report_files)} файлов")
 
-        from nipper_processing import extract_recommendations_from_html
+        from nipper_processing import extract_recommendations
+
+        extracted = {os.path.normpath(path): recs for path, recs in (extracted or {}).items()}
+        if extracted:
+            logging.info(f"{'Рекомендации из сканирования:':<50} {len(extracted)} отчетов")
 
+        host_recommendations = {}
+        parsed = 0
         for report_file in report_files:
-            filename = os.path.basename(report_file)
-            ip_match = re.search(r'^(\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3})', filename)
-            ip_address = ip_match.group(1) if ip_match else filename.split('_')[0]
-
-            recommendations = extract_recommendations_from_html(report_file)
-
-            if recommendations:
-                total_recommendations += len(recommendations)
-
-                for rec in recommendations:
-                    issue = rec['Issue']
-                    # Проверяем исключение
-                    if is_issue_excluded(issue):
-                        excluded_count += 1
-                        continue
-
-                    if issue not in host_issues:
-                        host_issues[issue] = {}
-                    host_issues[issue][ip_address] = 1
-
-                    if issue not in issue_meta:
-                        issue_meta[issue] = {
-                            'Overall': rec['Overall'],
-                            'Impact': rec['Impact'],
-                            'Ease': rec['Ease'],
-                            'Fix': rec['Fix'],
-                            'Recommendation': rec['Recommendation']
-                        }
-
-            progress.update(1)
-
-        # Логируем количество исключённых записей
-        if excluded_count:
-            logging.info(f"{'Исключено рекомендаций (по правилам):':<50} {excluded_count}")
-
-        if not host_issues:
-            logging.warning(f"{'Данные для отчета:':<50} не найдены (возможно, все правила исключены)")
-            return None
+            ip_address = host_from_report_name(os.path.basename(report_file))
+
+            recommendations = extracted.get(os.path.normpath(report_file))
+            if recommendations is None and records is not None:
+                recommendations = records.recommendations(report_file)
+            if recommendations is None:
+                recommendations = extract_recommendations(report_file)
+                parsed += 1
+
+            host_recommendations.setdefault(ip_address, []).extend(recommendations or [])
+            progress.update(1, file_size(report_file))
+
+        if records is not None:
+            logging.info(f"{'Отчетов без записи находок (разобрано):':<50} {parsed}")
+        return build_findings(host_recommendations, excluded_issues)
+    except Exception as e:
+        logging.exception(f"{'Ошибка генерации:':<50} {str(e)}")
+        return None
 
-        all_hosts = sorted({host for hosts in host_issues.values() for host in hosts})
-        rows = []
 
-        for issue, hosts in host_issues.items():
-            row = {
-                'Issue': issue,
-                **{host: 1 if host in hosts else 0 for host in all_hosts},
-                **issue_meta[issue]
-            }
-            rows.append(row)
+def build_findings(host_recommendations, excluded_issues=()):
+    """Сборка находок по рекомендациям хостов с исключением правил
 
-        df = pd.DataFrame(rows)
-        df.fillna(0, inplace=True)
+    host_recommendations - словарь {хост: [записи с полями Issue, Overall, Impact,
+    Ease, Fix, Recommendation]}, полученный из HTML nipper или быстрого анализатора.
+    """
+    from findings import Findings
 
-        ordered_columns = ['Issue'] + all_hosts + ['Overall', 'Impact', 'Ease', 'Fix', 'Recommendation']
-        df = df[ordered_columns]
+    # Компилируем регулярные выражения для исключённых правил
+    excluded_patterns = []
+    for pattern in excluded_issues:
+        try:
+            excluded_patterns.append(re.compile(pattern))
+        except re.error:
+            logging.warning(f"Некорректное регулярное выражение в EXCLUDED_ISSUES: {pattern}")
+
+    def is_issue_excluded(issue):
+        """Возвращает True, если название проблемы подлежит исключению"""
+        for pattern in excluded_patterns:
+            if pattern.search(issue):
+                return True
+        return False
+
+    if excluded_patterns:
+        logging.info(f"{'Исключаемые правила (паттернов):':<50} {len(excluded_patterns)}")
+        for p in excluded_patterns:
+            logging.debug(f"  {p.pattern}")
+
+    host_issues = {}
+    issue_meta = {}
+    total_recommendations = 0
+    excluded_count = 0
+
+    for ip_address, recommendations in host_recommendations.items():
+        total_recommendations += len(recommendations)
+
+        for rec in recommendations:
+            issue = rec['Issue']
+            # Проверяем исключение
+            if is_issue_excluded(issue):
+                excluded_count += 1
+                continue
+
+            if issue not in host_issues:
+                host_issues[issue] = {}
+            host_issues[issue][ip_address] = 1
+
+            if issue not in issue_meta:
+                issue_meta[issue] = {
+                    'Overall': rec['Overall'],
+                    'Impact': rec['Impact'],
+                    'Ease': rec['Ease'],
+                    'Fix': rec['Fix'],
+                    'Recommendation': rec['Recommendation']
+                }
+
+    # Логируем количество исключённых записей
+    if excluded_count:
+        logging.info(f"{'Исключено рекомендаций (по правилам):':<50} {excluded_count}")
+
+    if not host_issues:
+        logging.warning(f"{'Данные для отчета:':<50} не найдены (возможно, все правила исключены)")
+        return None
+
+    return Findings(host_issues, issue_meta, total_recommendations, scanned_hosts=host_recommendations)
+
+
+def export_final_report(findings, final_results_dir, report_prefix, fingerprint_dir=None):
+    """Выгрузка находок в итоговый Excel-отчет (и отпечаток с той же меткой времени)
+
+    Таблица проверяется до записи, поэтому отчет повторно не читается.
+    Путь к отчету сохраняется в findings.report_path.
+    """
+    try:
+        os.makedirs(final_results_dir, exist_ok=True)
+
+        df = findings.to_dataframe()
+        if df.empty:
+            logging.error(f"{'Ошибка отчета:':<50} нет данных для выгрузки")
+            return None
+        if len(df.columns) > EXCEL_MAX_COLUMNS:
+            logging.error(f"{'Ошибка отчета:':<50} {len(df.columns)} колонок больше предела Excel "
+                          f"({EXCEL_MAX_COLUMNS}), включите разбиение SUMMARY_SHARD_BY")
+            return None
 
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         output_path = os.path.join(final_results_dir, f'{report_prefix}_{timestamp}.xlsx')
         df.to_excel(output_path, index=False)
 
-        if verify_report(output_path):
-            logging.info(f"{'Финальный отчет сохранен:':<50} {output_path}")
-            logging.info(f"{'Всего рекомендаций (до исключения):':<50} {total_recommendations}")
-            logging.info(f"{'Рекомендаций в отчете:':<50} {len(host_issues)}")
-            return output_path
-        else:
-            logging.error(f"{'Ошибка отчета:':<50} отчет не прошел проверку")
-            if os.path.exists(output_path):
-                os.remove(output_path)
+        if not os.path.exists(output_path):
+            logging.error(f"{'Ошибка отчета:':<50} файл не создан")
             return None
+
+        findings.report_path = output_path
+        logging.info(f"{'Финальный отчет сохранен:':<50} {output_path}")
+        logging.info(f"{'Всего рекомендаций (до исключения):':<50} {findings.total_recommendations}")
+        logging.info(f"{'Рекомендаций в отчете:':<50} {len(findings)}")
+        if fingerprint_dir:
+            from fingerprints import save_fingerprint
+            save_fingerprint(findings.fingerprint(), fingerprint_dir, timestamp)
+        return output_path
     except Exception as e:
         logging.exception(f"{'Ошибка генерации:':<50} {str(e)}")
         return None
 
 
-def compare_reports(new_report_path, old_report_path, comparison_dir, comparison_report_prefix):
-    """Сравнение двух отчётов и генерация отчёта о различиях"""
+def _write_shard(job):
+    """Запись одной части итогового отчета (выполняется в рабочем процессе)"""
+    findings, output_path = job
+    findings.to_dataframe().to_excel(output_path, index=False)
+    return output_path
+
+
+def _init_shard_worker(log_queue, log_level, profile_top_n):
+    """Инициализатор процесса записи частей: общий лог и (при PROFILE_MEMORY) профилирование памяти"""
+    from run_record import init_worker_profiling
+
+    init_worker_logging(log_queue, log_level)
+    if profile_top_n:
+        init_worker_profiling(profile_top_n)
+
+
+def export_sharded_report(findings, final_results_dir, report_prefix, shard_of, fingerprint_dir=None,
+                          workers=1, profile_top_n=0):
+    """Выгрузка находок частями (по подсетям или площадкам) с листом оглавления
+
+    shard_of - функция хост -> имя части. Части - обычные итоговые отчеты
+    <report_prefix>_<время>_shards/<часть>.xlsx, записываются параллельно в
+    workers процессах; их лог идет в общий лог, а при profile_top_n каждый
+    процесс при завершении записывает в лог свой пик памяти. Оглавление <report_prefix>_<время>.xlsx содержит лист
+    проблем (число хостов и поля рекомендации) и лист SHARD_INDEX_SHEET со
+    списком частей; load_findings по нему собирает полные находки.
+    Возвращает путь к оглавлению.
+    """
+    import pandas as pd
+    from concurrent.futures import ProcessPoolExecutor
+    from findings import SHARD_INDEX_SHEET
+    from fingerprints import META_COLUMNS
+
     try:
-        if not verify_report(new_report_path):
-            logging.error(f"Новый отчет поврежден или некорректен: {os.path.basename(new_report_path)}")
-            return None
-        if not verify_report(old_report_path):
-            logging.warning(f"Старый отчет поврежден/некорректен и не будет использоваться в сравнении: {os.path.basename(old_report_path)}")
+        if not len(findings):
+            logging.error(f"{'Ошибка отчета:':<50} нет данных для выгрузки")
             return None
 
-        df_new = pd.read_excel(new_report_path)
-        df_old = pd.read_excel(old_report_path)
-
-        meta_columns = ['Issue', 'Overall', 'Impact', 'Ease', 'Fix', 'Recommendation']
-        devices_new = [col for col in df_new.columns if col not in meta_columns]
-        devices_old = [col for col in df_old.columns if col not in meta_columns]
-
-        common_devices = sorted(set(devices_new) & set(devices_old))
-        new_devices = sorted(set(devices_new) - set(devices_old))
-        removed_devices = sorted(set(devices_old) - set(devices_new))
-
-        common_issues = sorted(set(df_new['Issue']) & set(df_old['Issue']))
-        new_issues = sorted(set(df_new['Issue']) - set(df_old['Issue']))
-        fixed_issues = sorted(set(df_old['Issue']) - set(df_new['Issue']))
-
-        fixed_vulnerabilities = []
-        new_vulnerabilities = []
-
-        for issue in common_issues:
-            for device in common_devices:
-                status_old = df_old.loc[df_old['Issue'] == issue, device].values[0]
-                status_new = df_new.loc[df_new['Issue'] == issue, device].values[0]
-
-                if status_old == 1 and status_new == 0:
-                    fixed_vulnerabilities.append({
-                        'Issue': issue,
-                        'Device': device,
-                        'Статус': 'Исправлено'
-                    })
-                elif status_old == 0 and status_new == 1:
-                    new_vulnerabilities.append({
-                        'Issue': issue,
-                        'Device': device,
-                        'Статус': 'Появилось'
-                    })
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        output_path = os.path.join(final_results_dir, f'{report_prefix}_{timestamp}.xlsx')
+        shard_dir_name = f'{report_prefix}_{timestamp}_shards'
+        os.makedirs(os.path.join(final_results_dir, shard_dir_name), exist_ok=True)
+
+        shards = {}
+        for host in findings.hosts:
+            shards.setdefault(shard_of(host), []).append(host)
+        jobs = [(findings.subset(hosts), os.path.join(final_results_dir, shard_dir_name, f'{name}.xlsx'))
+                for name, hosts in sorted(shards.items())]
+        for name, hosts in shards.items():
+            if len(hosts) + len(META_COLUMNS) > EXCEL_MAX_COLUMNS:
+                logging.warning(f"{'Часть отчета превышает предел Excel:':<50} {name} ({len(hosts)} хостов)")
+
+        logging.info(f"{'Частей итогового отчета:':<50} {len(jobs)}")
+        workers = min(workers, len(jobs), os.cpu_count() or 1)
+        if workers > 1:
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_shard_worker,
+                                     initargs=(get_process_log_queue(), logging.getLogger().level,
+                                               profile_top_n)) as pool:
+                list(pool.map(_write_shard, jobs))
+        else:
+            for job in jobs:
+                _write_shard(job)
+
+        issues = pd.DataFrame(
+            [{'Issue': issue, 'Hosts': len(hosts), **findings.issue_meta[issue]}
+             for issue, hosts in findings.host_issues.items()],
+            columns=['Issue', 'Hosts'] + META_COLUMNS[1:])
+        index = pd.DataFrame(
+            [{'Shard': name, 'File': os.path.join(shard_dir_name, os.path.basename(path)),
+              'Hosts': len(part.hosts), 'Issues': len(part)} for (part, path), name in zip(jobs, sorted(shards))],
+            columns=['Shard', 'File', 'Hosts', 'Issues'])
+        with pd.ExcelWriter(output_path) as writer:
+            issues.to_excel(writer, sheet_name='Issues', index=False)
+            index.to_excel(writer, sheet_name=SHARD_INDEX_SHEET, index=False)
+
+        findings.report_path = output_path
+        logging.info(f"{'Финальный отчет сохранен:':<50} {output_path}")
+        logging.info(f"{'Всего рекомендаций (до исключения):':<50} {findings.total_recommendations}")
+        logging.info(f"{'Рекомендаций в отчете:':<50} {len(findings)}")
+        if fingerprint_dir:
+            from fingerprints import save_fingerprint
+            save_fingerprint(findings.fingerprint(), fingerprint_dir, timestamp)
+        return output_path
+    except Exception as e:
+        logging.exception(f"{'Ошибка генерации:':<50} {str(e)}")
+        return None
+
+
+def generate_final_report(reports_dir, final_results_dir, report_prefix, extracted=None,
+                          fingerprint_dir=None, excluded_issues=()):
+    """Генерация финального отчёта по отчетам nipper (HTML или XML)
+
+    fingerprint_dir - если задан, рядом с отчетом сохраняется компактный отпечаток
+    сканирования для быстрого сравнения (см. fingerprints.py).
+    Остальные параметры - как у generate_findings. Возвращает путь к отчету.
+    """
+    findings = generate_findings(reports_dir, extracted, excluded_issues)
+    if not findings:
+        return None
+    return export_final_report(findings, final_results_dir, report_prefix, fingerprint_dir)
+
+
+def build_final_report(host_recommendations, final_results_dir, report_prefix, fingerprint_dir=None,
+                       excluded_issues=()):
+    """Построение финального отчёта по рекомендациям хостов с исключением правил"""
+    findings = build_findings(host_recommendations, excluded_issues)
+    if not findings:
+        return None
+    return export_final_report(findings, final_results_dir, report_prefix, fingerprint_dir)
+
+
+def write_comparison_report(changes, comparison_dir, comparison_report_prefix):
+    """Запись отчёта о различиях между сканированиями.
+
+    changes - словарь со списками new_devices, removed_devices, new_issues,
+    fixed_issues, fixed_vulnerabilities, new_vulnerabilities.
+    """
+    import pandas as pd
+
+    try:
+        new_devices = changes['new_devices']
+        removed_devices = changes['removed_devices']
+        new_issues = changes['new_issues']
+        fixed_issues = changes['fixed_issues']
+        fixed_vulnerabilities = changes['fixed_vulnerabilities']
+        new_vulnerabilities = changes['new_vulnerabilities']
 
         comparison_data = {
             'Изменения': [
@@ -255,8 +388,6 @@ def compare_reports(new_report_path, old_report_path, comparison_dir, comparison
             if not df_status_changes.empty:
                 df_status_changes.to_excel(writer, sheet_name='Изменения статуса', index=False)
 
-        from reporting import verify_comparison_report
-
         if verify_comparison_report(output_path):
             logging.info(f"{'Отчет сравнения сохранен:':<50} {output_path}")
             return output_path
@@ -266,6 +397,32 @@ def compare_reports(new_report_path, old_report_path, comparison_dir, comparison
                 os.remove(output_path)
             return None
 
+    except Exception as e:
+        logging.exception(f"{'Ошибка записи отчета сравнения:':<50} {str(e)}")
+        return None
+
+
+def compare_reports(new_report, old_report, comparison_dir, comparison_report_prefix):
+    """Сравнение двух отчётов и генерация отчёта о различиях
+
+    new_report и old_report - находки (findings.Findings) или пути к итоговым отчетам.
+    """
+    from findings import load_findings
+    from fingerprints import compare_fingerprints
+
+    try:
+        new_findings = load_findings(new_report) if isinstance(new_report, str) else new_report
+        if not new_findings:
+            logging.error(f"Новый отчет поврежден или некорректен: {os.path.basename(str(new_report))}")
+            return None
+        old_findings = load_findings(old_report) if isinstance(old_report, str) else old_report
+        if not old_findings:
+            logging.warning(f"Старый отчет поврежден/некорректен и не будет использоваться в сравнении: {os.path.basename(str(old_report))}")
+            return None
+
+        changes = compare_fingerprints(new_findings.fingerprint(), old_findings.fingerprint())
+        return write_comparison_report(changes, comparison_dir, comparison_report_prefix)
+
     except Exception as e:
         logging.exception(f"{'Ошибка сравнения:':<50} {str(e)}")
         return None
@@ -0,0 +1,195 @@
+import os
+import sys
+import asyncio
+import logging
+import threading
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+try:
+    import psutil
+except ImportError:  # необязательная зависимость
+    psutil = None
+
+
+_warned = set()
+
+
+def _warn_once(key, message):
+    if key not in _warned:
+        _warned.add(key)
+        logging.warning(f"{'Ограничение ресурсов недоступно:':<50} {message}")
+
+
+class JobLimits:
+    """Ограничения ресурсов одной задачи nipper.
+
+    memory_mb   - предел адресного пространства процесса (RLIMIT_AS), 0 - без ограничения
+    cpu_seconds - предел процессорного времени (RLIMIT_CPU), 0 - без ограничения
+    nice        - понижение приоритета CPU (0..19; в Windows >0 - ниже обычного, >=10 - простой)
+    low_io      - пониженный приоритет ввода-вывода (ionice, нужен psutil)
+    """
+    def __init__(self, memory_mb=0, cpu_seconds=0, nice=0, low_io=False):
+        self.memory_mb = memory_mb
+        self.cpu_seconds = cpu_seconds
+        self.nice = nice
+        self.low_io = low_io
+
+    @classmethod
+    def from_settings(cls, settings):
+        return cls(settings.NIPPER_MEMORY_LIMIT_MB, settings.NIPPER_CPU_TIME_LIMIT,
+                   settings.NIPPER_NICE, settings.NIPPER_LOW_IO_PRIORITY)
+
+    def __bool__(self):
+        return bool(self.memory_mb or self.cpu_seconds or self.nice or self.low_io)
+
+
+def _rlimits(limits):
+    rlimits = []
+    if limits.memory_mb:
+        rlimits.append(('RLIMIT_AS', int(limits.memory_mb * 1024 * 1024)))
+    if limits.cpu_seconds:
+        rlimits.append(('RLIMIT_CPU', int(limits.cpu_seconds)))
+    return rlimits
+
+
+def job_preexec_fn(limits):
+    """Функция для preexec_fn запуска nipper (POSIX): пределы памяти и CPU и приоритет
+    ставятся в дочернем процессе до exec, поэтому действуют с самого начала работы nipper.
+
+    None - если ставить нечего или платформа без setrlimit (Windows): тогда все
+    ограничения ставит apply_job_limits после запуска.
+    """
+    if not limits or resource is None or os.name != 'posix':
+        return None
+    rlimits = [(getattr(resource, name), value) for name, value in _rlimits(limits) if hasattr(resource, name)]
+    nice = limits.nice
+    if not rlimits and not nice:
+        return None
+
+    def preexec():
+        # Между fork и exec: без логирования и блокировок, ошибки пропускаются
+        for limit, value in rlimits:
+            try:
+                resource.setrlimit(limit, (value, value))
+            except (OSError, ValueError):
+                pass
+        if nice:
+            try:
+                os.setpriority(os.PRIO_PROCESS, 0, nice)
+            except OSError:
+                pass
+    return preexec
+
+
+def apply_job_limits(pid, limits, in_child=False):
+    """Применение ограничений к уже запущенному процессу nipper.
+
+    in_child - пределы и приоритет CPU уже поставлены при запуске (job_preexec_fn),
+    после запуска остается только приоритет ввода-вывода. Иначе все ограничения
+    ставятся по pid сразу после запуска (prlimit/setpriority). Недоступные на
+    платформе ограничения пропускаются с однократным предупреждением.
+    """
+    if not limits:
+        return
+
+    for name, value in [] if in_child else _rlimits(limits):
+        if resource is not None and hasattr(resource, 'prlimit') and hasattr(resource, name):
+            try:
+                resource.prlimit(pid, getattr(resource, name), (value, value))
+            except (OSError, ValueError) as e:
+                logging.debug(f"{'Не удалось установить ' + name + ':':<50} pid {pid} ({str(e)})")
+        else:
+            _warn_once(name, f"{name} на платформе {sys.platform}")
+
+    if limits.nice and not in_child:
+        try:
+            if psutil is not None:
+                process = psutil.Process(pid)
+                if sys.platform == 'win32':
+                    process.nice(psutil.IDLE_PRIORITY_CLASS if limits.nice >= 10
+                                 else psutil.BELOW_NORMAL_PRIORITY_CLASS)
+                else:
+                    process.nice(limits.nice)
+            elif hasattr(os, 'setpriority'):
+                os.setpriority(os.PRIO_PROCESS, pid, limits.nice)
+            else:
+                _warn_once('nice', "приоритет CPU (установите psutil)")
+        except Exception as e:  # в том числе psutil.Error: процесс уже завершился
+            logging.debug(f"{'Не удалось понизить приоритет:':<50} pid {pid} ({str(e)})")
+
+    if limits.low_io:
+        if psutil is None:
+            _warn_once('ionice', "приоритет ввода-вывода (установите psutil)")
+            return
+        try:
+            process = psutil.Process(pid)
+            if sys.platform == 'win32':
+                process.ionice(psutil.IOPRIO_LOW)
+            elif hasattr(psutil, 'IOPRIO_CLASS_IDLE'):
+                process.ionice(psutil.IOPRIO_CLASS_IDLE)
+            else:
+                _warn_once('ionice', f"приоритет ввода-вывода на платформе {sys.platform}")
+        except Exception as e:
+            logging.debug(f"{'Не удалось понизить приоритет ввода-вывода:':<50} pid {pid} ({str(e)})")
+
+
+def job_memory_mb(limits, default_mb):
+    """Оценка памяти задачи для бюджета: предел задачи, если задан, иначе оценка по умолчанию"""
+    return (limits.memory_mb if limits and limits.memory_mb else 0) or default_mb
+
+
+class MemoryBudget:
+    """Общий бюджет памяти задач nipper (МБ).
+
+    Задача допускается к запуску, если сумма оценок памяти выполняемых задач с
+    ее оценкой не превышает бюджет и (при установленном psutil) в системе
+    достаточно свободной памяти. Если не выполняется ни одной задачи, очередная
+    задача допускается всегда - иначе крупная конфигурация не запустилась бы никогда.
+    Подходит и для пула потоков (acquire/release), и для asyncio (acquire_async/release_async).
+    """
+    def __init__(self, budget_mb):
+        self.budget_mb = budget_mb
+        self.used_mb = 0
+        self._cond = threading.Condition()
+        self._async_cond = None
+
+    def _fits(self, mb):
+        if self.used_mb == 0:
+            return True
+        if self.used_mb + mb > self.budget_mb:
+            return False
+        if psutil is not None:
+            return psutil.virtual_memory().available >= mb * 1024 * 1024
+        return True
+
+    def acquire(self, mb):
+        with self._cond:
+            # Свободная память системы меняется без release - проверяем периодически
+            while not self._fits(mb):
+                self._cond.wait(timeout=1.0)
+            self.used_mb += mb
+
+    def release(self, mb):
+        with self._cond:
+            self.used_mb -= mb
+            self._cond.notify_all()
+
+    async def acquire_async(self, mb):
+        if self._async_cond is None:
+            self._async_cond = asyncio.Condition()
+        async with self._async_cond:
+            while not self._fits(mb):
+                try:
+                    await asyncio.wait_for(self._async_cond.wait(), timeout=1.0)
+                except asyncio.TimeoutError:
+                    pass
+            self.used_mb += mb
+
+    async def release_async(self, mb):
+        async with self._async_cond:
+            self.used_mb -= mb
+            self._async_cond.notify_all()
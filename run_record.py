@@ -0,0 +1,186 @@
+import os
+import sys
+import glob
+import json
+import time
+import logging
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+
+from fingerprints import TIMESTAMP_FORMAT
+
+
+RUN_RECORD_PREFIX = 'run'
+
+_MB = 1024 * 1024
+
+
+def peak_rss_mb():
+    """Пиковый RSS текущего процесса за все время работы, МБ (None, если недоступен)"""
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux - килобайты, macOS - байты
+        return round(peak / (_MB if sys.platform == 'darwin' else 1024), 1)
+    except ImportError:
+        pass
+    try:
+        import psutil
+        info = psutil.Process().memory_info()
+        return round(getattr(info, 'peak_wset', info.rss) / _MB, 1)
+    except ImportError:
+        return None
+
+
+def current_rss_mb():
+    """Текущий RSS процесса, МБ (None, если недоступен)"""
+    try:
+        import psutil
+        return round(psutil.Process().memory_info().rss / _MB, 1)
+    except ImportError:
+        pass
+    try:
+        with open('/proc/self/statm') as f:
+            return round(int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / _MB, 1)
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def top_allocations(top_n=10):
+    """Крупнейшие места выделения памяти по данным tracemalloc"""
+    snapshot = tracemalloc.take_snapshot().filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+        tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>'),
+        tracemalloc.Filter(False, '<unknown>'),
+    ))
+    result = []
+    for stat in snapshot.statistics('lineno')[:top_n]:
+        frame = stat.traceback[0]
+        result.append({
+            'location': f"{frame.filename}:{frame.lineno}",
+            'size_mb': round(stat.size / _MB, 2),
+            'count': stat.count,
+        })
+    return result
+
+
+class MemoryProfiler:
+    """Снимки памяти на границах этапов: RSS процесса и выделения Python (tracemalloc)"""
+    def __init__(self, top_n=10):
+        self.top_n = top_n
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def checkpoint(self):
+        """Память с предыдущей контрольной точки; пик tracemalloc после снимка сбрасывается"""
+        current, peak = tracemalloc.get_traced_memory()
+        result = {
+            'peak_rss_mb': peak_rss_mb(),
+            'rss_mb': current_rss_mb(),
+            'traced_current_mb': round(current / _MB, 1),
+            'traced_peak_mb': round(peak / _MB, 1),
+            'top_allocations': top_allocations(self.top_n),
+        }
+        if hasattr(tracemalloc, 'reset_peak'):
+            tracemalloc.reset_peak()
+        return result
+
+    def stop(self):
+        tracemalloc.stop()
+
+
+def init_worker_profiling(top_n=10):
+    """Инициализатор рабочего процесса: профилирование памяти с записью в лог при завершении.
+
+    Используется вместе с utils.init_worker_logging, чтобы отчет попал в общий лог.
+    Рабочие процессы пула завершаются без обработчиков atexit, поэтому отчет
+    регистрируется как финализатор multiprocessing (до закрытия очереди лога).
+    """
+    from multiprocessing.util import Finalize
+
+    profiler = MemoryProfiler(top_n)
+
+    def report():
+        memory = profiler.checkpoint()
+        logging.info(f"{'Память процесса ' + str(os.getpid()) + ':':<50} пиковый RSS {memory['peak_rss_mb']} MB, "
+                     f"пик Python {memory['traced_peak_mb']} MB")
+        for item in memory['top_allocations']:
+            logging.info(f"  {item['size_mb']:>8} MB {item['count']:>8}  {item['location']}")
+
+    Finalize(None, report, exitpriority=100)
+
+
+class RunRecord:
+    """Журнал одного запуска: этапы, их длительность и результат, память по этапам.
+
+    Сохраняется в <RUN_RECORD_DIR>/run_<YYYYMMDD_HHMMSS>.json.
+    """
+    def __init__(self, stages, profile_memory=False, top_n=10):
+        self.started = time.time()
+        self.run_id = datetime.now().strftime(TIMESTAMP_FORMAT)
+        self.data = {
+            'run_id': self.run_id,
+            'started': datetime.now().isoformat(timespec='seconds'),
+            'selected_stages': list(stages),
+            'status': 'running',
+            'stages': {},
+        }
+        self.profiler = MemoryProfiler(top_n) if profile_memory else None
+
+    @contextmanager
+    def stage(self, name):
+        """Учет этапа: длительность, успех и (при профилировании) память на выходе"""
+        entry = {'ok': False}
+        self.data['stages'][name] = entry
+        start = time.time()
+        try:
+            yield entry
+        finally:
+            entry['duration'] = round(time.time() - start, 3)
+            if self.profiler:
+                entry['memory'] = self.profiler.checkpoint()
+                logging.info(f"{'Память после этапа ' + name + ':':<50} пиковый RSS {entry['memory']['peak_rss_mb']} MB, "
+                             f"пик Python {entry['memory']['traced_peak_mb']} MB")
+
+    def set(self, key, value):
+        self.data[key] = value
+
+    def finish(self, status):
+        self.data['status'] = status
+        self.data['duration'] = round(time.time() - self.started, 3)
+        if self.profiler:
+            self.data['peak_rss_mb'] = peak_rss_mb()
+            self.profiler.stop()
+            self.profiler = None
+
+    def save(self, record_dir):
+        """Запись журнала запуска; возвращает путь к файлу или None"""
+        try:
+            os.makedirs(record_dir, exist_ok=True)
+            path = os.path.join(record_dir, f'{RUN_RECORD_PREFIX}_{self.run_id}.json')
+            tmp_path = path + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.data, f, ensure_ascii=False, indent=1, default=str)
+            os.replace(tmp_path, path)
+            logging.info(f"{'Журнал запуска сохранен:':<50} {path}")
+            return path
+        except Exception as e:
+            logging.error(f"{'Ошибка сохранения журнала запуска:':<50} {str(e)}")
+            return None
+
+
+def list_run_records(record_dir):
+    """Пути к журналам запусков, от старых к новым"""
+    return sorted(glob.glob(os.path.join(record_dir, f'{RUN_RECORD_PREFIX}_*.json')))
+
+
+def load_run_record(path):
+    """Загрузка журнала запуска"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except Exception as e:
+        logging.error(f"{'Ошибка чтения журнала запуска:':<50} {path}\n{str(e)}")
+        return None
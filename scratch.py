@@ -0,0 +1,123 @@
+import os
+import shutil
+import logging
+import tempfile
+import threading
+
+
+_MB = 1024 * 1024
+
+# Начальная оценка размера отчета nipper, пока не известен ни один реальный
+DEFAULT_REPORT_ESTIMATE_MB = 16
+
+
+class ScratchWorkspace:
+    """Временная рабочая папка в памяти (tmpfs, например /dev/shm) с бюджетом размера.
+
+    Промежуточные файлы запуска - исходный вывод nipper до сжатия, конфигурации до
+    переименования - пишутся сюда, а в постоянные папки попадают только сохраняемые
+    результаты. Место резервируется перед записью (reserve); если бюджет или
+    свободное место tmpfs исчерпаны, файл пишется сразу на диск (spill).
+    Без root (SCRATCH_DIR = '') рабочая папка выключена и reserve всегда отказывает.
+    """
+    def __init__(self, root, budget_mb):
+        self.root = root
+        self.budget = int(budget_mb * _MB)
+        self.used = 0
+        self.peak = 0
+        self.staged = 0
+        self.spilled = 0
+        self.retried = 0
+        self.report_estimate = DEFAULT_REPORT_ESTIMATE_MB * _MB
+        self._observed = False
+        self.path = None
+        self._lock = threading.Lock()
+        if root:
+            try:
+                os.makedirs(root, exist_ok=True)
+                # Отдельная папка запуска: одновременные запуски не мешают друг другу
+                self.path = tempfile.mkdtemp(prefix='nipper_', dir=root)
+            except OSError as e:
+                logging.warning(f"{'Рабочая папка в памяти недоступна:':<50} {root} ({str(e)})")
+
+    def __bool__(self):
+        return self.path is not None
+
+    def subdir(self, name):
+        path = os.path.join(self.path, name)
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    def reserve(self, nbytes):
+        """Резервирование места; False - файл нужно писать на диск"""
+        if not self:
+            return False
+        with self._lock:
+            fits = self.used + nbytes <= self.budget
+            if fits:
+                try:
+                    fits = shutil.disk_usage(self.path).free >= nbytes
+                except OSError:
+                    fits = False
+            if not fits:
+                self.spilled += 1
+                return False
+            self.used += nbytes
+            self.peak = max(self.peak, self.used)
+            self.staged += 1
+            return True
+
+    def release(self, nbytes):
+        with self._lock:
+            self.used -= nbytes
+
+    def exhausted(self):
+        """В tmpfs не осталось места даже на один отчет: неудачная запись в рабочую
+        папку, вероятно, вызвана нехваткой места (оценка отчета оказалась мала)"""
+        try:
+            return shutil.disk_usage(self.path).free < self.report_estimate
+        except OSError:
+            return True
+
+    def record_retry(self):
+        """Учет задачи, повторенной на диске после переполнения рабочей папки"""
+        with self._lock:
+            self.retried += 1
+
+    def observe_report(self, nbytes):
+        """Оценка размера отчета - наибольший из фактических (вместо начальной)"""
+        with self._lock:
+            self.report_estimate = max(self.report_estimate, nbytes) if self._observed else nbytes
+            self._observed = True
+
+    def stats(self):
+        return {
+            'root': self.root,
+            'budget_mb': round(self.budget / _MB, 1),
+            'peak_mb': round(self.peak / _MB, 1),
+            'staged': self.staged,
+            'spilled': self.spilled,
+            'retried': self.retried,
+        }
+
+    def cleanup(self):
+        if self.path:
+            shutil.rmtree(self.path, ignore_errors=True)
+            logging.info(f"{'Рабочая папка в памяти:':<50} пик {self.stats()['peak_mb']} MB, "
+                         f"в памяти {self.staged}, на диск {self.spilled}, повторено на диске {self.retried}")
+            self.path = None
+
+
+def move_files(source_dir, target_dir, suffix=''):
+    """Перенос файлов из рабочей папки в постоянную (с заменой существующих)"""
+    os.makedirs(target_dir, exist_ok=True)
+    moved = 0
+    for name in os.listdir(source_dir):
+        if not name.lower().endswith(suffix):
+            continue
+        target_path = os.path.join(target_dir, name)
+        if os.path.exists(target_path):
+            os.remove(target_path)
+        shutil.move(os.path.join(source_dir, name), target_path)
+        moved += 1
+    return moved
@@ -1,155 +1,299 @@
 import os
-import pandas as pd
 import logging
 import shutil
 import re
-from bs4 import BeautifulSoup
 from utils import ProgressBar
+from report_store import open_report, is_xml_report, HostIndex
+
+
+# Колонки таблицы задачи (файл в папке проблемы или лист книги задач)
+TASK_COLUMNS = ['IP Address', 'Issue', 'Recommendation', 'Overall', 'Impact', 'Ease', 'Fix']
+DESCRIPTION_FILE = "описание.txt"
+
+# Режим TASK_OUTPUT_MODE = 'workbook'
+TASK_WORKBOOK_FILE = "задачи.xlsx"
+TASK_INDEX_SHEET = "Оглавление"
+TASK_INDEX_COLUMNS = ['Issue', 'Sheet', 'Hosts', 'Recommendation', 'Overall', 'Impact', 'Ease', 'Fix']
+DESCRIPTIONS_FILE = "описания.txt"
 
 
 def extract_vulnerability_description(html_path, issue_name):
     """Извлечение подробного описания уязвимости из HTML отчета"""
+    return extract_vulnerability_descriptions(html_path, [issue_name]).get(issue_name)
+
+
+def extract_vulnerability_descriptions(report_path, issue_names, warn_missing=True):
+    """Описания нескольких уязвимостей за один разбор отчета (HTML или XML).
+
+    Возвращает словарь {уязвимость: описание}; ненайденные уязвимости отсутствуют.
+    warn_missing=False - не выводить предупреждения о ненайденных.
+    """
+    if is_xml_report(report_path):
+        from nipper_xml import extract_vulnerability_descriptions_from_xml
+        return extract_vulnerability_descriptions_from_xml(report_path, issue_names, warn_missing)
+    from bs4 import BeautifulSoup
+
     try:
-        with open(html_path, 'r', encoding='utf-8') as f:
+        with open_report(report_path) as f:
             soup = BeautifulSoup(f, 'html.parser')
-        
-        # Ищем все h3 теги (заголовки уязвимостей)
-        h3_tags = soup.find_all('h3')
-        
-        for h3 in h3_tags:
-            # Проверяем, содержит ли заголовок название уязвимости
-            if issue_name in h3.get_text():
-                # Находим родительский div (блок уязвимости)
-                vulnerability_div = h3.find_parent('div')
-                if vulnerability_div:
-                    # Извлекаем весь текст блока уязвимости
-                    text_elements = []
-                    
-                    # Добавляем заголовок
-                    text_elements.append(h3.get_text(strip=True))
-                    
-                    # Ищем блок с рейтингами
-                    ratings_div = vulnerability_div.find('div', class_='ratings')
-                    if ratings_div:
-                        text_elements.append(ratings_div.get_text(strip=True))
-                    
-                    # Ищем все подразделы (Finding, Impact, Ease, Recommendation)
-                    sections = vulnerability_div.find_all(['h5', 'p', 'pre'])
-                    
-                    current_section = None
-                    for element in sections:
-                        if element.name == 'h5':
-                            current_section = element.get_text(strip=True)
-                            text_elements.append(f"\n{current_section}")
-                        elif element.name == 'p':
-                            text = element.get_text(strip=True)
-                            if text:
-                                if current_section and current_section in text:
-                                    text_elements.append(text)
-                                else:
-                                    text_elements.append(f"  {text}")
-                        elif element.name == 'pre':
-                            text = element.get_text()
-                            if text:
-                                text_elements.append(f"\n  Команда:\n{text}")
-                    
-                    # Объединяем все элементы
-                    full_text = '\n'.join(text_elements)
-                    
-                    # Очищаем текст от лишних пробелов и переносов
-                    full_text = re.sub(r'\n\s*\n', '\n\n', full_text)
-                    full_text = re.sub(r'[ \t]+', ' ', full_text)
-                    
-                    logging.debug(f"Извлечено описание уязвимости: {issue_name}")
-                    return full_text
-        
-        # Если уязвимость не найдена, попробуем найти по частичному совпадению
-        for h3 in h3_tags:
-            h3_text = h3.get_text(strip=True)
-            # Удаляем номер из начала заголовка (например, "2.3. ")
-            clean_h3_text = re.sub(r'^\d+\.\d+\.\s*', '', h3_text)
-            if issue_name.lower() in clean_h3_text.lower():
-                # Используем тот же алгоритм извлечения
-                vulnerability_div = h3.find_parent('div')
-                if vulnerability_div:
-                    return vulnerability_div.get_text(separator='\n', strip=True)
-        
-        logging.warning(f"Уязвимость не найдена в отчете: {issue_name}")
-        return None
-        
+        return descriptions_from_soup(soup, issue_names, warn_missing)
     except Exception as e:
-        logging.error(f"Ошибка извлечения описания из {html_path}: {str(e)}")
-        return None
+        logging.error(f"Ошибка извлечения описания из {report_path}: {str(e)}")
+        return {}
+
+
+def descriptions_from_soup(soup, issue_names, warn_missing=True):
+    """Описания уязвимостей из разобранного HTML-отчета nipper"""
+    if not issue_names:
+        return {}
+    # Заголовки уязвимостей собираются один раз на отчет
+    h3_tags = soup.find_all('h3')
+    descriptions = {}
+    for issue_name in issue_names:
+        description = _description_from_soup(h3_tags, issue_name)
+        if description:
+            descriptions[issue_name] = description
+        elif warn_missing:
+            logging.warning(f"Уязвимость не найдена в отчете: {issue_name}")
+    return descriptions
+
+
+def _description_from_soup(h3_tags, issue_name):
+    """Описание одной уязвимости: блок с заголовком h3, содержащим название,
+    иначе - совпадение без учета регистра и номера раздела"""
+    for h3 in h3_tags:
+        # Проверяем, содержит ли заголовок название уязвимости
+        if issue_name in h3.get_text():
+            # Находим родительский div (блок уязвимости)
+            vulnerability_div = h3.find_parent('div')
+            if vulnerability_div:
+                # Извлекаем весь текст блока уязвимости
+                text_elements = []
+                
+                # Добавляем заголовок
+                text_elements.append(h3.get_text(strip=True))
+                
+                # Ищем блок с рейтингами
+                ratings_div = vulnerability_div.find('div', class_='ratings')
+                if ratings_div:
+                    text_elements.append(ratings_div.get_text(strip=True))
+                
+                # Ищем все подразделы (Finding, Impact, Ease, Recommendation)
+                sections = vulnerability_div.find_all(['h5', 'p', 'pre'])
+                
+                current_section = None
+                for element in sections:
+                    if element.name == 'h5':
+                        current_section = element.get_text(strip=True)
+                        text_elements.append(f"\n{current_section}")
+                    elif element.name == 'p':
+                        text = element.get_text(strip=True)
+                        if text:
+                            if current_section and current_section in text:
+                                text_elements.append(text)
+                            else:
+                                text_elements.append(f"  {text}")
+                    elif element.name == 'pre':
+                        text = element.get_text()
+                        if text:
+                            text_elements.append(f"\n  Команда:\n{text}")
+                
+                # Объединяем все элементы
+                full_text = '\n'.join(text_elements)
+                
+                # Очищаем текст от лишних пробелов и переносов
+                full_text = re.sub(r'\n\s*\n', '\n\n', full_text)
+                full_text = re.sub(r'[ \t]+', ' ', full_text)
+                
+                logging.debug(f"Извлечено описание уязвимости: {issue_name}")
+                return full_text
+    
+    # Если уязвимость не найдена, попробуем найти по частичному совпадению
+    for h3 in h3_tags:
+        h3_text = h3.get_text(strip=True)
+        # Удаляем номер из начала заголовка (например, "2.3. ")
+        clean_h3_text = re.sub(r'^\d+\.\d+\.\s*', '', h3_text)
+        if issue_name.lower() in clean_h3_text.lower():
+            # Используем тот же алгоритм извлечения
+            vulnerability_div = h3.find_parent('div')
+            if vulnerability_div:
+                return vulnerability_div.get_text(separator='\n', strip=True)
+    
+    return None
 
 
-def get_vulnerability_html_file(reports_dir, ip_address):
-    """Получение пути к HTML файлу для конкретного IP"""
+def get_vulnerability_html_file(reports_dir, ip_address, host_index=None):
+    """Получение пути к отчету nipper для конкретного IP (правила - см. report_store.HostIndex)"""
     try:
-        # Формируем путь к HTML файлу
-        html_file = os.path.join(reports_dir, f"{ip_address}_report.html")
-        
-        if os.path.exists(html_file):
-            return html_file
-        
-        # Пробуем найти файл с разными вариантами именования
-        alternative_patterns = [
-            f"{ip_address}_report.html",
-            f"{ip_address.replace('.', '_')}_report.html",
-            f"report_{ip_address}.html",
-        ]
-        
-        for pattern in alternative_patterns:
-            html_file = os.path.join(reports_dir, pattern)
-            if os.path.exists(html_file):
-                return html_file
-        
-        # Ищем любой HTML файл, содержащий IP в имени
-        for file in os.listdir(reports_dir):
-            if file.endswith('.html') and ip_address in file:
-                return os.path.join(reports_dir, file)
-        
-        return None
-        
+        if host_index is None:
+            host_index = HostIndex(reports_dir)
+        return host_index.report(ip_address)
     except Exception as e:
         logging.error(f"Ошибка поиска HTML файла для {ip_address}: {str(e)}")
         return None
 
 
-def create_task_folders(final_report_path, task_distribution_dir, reports_dir):
-    """Создание структуры папок для задач на основе финального отчета"""
+def issue_description(issue, recommendation, hosts, reports_dir, host_index, records=None):
+    """Подробное описание уязвимости из отчета nipper первого хоста.
+
+    Описание берется из записей находок хостов (records, см. host_records.py), а
+    без них - из отчета первого хоста. Если отчет или описание не найдены - минимальное
+    описание с рекомендацией; без reports_dir описание не создается (None).
+    """
+    if not hosts or not reports_dir:
+        return None
+    if records:
+        # При сканировании описание уязвимости записывается только для одного из хостов
+        for host in hosts:
+            report = host_index.report(host)
+            description = records.description(report, issue) if report else None
+            if description:
+                return description
+    html_file = host_index.report(hosts[0])
+    if html_file and os.path.exists(html_file):
+        description = extract_vulnerability_description(html_file, issue)
+        if description:
+            return description
+    return f"{issue}\n\nРекомендация: {recommendation}"
+
+
+def _task_dataframe(issue, row, hosts):
+    """Таблица задачи: строка на каждый хост с уязвимостью"""
+    import pandas as pd
+
+    return pd.DataFrame({
+        'IP Address': hosts,
+        'Issue': [issue] * len(hosts),
+        'Recommendation': [row['Recommendation']] * len(hosts),
+        'Overall': [row['Overall']] * len(hosts),
+        'Impact': [row['Impact']] * len(hosts),
+        'Ease': [row['Ease']] * len(hosts),
+        'Fix': [row['Fix']] * len(hosts)
+    }, columns=TASK_COLUMNS)
+
+
+def _prepare_task_dir(task_distribution_dir, findings):
+    """Очистка папки задач и загрузка находок, если передан путь к итоговому отчету"""
+    from findings import load_findings
+
+    # Очистка папки "отправить в задачи"
+    if os.path.exists(task_distribution_dir):
+        shutil.rmtree(task_distribution_dir)
+        logging.info(f"{'Очищена папка:':<50} {task_distribution_dir}")
+
+    # Создание папки "отправить в задачи"
+    os.makedirs(task_distribution_dir, exist_ok=True)
+    logging.info(f"{'Создана папка:':<50} {task_distribution_dir}")
+
+    # Чтение финального отчета (если находки не переданы из памяти)
+    if isinstance(findings, str):
+        if not os.path.exists(findings):
+            logging.error(f"{'Финальный отчет не найден:':<50} {findings}")
+            return None
+        findings = load_findings(findings)
+        if not findings:
+            return None
+
+    if not findings.hosts:
+        logging.warning(f"{'IP-адреса не найдены в отчете:':<50}")
+        return None
+    return findings
+
+
+def create_tasks(findings, task_distribution_dir, reports_dir, host_index=None, mode='folders', records=None):
+    """Создание задач в режиме TASK_OUTPUT_MODE: 'folders' - папка на каждую проблему,
+    'workbook' - одна книга Excel и один файл описаний"""
+    if mode == 'workbook':
+        return create_task_workbook(findings, task_distribution_dir, reports_dir, host_index, records)
+    return create_task_folders(findings, task_distribution_dir, reports_dir, host_index, records)
+
+
+def create_task_workbook(findings, task_distribution_dir, reports_dir, host_index=None, records=None):
+    """Создание задач одной книгой Excel: лист оглавления и лист на каждую проблему,
+    плюс один файл со всеми описаниями.
+
+    Число создаваемых файлов не зависит от числа проблем (в отличие от
+    create_task_folders), что важно для сетевых папок. Параметры - как у
+    create_task_folders.
+    """
+    import pandas as pd
+    from openpyxl.worksheet.hyperlink import Hyperlink
+
     try:
-        # Очистка папки "отправить в задачи"
-        if os.path.exists(task_distribution_dir):
-            shutil.rmtree(task_distribution_dir)
-            logging.info(f"{'Очищена папка:':<50} {task_distribution_dir}")
-        
-        # Создание папки "отправить в задачи"
-        os.makedirs(task_distribution_dir, exist_ok=True)
-        logging.info(f"{'Создана папка:':<50} {task_distribution_dir}")
-        
-        # Чтение финального отчета
-        if not os.path.exists(final_report_path):
-            logging.error(f"{'Финальный отчет не найден:':<50} {final_report_path}")
+        findings = _prepare_task_dir(task_distribution_dir, findings)
+        if not findings:
             return False
-        
-        df = pd.read_excel(final_report_path)
-        
-        # Определяем мета-колонки
-        meta_columns = ['Issue', 'Overall', 'Impact', 'Ease', 'Fix', 'Recommendation']
-        
-        # Находим колонки с IP-адресами
-        ip_columns = [col for col in df.columns if col not in meta_columns]
-        
-        if not ip_columns:
-            logging.warning(f"{'IP-адреса не найдены в отчете:':<50}")
+        if reports_dir and host_index is None:
+            host_index = HostIndex(reports_dir)
+
+        logging.info(f"{'Создание книги задач:':<50} начато")
+        progress = ProgressBar(len(findings), "Создание листов с задачами")
+        index_rows = []
+        descriptions = []
+        workbook_path = os.path.join(task_distribution_dir, TASK_WORKBOOK_FILE)
+        with pd.ExcelWriter(workbook_path, engine='openpyxl') as writer:
+            # Оглавление записывается первым, ссылки на листы добавляются в конце
+            pd.DataFrame(columns=TASK_INDEX_COLUMNS).to_excel(writer, sheet_name=TASK_INDEX_SHEET, index=False)
+            for number, issue in enumerate(findings.issues, 1):
+                row = findings.issue_meta[issue]
+                vulnerable_ips = findings.hosts_for(issue)
+                # Имя листа Excel: до 31 символа, без []:*?/\
+                sheet_name = f"{number:03d} " + re.sub(r'[\[\]:*?/\\]', '_', str(issue))[:27]
+                _task_dataframe(issue, row, vulnerable_ips).to_excel(writer, sheet_name=sheet_name, index=False)
+                index_rows.append({'Issue': issue, 'Sheet': sheet_name, 'Hosts': len(vulnerable_ips),
+                                   **{col: row[col] for col in TASK_COLUMNS[2:]}})
+
+                description = issue_description(issue, row['Recommendation'], vulnerable_ips, reports_dir,
+                                                host_index, records)
+                if description:
+                    descriptions.append(f"{'=' * 80}\n{number:03d}. {issue}\n{'=' * 80}\n{description}\n")
+                progress.update(1)
+
+            index_df = pd.DataFrame(index_rows, columns=TASK_INDEX_COLUMNS)
+            index_df.to_excel(writer, sheet_name=TASK_INDEX_SHEET, index=False)
+            sheet = writer.sheets[TASK_INDEX_SHEET]
+            for position, sheet_name in enumerate(index_df['Sheet'], 2):
+                cell = sheet.cell(row=position, column=2)
+                location = "'" + sheet_name.replace("'", "''") + "'!A1"
+                cell.hyperlink = Hyperlink(ref=cell.coordinate, location=location)
+                cell.style = 'Hyperlink'
+        progress.close()
+
+        if descriptions:
+            with open(os.path.join(task_distribution_dir, DESCRIPTIONS_FILE), 'w', encoding='utf-8') as f:
+                f.write('\n'.join(descriptions))
+
+        logging.info(f"{'Создано листов с задачами:':<50} {len(index_rows)}")
+        logging.info(f"{'Книга задач:':<50} {workbook_path}")
+        return True
+
+    except Exception as e:
+        logging.exception(f"{'Ошибка создания книги задач:':<50} {str(e)}")
+        return False
+
+
+def create_task_folders(findings, task_distribution_dir, reports_dir, host_index=None, records=None):
+    """Создание структуры папок для задач на основе финального отчета
+
+    findings - находки этапа summarize (findings.Findings) или путь к итоговому отчету.
+    host_index - индекс хост -> отчет (report_store.HostIndex); если не передан,
+    строится один раз по reports_dir.
+    records - записи находок по хостам (host_records.HostRecords) с описаниями.
+    """
+    try:
+        findings = _prepare_task_dir(task_distribution_dir, findings)
+        if not findings:
             return False
         
+        if reports_dir and host_index is None:
+            host_index = HostIndex(reports_dir)
+        
         # Обработка каждой уязвимости
         logging.info(f"{'Создание структуры задач:':<50} начато")
-        progress = ProgressBar(len(df), "Создание папок с задачами")
+        progress = ProgressBar(len(findings), "Создание папок с задачами")
         
-        for _, row in df.iterrows():
-            issue = row['Issue']
+        for issue in findings.issues:
+            row = findings.issue_meta[issue]
             recommendation = row['Recommendation']
             
             # Очистка названия папки от недопустимых символов
@@ -160,22 +304,11 @@ def create_task_folders(final_report_path, task_distribution_dir, reports_dir):
             os.makedirs(issue_folder, exist_ok=True)
             
             # Поиск IP-адресов с данной уязвимостью
-            vulnerable_ips = []
-            for ip in ip_columns:
-                if pd.notna(row[ip]) and row[ip] == 1:
-                    vulnerable_ips.append(ip)
+            vulnerable_ips = findings.hosts_for(issue)
             
             # Создание Excel файла в папке
             if vulnerable_ips:
-                task_df = pd.DataFrame({
-                    'IP Address': vulnerable_ips,
-                    'Issue': [issue] * len(vulnerable_ips),
-                    'Recommendation': [recommendation] * len(vulnerable_ips),
-                    'Overall': [row['Overall']] * len(vulnerable_ips),
-                    'Impact': [row['Impact']] * len(vulnerable_ips),
-                    'Ease': [row['Ease']] * len(vulnerable_ips),
-                    'Fix': [row['Fix']] * len(vulnerable_ips)
-                })
+                task_df = _task_dataframe(issue, row, vulnerable_ips)
                 
                 # Сохранение Excel файла
                 safe_filename = re.sub(r'[<>:"/\\|?*]', '_', str(issue))
@@ -184,32 +317,13 @@ def create_task_folders(final_report_path, task_distribution_dir, reports_dir):
                 logging.debug(f"{'Создан Excel файл:':<50} {output_excel}")
                 
                 # Создание файла с подробным описанием уязвимости
-                # Используем первый IP для извлечения описания
-                if vulnerable_ips and reports_dir:
-                    first_ip = vulnerable_ips[0]
-                    html_file = get_vulnerability_html_file(reports_dir, first_ip)
-                    
-                    if html_file and os.path.exists(html_file):
-                        description = extract_vulnerability_description(html_file, issue)
-                        if description:
-                            description_file = os.path.join(issue_folder, "описание.txt")
-                            with open(description_file, 'w', encoding='utf-8') as f:
-                                f.write(description)
-                            logging.debug(f"{'Создан файл с описанием:':<50} {description_file}")
-                        else:
-                            # Создаем минимальное описание, если не удалось извлечь из HTML
-                            minimal_description = f"{issue}\n\nРекомендация: {recommendation}"
-                            description_file = os.path.join(issue_folder, "описание.txt")
-                            with open(description_file, 'w', encoding='utf-8') as f:
-                                f.write(minimal_description)
-                            logging.debug(f"{'Создано минимальное описание:':<50} {description_file}")
-                    else:
-                        # Создаем минимальное описание, если HTML файл не найден
-                        minimal_description = f"{issue}\n\nРекомендация: {recommendation}"
-                        description_file = os.path.join(issue_folder, "описание.txt")
-                        with open(description_file, 'w', encoding='utf-8') as f:
-                            f.write(minimal_description)
-                        logging.debug(f"{'Создано минимальное описание:':<50} {description_file}")
+                description = issue_description(issue, recommendation, vulnerable_ips, reports_dir,
+                                                host_index, records)
+                if description:
+                    description_file = os.path.join(issue_folder, DESCRIPTION_FILE)
+                    with open(description_file, 'w', encoding='utf-8') as f:
+                        f.write(description)
+                    logging.debug(f"{'Создан файл с описанием:':<50} {description_file}")
             else:
                 logging.warning(f"{'Нет IP с уязвимостью:':<50} {issue}")
             
@@ -229,11 +343,17 @@ def create_task_folders(final_report_path, task_distribution_dir, reports_dir):
 
 def verify_task_structure(task_distribution_dir):
     """Проверка целостности созданной структуры задач"""
+    from excel_reader import read_header
+
     try:
         if not os.path.exists(task_distribution_dir):
             logging.error(f"{'Папка не существует:':<50} {task_distribution_dir}")
             return False
         
+        workbook_path = os.path.join(task_distribution_dir, TASK_WORKBOOK_FILE)
+        if os.path.exists(workbook_path):
+            return verify_task_workbook(workbook_path)
+        
         folders = [d for d in os.listdir(task_distribution_dir) 
                   if os.path.isdir(os.path.join(task_distribution_dir, d))]
         
@@ -252,17 +372,16 @@ def verify_task_structure(task_distribution_dir):
             total_excel_files += len(excel_files)
             
             # Проверка файлов с описанием
-            description_files = [f for f in os.listdir(folder_path) if f == "описание.txt"]
+            description_files = [f for f in os.listdir(folder_path) if f == DESCRIPTION_FILE]
             total_description_files += len(description_files)
             
             # Проверка содержимого Excel файлов
             for file in excel_files:
                 file_path = os.path.join(folder_path, file)
                 try:
-                    df = pd.read_excel(file_path)
-                    required_columns = ['IP Address', 'Issue', 'Recommendation', 'Overall', 'Impact', 'Ease', 'Fix']
-                    for col in required_columns:
-                        if col not in df.columns:
+                    columns = read_header(file_path)
+                    for col in TASK_COLUMNS:
+                        if col not in columns:
                             logging.error(f"{'Отсутствует колонка в файле:':<50} {col} в {file}")
                             return False
                 except Exception as e:
@@ -289,4 +408,34 @@ def verify_task_structure(task_distribution_dir):
         
     except Exception as e:
         logging.error(f"{'Ошибка проверки структуры задач:':<50} {str(e)}")
-        return False
\ No newline at end of file
+        return False
+
+
+def verify_task_workbook(workbook_path):
+    """Проверка книги задач (TASK_OUTPUT_MODE = 'workbook'): оглавление и листы проблем"""
+    from excel_reader import ExcelBook
+
+    try:
+        with ExcelBook(workbook_path) as book:
+            index_df = book.read(TASK_INDEX_SHEET)
+            for col in TASK_INDEX_COLUMNS:
+                if col not in index_df.columns:
+                    logging.error(f"{'Отсутствует колонка в оглавлении:':<50} {col}")
+                    return False
+            missing = set(index_df['Sheet']) - set(book.sheet_names)
+            if missing:
+                logging.error(f"{'Нет листов из оглавления:':<50} {', '.join(sorted(missing))}")
+                return False
+            if index_df.empty:
+                logging.warning(f"{'Листы с задачами не созданы:':<50}")
+                return False
+
+        descriptions_path = os.path.join(os.path.dirname(workbook_path), DESCRIPTIONS_FILE)
+        logging.info(f"{'Проверка книги задач:':<50} успешно")
+        logging.info(f"{'  Листов с задачами:':<50} {len(index_df)}")
+        logging.info(f"{'  Файл с описаниями:':<50} {'есть' if os.path.exists(descriptions_path) else 'нет'}")
+        return True
+
+    except Exception as e:
+        logging.error(f"{'Ошибка проверки книги задач:':<50} {str(e)}")
+        return False
@@ -0,0 +1,55 @@
+import os
+import sys
+
+import pytest
+
+# Модули проекта лежат в корне репозитория
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+RECOMMENDATIONS_HEADER = ('Issue', 'Overall', 'Impact', 'Ease', 'Fix', 'Recommendation')
+
+
+def write_html_report(path, issues, described=()):
+    """Минимальный HTML-отчет nipper с таблицей Recommendations и блоками
+    описаний уязвимостей described"""
+    blocks = ''.join(f"<div><h3>2.{i}. {issue}</h3><h5>Finding</h5><p>{issue} found</p></div>"
+                     for i, issue in enumerate(described, 1))
+    rows = ''.join(f"<tr><td>{issue}</td><td>High</td><td>High</td><td>Easy</td><td>Quick</td>"
+                   f"<td>Fix {issue}</td></tr>" for issue in issues)
+    header = ''.join(f'<th>{name}</th>' for name in RECOMMENDATIONS_HEADER)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(f"<html><body>{blocks}<h2>Recommendations</h2><table><tr>{header}</tr>{rows}</table>"
+                f"</body></html>")
+    return path
+
+
+@pytest.fixture
+def settings(tmp_path):
+    from config import load_settings, ensure_directories
+
+    settings = load_settings(overrides={'BASIC_PATH': str(tmp_path), 'EXCLUDED_ISSUES': []}, environ={})
+    ensure_directories(settings)
+    return settings
+
+
+def make_run_record(run_id, scan_seconds, durations, workers=1, cpus=1, status='ok', config_bytes=None,
+                    nipper_build=None):
+    """Журнал запуска (run_record.RunRecord.data) с этапом scan и временем nipper по хостам"""
+    return {
+        'run_id': run_id,
+        'status': status,
+        'stages': {'scan': {'ok': True, 'duration': scan_seconds}},
+        'scan': {'configs': len(durations), 'jobs': len(durations), 'workers': workers, 'cpus': cpus,
+                 'durations': durations, 'config_bytes': config_bytes or {},
+                 'nipper_build': nipper_build},
+    }
+
+
+def save_run_records(record_dir, records):
+    import json
+
+    os.makedirs(record_dir, exist_ok=True)
+    for record in records:
+        with open(os.path.join(record_dir, f"run_{record['run_id']}.json"), 'w', encoding='utf-8') as f:
+            json.dump(record, f)
@@ -0,0 +1,17 @@
+import pytest
+
+from config import load_settings
+
+
+def test_invalid_shard_mode_is_value_error():
+    with pytest.raises(ValueError, match='SUMMARY_SHARD_BY'):
+        load_settings(overrides={'SUMMARY_SHARD_BY': 'bogus'}, environ={})
+
+
+def test_shard_mode_none_is_valid():
+    settings = load_settings(overrides={'SUMMARY_SHARD_BY': 'none'}, environ={})
+    assert settings.SUMMARY_SHARD_BY is None
+
+
+def test_default_nipper_engine_is_threads():
+    assert load_settings(environ={}).NIPPER_ENGINE == 'threads'
@@ -0,0 +1,33 @@
+import os
+
+from conftest import write_html_report
+from file_operations import compile_normalization_rules, group_equivalent_configs, normalize_config
+from pipeline import PipelineRun, publish_tier
+
+
+def test_no_rules_keep_content():
+    data = b'hostname sw1  \r\nvlan 10\n'
+    assert normalize_config(data, *compile_normalization_rules([])) == data
+
+
+def test_trailing_whitespace_is_explicit_rule(tmp_path):
+    (tmp_path / 'a.txt').write_bytes(b'; Ver #1\nhostname sw\nvlan 10\n')
+    (tmp_path / 'b.txt').write_bytes(b'; Ver #2\nhostname sw  \r\nvlan 10\n')
+
+    assert group_equivalent_configs(str(tmp_path), [r'^; Ver #']) == {'a.txt': [], 'b.txt': []}
+    assert group_equivalent_configs(str(tmp_path), [r'^; Ver #', [r'\s+$', '']]) == {'a.txt': ['b.txt']}
+
+
+def test_failed_representative_report_is_not_fanned_out(settings):
+    # Отчет представителя остался от прошлого запуска, в этом запуске nipper завершился ошибкой
+    write_html_report(os.path.join(settings.REPORTS_DIR, 'sw1_report.html'), ['Weak Password'])
+    groups = {'sw1.txt': ['sw2.txt']}
+
+    run = PipelineRun(settings, stages=['scan'])
+    run.scanned = set()
+    publish_tier(run, 'core', ['sw1.txt', 'sw2.txt'], groups)
+    assert not os.path.exists(os.path.join(settings.REPORTS_DIR, 'sw2_report.html'))
+
+    run.scanned = {'sw1.txt'}
+    publish_tier(run, 'core', ['sw1.txt', 'sw2.txt'], groups)
+    assert os.path.exists(os.path.join(settings.REPORTS_DIR, 'sw2_report.html'))
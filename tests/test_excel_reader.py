@@ -0,0 +1,37 @@
+import math
+
+import pandas as pd
+import pytest
+
+from excel_reader import ExcelBook, peek_sheet, read_engine, read_header, read_sheet, sheet_names
+
+
+@pytest.fixture
+def workbook(tmp_path):
+    path = str(tmp_path / 'book.xlsx')
+    df = pd.DataFrame({'Issue': ['A', 'B', 'C'], '10.0.0.1': [1, None, 1], '10.0.0.2': [None, 1, None]})
+    with pd.ExcelWriter(path) as writer:
+        df.to_excel(writer, sheet_name='Summary', index=False)
+        pd.DataFrame({'Shard': ['x']}).to_excel(writer, sheet_name='Shards', index=False)
+    return path
+
+
+def test_header_and_peek(workbook):
+    assert sheet_names(workbook) == ['Summary', 'Shards']
+    assert read_header(workbook) == ['Issue', '10.0.0.1', '10.0.0.2']
+    header, rows = peek_sheet(workbook, 'Summary', nrows=1)
+    assert rows == [('A', 1, None)]
+
+
+@pytest.mark.parametrize('engine', sorted({'openpyxl', read_engine()}))
+def test_read_selected_columns(workbook, engine):
+    with ExcelBook(workbook, engine) as book:
+        df = book.read('Summary', ['Issue', '10.0.0.2'])
+    assert list(df.columns) == ['Issue', '10.0.0.2']
+    assert list(df['Issue']) == ['A', 'B', 'C']
+    assert math.isnan(df['10.0.0.2'][0]) and df['10.0.0.2'][1] == 1
+
+
+def test_missing_column_is_value_error(workbook):
+    with pytest.raises(ValueError, match='нет колонок'):
+        read_sheet(workbook, 'Summary', ['Issue', '10.0.0.9'])
@@ -0,0 +1,39 @@
+import os
+import logging
+
+from fingerprints import BACKFILL_FAILED_FILE, backfill_fingerprints
+
+
+def test_unreadable_report_is_not_retried(tmp_path, caplog):
+    results_dir, fingerprint_dir = str(tmp_path), str(tmp_path / 'fingerprints')
+    report = os.path.join(results_dir, 'scan_summary_20260101_120000.xlsx')
+    with open(report, 'wb') as f:
+        f.write(b'not a workbook')
+
+    with caplog.at_level(logging.WARNING):
+        assert backfill_fingerprints(results_dir, 'scan_summary', fingerprint_dir) == 0
+        assert backfill_fingerprints(results_dir, 'scan_summary', fingerprint_dir) == 0
+    assert len([r for r in caplog.records if 'Отпечаток не построен' in r.getMessage()]) == 1
+    assert os.path.exists(os.path.join(fingerprint_dir, BACKFILL_FAILED_FILE))
+
+    # Измененный отчет проверяется снова
+    with open(report, 'ab') as f:
+        f.write(b'!')
+    caplog.clear()
+    with caplog.at_level(logging.WARNING):
+        backfill_fingerprints(results_dir, 'scan_summary', fingerprint_dir)
+    assert len([r for r in caplog.records if 'Отпечаток не построен' in r.getMessage()]) == 1
+
+
+def test_backfill_creates_missing_fingerprint(tmp_path):
+    from fingerprints import list_fingerprints
+    from reporting import build_findings, export_final_report
+
+    results_dir, fingerprint_dir = str(tmp_path), str(tmp_path / 'fingerprints')
+    record = {'Issue': 'Weak Password', 'Overall': 'High', 'Impact': 'High', 'Ease': 'Easy',
+              'Fix': 'Quick', 'Recommendation': 'Fix'}
+    assert export_final_report(build_findings({'10.0.0.1': [record]}), results_dir, 'scan_summary')
+
+    assert backfill_fingerprints(results_dir, 'scan_summary', fingerprint_dir) == 1
+    assert len(list_fingerprints(fingerprint_dir)) == 1
+    assert backfill_fingerprints(results_dir, 'scan_summary', fingerprint_dir) == 0
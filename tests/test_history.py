@@ -0,0 +1,79 @@
+import sqlite3
+
+import pytest
+
+from fingerprints import build_fingerprint
+from history import apply_fingerprint, host_timeline, open_count_series, open_history, time_to_fix
+
+
+META = {issue: {'Overall': 'High'} for issue in ('Weak Password', 'Telnet Enabled')}
+
+
+def _fingerprint(host_issues):
+    issues = {}
+    for host, names in host_issues.items():
+        for name in names:
+            issues.setdefault(name, {})[host] = 1
+    return build_fingerprint(issues, META)
+
+
+@pytest.fixture
+def conn(tmp_path):
+    conn = open_history(str(tmp_path / 'history.sqlite'))
+    yield conn
+    conn.close()
+
+
+def test_intervals_open_and_close(conn):
+    assert apply_fingerprint(conn, _fingerprint({'10.0.0.1': ['Weak Password', 'Telnet Enabled']}),
+                             '20260101_000000')
+    assert apply_fingerprint(conn, _fingerprint({'10.0.0.1': ['Weak Password']}), '20260103_000000')
+    # Запуски добавляются только по возрастанию времени
+    assert not apply_fingerprint(conn, _fingerprint({}), '20260102_000000')
+
+    timeline = {row['Issue']: row for row in host_timeline(conn, '10.0.0.1')}
+    assert timeline['Telnet Enabled']['Fixed'] == '20260103_000000'
+    assert timeline['Telnet Enabled']['Days open'] == 2.0
+    assert timeline['Weak Password']['Fixed'] == ''
+    assert time_to_fix(conn) == [{'Issue': 'Telnet Enabled', 'Fixed count': 1, 'Mean days': 2.0,
+                                  'Median days': 2.0, 'Max days': 2.0}]
+    assert [point['Open'] for point in open_count_series(conn)] == [2, 1]
+
+
+def test_open_history_is_idempotent(tmp_path):
+    path = str(tmp_path / 'history.sqlite')
+    open_history(path).close()
+    open_history(path).close()
+    assert sqlite3.connect(path).execute("SELECT COUNT(*) FROM runs").fetchone()[0] == 0
+
+
+def test_host_missing_from_run_keeps_issues_open(conn):
+    fingerprint = _fingerprint({'A': ['Weak Password'], 'B': ['Weak Password']})
+    apply_fingerprint(conn, fingerprint, '20260101_000000')
+    # A не попал в запуск: его проблема не исправлена
+    apply_fingerprint(conn, _fingerprint({'B': ['Weak Password']}), '20260102_000000')
+    apply_fingerprint(conn, fingerprint, '20260103_000000')
+
+    timeline = host_timeline(conn, 'A')
+    assert len(timeline) == 1
+    assert timeline[0]['Fixed'] == '' and timeline[0]['Last seen'] == '20260103_000000'
+    assert time_to_fix(conn) == []
+
+
+def test_scanned_clean_host_closes_issues(conn):
+    apply_fingerprint(conn, _fingerprint({'A': ['Weak Password'], 'B': ['Weak Password']}), '20260101_000000')
+    # A в сводке, но без проблем
+    fingerprint = build_fingerprint({'Weak Password': {'B': 1}}, META, scanned=['A', 'B'])
+    apply_fingerprint(conn, fingerprint, '20260102_000000')
+
+    assert host_timeline(conn, 'A')[0]['Fixed'] == '20260102_000000'
+
+
+def test_findings_fingerprint_lists_clean_hosts():
+    from reporting import build_findings
+
+    record = {'Issue': 'Weak Password', 'Overall': 'High', 'Impact': 'High', 'Ease': 'Easy',
+              'Fix': 'Quick', 'Recommendation': 'Fix'}
+    findings = build_findings({'A': [record], 'B': []})
+    assert findings.fingerprint()['scanned'] == ['A', 'B']
+    assert findings.subset(['B']).scanned_hosts == {'B'}
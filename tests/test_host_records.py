@@ -0,0 +1,42 @@
+import os
+import logging
+
+from conftest import write_html_report
+from host_records import DescribedIssues, HostRecords, record_report
+from report_store import HostIndex
+from task_distribution import issue_description
+
+
+ISSUES = ['Weak Password', 'Telnet Enabled']
+
+
+def test_each_description_recorded_once(tmp_path, caplog):
+    reports_dir, record_dir = str(tmp_path), str(tmp_path / '.findings')
+    described = DescribedIssues()
+    reports = [write_html_report(os.path.join(reports_dir, f'10.0.0.{i}_report.html'), ISSUES, ['Weak Password'])
+               for i in (1, 2, 3)]
+
+    with caplog.at_level(logging.WARNING):
+        for report in reports:
+            assert len(record_report(report, record_dir, described)) == 2
+
+    records = HostRecords(record_dir)
+    recorded = [issue for report in reports for issue in records.get(report)['descriptions']]
+    assert recorded == ['Weak Password']
+    # Описания нет ни в одном отчете - предупреждение одно
+    missing = [r for r in caplog.records if 'Telnet Enabled' in r.getMessage()]
+    assert len(missing) == 1
+
+
+def test_issue_description_found_in_other_host_record(tmp_path):
+    reports_dir, record_dir = str(tmp_path), str(tmp_path / '.findings')
+    described = DescribedIssues()
+    first = write_html_report(os.path.join(reports_dir, '10.0.0.1_report.html'), ISSUES, ['Weak Password'])
+    second = write_html_report(os.path.join(reports_dir, '10.0.0.2_report.html'), ISSUES)
+    record_report(first, record_dir, described)
+    record_report(second, record_dir, described)
+
+    # Отчет первого хоста из списка описания не содержит - оно берется из записи другого
+    description = issue_description('Weak Password', 'fix', ['10.0.0.2', '10.0.0.1'], reports_dir,
+                                    HostIndex(reports_dir), HostRecords(record_dir))
+    assert 'Weak Password found' in description
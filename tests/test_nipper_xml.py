@@ -0,0 +1,49 @@
+import nipper_xml
+from nipper_xml import extract_vulnerability_descriptions_from_xml
+
+
+REPORT = '''<document>
+  <section title="2. Security Audit">
+    <section title="2.1. Clear Text Telnet Service Enabled">
+      <section title="Finding"><text>Telnet is enabled</text></section>
+    </section>
+    <section title="2.2. Weak Password Policy">
+      <section title="Finding"><text>Short passwords</text></section>
+      <section title="Recommendation"><text>Use longer passwords</text></section>
+    </section>
+  </section>
+</document>
+'''
+
+
+def test_descriptions_of_nested_sections(tmp_path):
+    path = tmp_path / '10.0.0.1_report.xml'
+    path.write_text(REPORT)
+
+    found = extract_vulnerability_descriptions_from_xml(str(path), ['Weak Password Policy', 'weak password'])
+    assert 'Short passwords' in found['Weak Password Policy']
+    assert 'Use longer passwords' in found['Weak Password Policy']
+    assert 'Short passwords' in found['weak password']
+
+
+def test_non_matching_sections_cleared_before_match(tmp_path, monkeypatch):
+    path = tmp_path / '10.0.0.1_report.xml'
+    path.write_text(REPORT)
+    parsed = []
+    iterparse = nipper_xml.ET.iterparse
+
+    def recording_iterparse(source, events):
+        for event, element in iterparse(source, events):
+            if event == 'start' and 'Telnet' in element.get('title', ''):
+                parsed.append(element)
+            yield event, element
+
+    def format_section(element):
+        # Секция Telnet не совпала и уже освобождена, хотя ее родитель еще открыт
+        assert [len(telnet) for telnet in parsed] == [0]
+        return 'description'
+
+    monkeypatch.setattr(nipper_xml.ET, 'iterparse', recording_iterparse)
+    monkeypatch.setattr(nipper_xml, '_format_section', format_section)
+    assert extract_vulnerability_descriptions_from_xml(str(path), ['Weak Password Policy']) == {
+        'Weak Password Policy': 'description'}
@@ -0,0 +1,17 @@
+import os
+
+from conftest import write_html_report
+from excel_reader import read_header
+from pipeline import PipelineRun, publish_tier
+
+
+def test_publish_tier_includes_non_ip_hosts(settings):
+    for host in ('10.0.0.1', 'core-sw1'):
+        write_html_report(os.path.join(settings.REPORTS_DIR, f'{host}_report.html'), ['Weak Password'])
+
+    run = PipelineRun(settings, stages=['summarize'])
+    publish_tier(run, 'core', ['10.0.0.1.txt', 'core-sw1.txt'])
+
+    entry = run.record.data['tiers']['core']
+    assert entry['hosts'] == 2
+    assert {'10.0.0.1', 'core-sw1'} <= set(read_header(entry['summary']))
@@ -0,0 +1,45 @@
+import json
+import os
+
+from conftest import make_run_record, save_run_records
+from planner import evaluate_plan, host_durations, load_history, recommend_workers, simulate_scan
+
+
+def test_simulate_scan_fills_free_workers():
+    assert simulate_scan([4, 2, 2], workers=2, cpus=2) == 4
+    assert simulate_scan([4, 2, 2], workers=1, cpus=1) == 8
+    # Потоков больше, чем ядер: задачи замедляются
+    assert simulate_scan([4, 4], workers=2, cpus=1) == 8
+    assert simulate_scan([], workers=4, cpus=4) == 0.0
+
+
+def test_recommend_smallest_workers_within_tolerance():
+    assert recommend_workers({1: 100, 2: 50, 3: 49, 4: 49}) == 2
+
+
+def test_history_skips_failed_runs_and_normalises_durations(tmp_path):
+    record_dir = str(tmp_path)
+    save_run_records(record_dir, [
+        make_run_record('20260101_000001', 10, {'10.0.0.1': 8}, workers=4, cpus=2),
+        make_run_record('20260101_000002', 10, {'10.0.0.1': 100}, status='failed'),
+        make_run_record('20260101_000003', 10, {'10.0.0.1': 4}),
+    ])
+    records = load_history(record_dir)
+    assert [record['run_id'] for record in records] == ['20260101_000001', '20260101_000003']
+    assert host_durations(records) == {'10.0.0.1': 4}
+
+
+def test_evaluate_plan_once(tmp_path):
+    record_dir = str(tmp_path)
+    plan = {'plan_id': '20260101_000000', 'workers': 2, 'predicted': {'scan': 10.0},
+            'scan_by_workers': {'1': 20.0, '2': 10.0}}
+    path = os.path.join(record_dir, 'plan_20260101_000000.json')
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(plan, f)
+
+    # Фактический запуск - в одном потоке: сравнивается с прогнозом для одного потока
+    record = make_run_record('20260101_000100', 25.0, {'10.0.0.1': 25})
+    check = evaluate_plan(record, record_dir)
+    assert check['stages']['scan'] == {'predicted': 20.0, 'actual': 25.0, 'error_pct': 25.0}
+    assert record['plan_check'] is check
+    assert evaluate_plan(make_run_record('20260101_000200', 25.0, {}), record_dir) is None
@@ -0,0 +1,69 @@
+import os
+import json
+
+from conftest import make_run_record, save_run_records
+from regressions import check_regressions, detect_regressions
+
+
+def _history():
+    return [make_run_record(f'20260101_00000{i}', 100, {'10.0.0.1': 10, '10.0.0.2': 1},
+                            config_bytes={'10.0.0.1': 1000}, nipper_build=[1, 1])
+            for i in range(3)]
+
+
+def test_slow_host_and_stage_are_flagged():
+    record = make_run_record('20260102_000000', 200, {'10.0.0.1': 30, '10.0.0.2': 1.5},
+                             config_bytes={'10.0.0.1': 3000}, nipper_build=[1, 1])
+    report = detect_regressions(record, _history(), threshold_pct=50, min_seconds=5)
+
+    assert [item['stage'] for item in report['stages']] == ['scan']
+    # 10.0.0.2 вырос на 50%, но меньше чем на min_seconds
+    assert [item['host'] for item in report['hosts']] == ['10.0.0.1']
+    assert report['hosts'][0]['change_pct'] == 200.0
+    assert report['hosts'][0]['config_change_pct'] == 200.0
+    assert not report['nipper_build_changed']
+
+
+def test_host_durations_compared_per_core():
+    # Вдвое больше потоков, чем ядер: время задачи вдвое больше без деградации
+    record = make_run_record('20260102_000000', 100, {'10.0.0.1': 20, '10.0.0.2': 2}, workers=2, cpus=1,
+                             nipper_build=[2, 2])
+    report = detect_regressions(record, _history(), threshold_pct=50, min_seconds=5)
+    assert report['hosts'] == []
+    assert report['nipper_build_changed']
+
+
+def test_check_regressions_writes_report(tmp_path):
+    record_dir = str(tmp_path)
+    save_run_records(record_dir, _history() + [make_run_record('20260101_000009', 100, {}, status='failed')])
+    record = make_run_record('20260102_000000', 100, {'10.0.0.1': 30, '10.0.0.2': 1})
+
+    report = check_regressions(record, record_dir, baseline_runs=10, threshold_pct=50, min_seconds=5)
+
+    assert len(report['baseline_runs']) == 3
+    assert record['regressions']['hosts'] == 1
+    with open(record['regressions']['report'], encoding='utf-8') as f:
+        assert json.load(f)['hosts'][0]['host'] == '10.0.0.1'
+
+
+def test_no_history_no_report(tmp_path):
+    record = make_run_record('20260102_000000', 100, {'10.0.0.1': 30})
+    assert check_regressions(record, str(tmp_path)) is None
+    assert 'regressions' not in record and os.listdir(tmp_path) == []
+
+
+def test_stages_compared_per_unit_of_work():
+    history = _history()
+    for record in history:
+        record['stages']['ingest'] = {'ok': True, 'duration': 10}
+        record['ingest'] = {'configs': 100}
+    # Вдвое больше устройств: этапы вдвое дольше при той же скорости
+    record = make_run_record('20260102_000000', 200, {f'10.0.0.{i}': 1 for i in range(4)})
+    record['stages']['ingest'] = {'ok': True, 'duration': 20}
+    record['ingest'] = {'configs': 200}
+    assert detect_regressions(record, history, threshold_pct=50, min_seconds=5)['stages'] == []
+
+    record['stages']['ingest']['duration'] = 40
+    [stage] = detect_regressions(record, history, threshold_pct=50, min_seconds=5)['stages']
+    assert (stage['stage'], stage['baseline'], stage['change_pct']) == ('ingest', 20.0, 100.0)
+    assert (stage['rate'], stage['baseline_rate']) == (0.2, 0.1)
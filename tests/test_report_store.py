@@ -0,0 +1,46 @@
+import os
+
+from conftest import write_html_report
+from report_store import HostIndex, list_reports, store_report
+
+
+def test_store_report_removes_stale_variants(tmp_path):
+    reports_dir = str(tmp_path)
+    stale = write_html_report(os.path.join(reports_dir, '10.0.0.1_report.html'), ['Old Issue'])
+    xml = os.path.join(reports_dir, '10.0.0.1_report.xml')
+    with open(xml, 'w', encoding='utf-8') as f:
+        f.write('<document/>')
+    scratch = tmp_path / 'scratch'
+    scratch.mkdir()
+    fresh = write_html_report(str(scratch / '10.0.0.1_report.html'), ['New Issue'])
+
+    stored = store_report(fresh, 'gzip', dedup=True, reports_dir=reports_dir)
+
+    assert stored.endswith('10.0.0.1_report.html.gz')
+    assert not os.path.exists(stale) and not os.path.exists(xml)
+    assert list_reports(reports_dir) == [stored]
+
+
+def test_uncompressed_report_replaces_compressed(tmp_path):
+    reports_dir = str(tmp_path)
+    compressed = store_report(write_html_report(os.path.join(reports_dir, '10.0.0.1_report.html'), ['A']),
+                              'gzip', dedup=False)
+    stored = store_report(write_html_report(os.path.join(reports_dir, '10.0.0.1_report.html'), ['B']), None)
+
+    assert not os.path.exists(compressed)
+    assert list_reports(reports_dir) == [stored]
+
+
+def test_leftover_variants_resolve_to_newest(tmp_path):
+    # Варианты, оставшиеся от прежних настроек до этого исправления
+    reports_dir = str(tmp_path / 'reports')
+    os.makedirs(reports_dir)
+    old = write_html_report(os.path.join(reports_dir, 'core-sw1_report.html'), ['A'])
+    os.utime(old, (1_000_000, 1_000_000))
+    new = store_report(write_html_report(str(tmp_path / 'core-sw1_report.html'), ['B']), 'gzip', dedup=False)
+    new_in_reports = os.path.join(reports_dir, os.path.basename(new))
+    os.replace(new, new_in_reports)
+
+    assert os.path.exists(old)
+    assert list_reports(reports_dir) == [new_in_reports]
+    assert HostIndex(reports_dir).report('core-sw1') == new_in_reports
@@ -0,0 +1,54 @@
+import glob
+import logging
+import logging.handlers
+import os
+
+import pytest
+
+from reporting import build_findings, export_sharded_report
+import utils
+from utils import setup_logging, stop_logging
+
+
+@pytest.fixture
+def log_dir(tmp_path):
+    root = logging.getLogger()
+    handlers, level = root.handlers[:], root.level
+    log_dir = str(tmp_path / 'log')
+    setup_logging(log_dir, 'INFO', '%(levelname)s - %(message)s', '%H:%M:%S')
+    yield log_dir
+    stop_logging()
+    # Консольный обработчик пишет в поток, который pytest закроет
+    utils._log_handlers.clear()
+    root.handlers[:], root.level = handlers, level
+
+
+def test_shard_workers_log_to_main_log(tmp_path, log_dir, monkeypatch):
+    # Число процессов ограничено числом ядер
+    monkeypatch.setattr(os, 'cpu_count', lambda: 2)
+    record = {'Issue': 'Weak Password', 'Overall': 'High', 'Impact': 'High', 'Ease': 'Easy',
+              'Fix': 'Quick', 'Recommendation': 'Fix'}
+    findings = build_findings({'10.0.0.1': [record], '10.0.1.1': [record]})
+
+    path = export_sharded_report(findings, str(tmp_path), 'scan_summary', lambda host: host.rsplit('.', 1)[0],
+                                 workers=2, profile_top_n=3)
+    stop_logging()
+
+    assert path
+    with open(glob.glob(os.path.join(log_dir, '*.txt'))[0], encoding='utf-8') as f:
+        log = f.read()
+    # Отчет о памяти пишут рабочие процессы при завершении
+    assert log.count('Память процесса') == 2
+
+
+def test_repeated_setup_logging_keeps_one_queue_handler(tmp_path, log_dir, monkeypatch):
+    registered = []
+    monkeypatch.setattr(utils.atexit, 'register', registered.append)
+    root = logging.getLogger()
+    setup_logging(str(tmp_path / 'log2'), 'INFO', '%(message)s', '%H:%M:%S')
+
+    assert registered == []
+    queue_handlers = [h for h in root.handlers if isinstance(h, logging.handlers.QueueHandler)]
+    assert queue_handlers == [utils._root_queue_handler]
+    stop_logging()
+    assert not any(isinstance(h, logging.handlers.QueueHandler) for h in root.handlers)
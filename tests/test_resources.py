@@ -0,0 +1,26 @@
+import os
+import sys
+
+import pytest
+
+from nipper_processing import _run_nipper
+from resources import JobLimits, job_preexec_fn
+
+
+CHILD = 'import os, resource; print(resource.getrlimit(resource.RLIMIT_CPU)[0], os.getpriority(os.PRIO_PROCESS, 0))'
+
+
+@pytest.mark.skipif(os.name != 'posix', reason='setrlimit в дочернем процессе - только POSIX')
+def test_limits_set_in_child_before_exec(tmp_path):
+    log_path = tmp_path / 'job.log'
+    parent_nice = os.getpriority(os.PRIO_PROCESS, 0)
+    returncode, _ = _run_nipper([sys.executable, '-c', CHILD], str(log_path),
+                                JobLimits(cpu_seconds=600, nice=parent_nice + 3))
+
+    assert returncode == 0
+    assert log_path.read_text().split() == ['600', str(parent_nice + 3)]
+
+
+def test_nothing_to_set_in_child():
+    assert job_preexec_fn(None) is None
+    assert job_preexec_fn(JobLimits(low_io=True)) is None
@@ -0,0 +1,99 @@
+import os
+import sys
+
+from file_operations import ingest_sources
+from nipper_processing import process_single_file
+from scratch import ScratchWorkspace, move_files
+
+
+MB = 1024 * 1024
+
+
+def test_reserve_within_budget_then_spill(tmp_path):
+    scratch = ScratchWorkspace(str(tmp_path), budget_mb=2)
+    assert scratch and os.path.isdir(scratch.path)
+
+    assert scratch.reserve(MB)
+    assert scratch.reserve(MB)
+    assert not scratch.reserve(1)
+    scratch.release(MB)
+    assert scratch.reserve(MB)
+
+    stats = scratch.stats()
+    assert (stats['staged'], stats['spilled'], stats['peak_mb']) == (3, 1, 2.0)
+    path = scratch.path
+    scratch.cleanup()
+    assert not os.path.exists(path) and not scratch
+
+
+def test_disabled_without_root():
+    scratch = ScratchWorkspace('', budget_mb=1024)
+    assert not scratch
+    assert not scratch.reserve(1)
+
+
+def test_report_estimate_follows_largest_observed(tmp_path):
+    scratch = ScratchWorkspace(str(tmp_path), budget_mb=64)
+    scratch.observe_report(100)
+    assert scratch.report_estimate == 100
+    scratch.observe_report(50)
+    scratch.observe_report(300)
+    assert scratch.report_estimate == 300
+    scratch.cleanup()
+
+
+def test_move_files_replaces_existing(tmp_path):
+    source, target = tmp_path / 'src', tmp_path / 'dst'
+    source.mkdir()
+    target.mkdir()
+    (source / 'a.txt').write_text('new')
+    (source / 'b.log').write_text('skip')
+    (target / 'a.txt').write_text('old')
+
+    assert move_files(str(source), str(target), '.txt') == 1
+    assert (target / 'a.txt').read_text() == 'new'
+    assert sorted(os.listdir(source)) == ['b.log']
+
+
+def _fake_nipper(tmp_path, scratch_dir):
+    # Запись в рабочую папку завершается ошибкой, как при нехватке места в tmpfs
+    script = tmp_path / 'nipper'
+    script.write_text(f'''#!{sys.executable}
+import sys
+output = [a.split('=', 1)[1] for a in sys.argv if a.startswith('--output=')][0]
+if output.startswith({str(scratch_dir)!r}):
+    sys.exit('No space left on device')
+open(output, 'w').write('<html></html>')
+''')
+    script.chmod(0o755)
+    return str(script)
+
+
+def test_job_retried_on_disk_when_scratch_is_full(tmp_path, monkeypatch):
+    configs, reports, logs = tmp_path / 'configs', tmp_path / 'reports', tmp_path / 'logs'
+    for path in (configs, reports, logs):
+        path.mkdir()
+    (configs / 'sw1.txt').write_text('hostname sw1\n')
+    scratch = ScratchWorkspace(str(tmp_path / 'shm'), budget_mb=64)
+    monkeypatch.setattr(scratch, 'exhausted', lambda: True)
+
+    args = ('sw1.txt', str(configs), str(reports), _fake_nipper(tmp_path, tmp_path / 'shm'), '--ios-router',
+            None, False, 'html', (), str(logs), None, None, 0, None, None, scratch, None)
+    assert process_single_file(args)
+    assert os.listdir(reports) == ['sw1_report.html']
+    assert (scratch.stats()['retried'], scratch.used) == (1, 0)
+    scratch.cleanup()
+
+
+def test_sources_ingest_through_scratch(tmp_path):
+    source, configs = tmp_path / 'net', tmp_path / 'configs'
+    source.mkdir()
+    (source / '10.0.0.1_sw1.cfg').write_text('hostname sw1\n')
+    scratch = ScratchWorkspace(str(tmp_path / 'shm'), budget_mb=64)
+
+    stats = ingest_sources([{'name': 'net', 'path': str(source), 'mode': 'recent_files', 'max_age_days': 1,
+                             'max_mb_per_sec': 0, 'workers': 1}], str(configs), scratch)
+    assert stats[0]['files'] == 1
+    assert os.listdir(configs) == ['10.0.0.1.txt']
+    assert (scratch.stats()['staged'], scratch.used) == (1, 0)
+    scratch.cleanup()
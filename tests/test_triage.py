@@ -0,0 +1,27 @@
+import re
+import logging
+
+import config
+from triage import analyze_config, compile_rules
+
+
+def test_default_rules_not_excluded_by_default():
+    for rule in config.TRIAGE_RULES:
+        assert not any(re.search(pattern, rule['Issue']) for pattern in config.EXCLUDED_ISSUES), rule['Issue']
+
+
+def test_excluded_rule_is_reported(caplog):
+    with caplog.at_level(logging.WARNING):
+        rules = compile_rules(config.TRIAGE_RULES, [r'^SNMP Community'])
+    assert len(rules) == len(config.TRIAGE_RULES)
+    warnings = [r.getMessage() for r in caplog.records]
+    assert len(warnings) == 1 and 'SNMP Community String Configured' in warnings[0]
+
+
+def test_default_rules_on_procurve_config(tmp_path):
+    path = tmp_path / '10.0.0.1.txt'
+    path.write_text('hostname "sw1"\nsnmp-server community "public" unrestricted\n'
+                    'logging 10.1.1.1\npassword minimum-length 12\n', encoding='utf-8')
+    issues = {record['Issue'] for record in analyze_config(str(path), compile_rules(config.TRIAGE_RULES))}
+    assert issues == {'Clear Text HTTP Service Enabled', 'SNMP Community String Configured',
+                      'Default SNMP Community String'}
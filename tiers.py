@@ -0,0 +1,102 @@
+import os
+import fnmatch
+import logging
+import ipaddress
+
+
+# Группа для хостов, не попавших ни в одну из заданных (PRIORITY_TIERS, SUMMARY_SITES)
+DEFAULT_TIER = 'other'
+
+
+class HostGroups:
+    """Разбиение хостов на именованные группы (уровни приоритета, площадки).
+
+    Группа задается списком адресов: IP-адрес ('10.0.0.1'), подсеть ('10.0.0.0/24')
+    или шаблон имени хоста ('10.1.*', 'core-*'). Хост относится к первой группе,
+    которой он соответствует; остальные хосты - к группе DEFAULT_TIER.
+    """
+    def __init__(self, group_specs):
+        self.names = []
+        self._rules = []
+        for spec in group_specs or []:
+            networks, patterns = [], []
+            for entry in spec.get('hosts', []):
+                try:
+                    networks.append(ipaddress.ip_network(entry, strict=False))
+                except ValueError:
+                    patterns.append(entry)
+            self.names.append(spec['name'])
+            self._rules.append((spec['name'], networks, patterns))
+        self.names.append(DEFAULT_TIER)
+
+    def __bool__(self):
+        return bool(self._rules)
+
+    def group_of(self, host):
+        """Группа хоста (host - IP-адрес или имя конфигурации без расширения)"""
+        try:
+            address = ipaddress.ip_address(host)
+        except ValueError:
+            address = None
+        for name, networks, patterns in self._rules:
+            if address is not None and any(address in network for network in networks):
+                return name
+            if any(fnmatch.fnmatch(host, pattern) for pattern in patterns):
+                return name
+        return DEFAULT_TIER
+
+    def split(self, files):
+        """Разбиение файлов конфигураций по группам: {группа: [файлы]} в порядке групп"""
+        result = {name: [] for name in self.names}
+        for filename in files:
+            result[self.group_of(os.path.splitext(filename)[0])].append(filename)
+        return {name: group_files for name, group_files in result.items() if group_files}
+
+
+class PriorityTiers(HostGroups):
+    """Уровни приоритета хостов (PRIORITY_TIERS); уровень DEFAULT_TIER обрабатывается последним"""
+    tier_of = HostGroups.group_of
+
+    def order(self, files):
+        """Файлы в порядке приоритета уровней (внутри уровня порядок сохраняется)"""
+        return [filename for tier_files in self.split(files).values() for filename in tier_files]
+
+
+def subnet_of(host, prefix=24):
+    """Подсеть хоста в виде '10.0.1.0_24' (DEFAULT_TIER для имен, не являющихся IP)"""
+    try:
+        return str(ipaddress.ip_network(f'{host}/{prefix}', strict=False)).replace('/', '_')
+    except ValueError:
+        return DEFAULT_TIER
+
+
+def host_shard_function(shard_by, subnet_prefix=24, sites=None):
+    """Функция хост -> имя части итогового отчета (SUMMARY_SHARD_BY) или None без разбиения"""
+    if shard_by == 'subnet':
+        return lambda host: subnet_of(host, subnet_prefix)
+    if shard_by == 'site':
+        return HostGroups(sites).group_of
+    return None
+
+
+class TierTracker:
+    """Отслеживание завершения уровней по мере выполнения задач сканирования.
+
+    tier_jobs - {уровень: задачи (файлы), которые нужно выполнить для уровня}.
+    on_tier_done(уровень) вызывается один раз, когда выполнены все задачи уровня
+    (успешно или нет). Задача может относиться к нескольким уровням, если при
+    дедупликации в одну группу попали хосты разных уровней.
+    """
+    def __init__(self, tier_jobs, on_tier_done):
+        self.pending = {tier: set(jobs) for tier, jobs in tier_jobs.items()}
+        self.on_tier_done = on_tier_done
+
+    def job_done(self, filename, ok=True):
+        for tier, jobs in list(self.pending.items()):
+            jobs.discard(filename)
+            if not jobs:
+                del self.pending[tier]
+                try:
+                    self.on_tier_done(tier)
+                except Exception as e:
+                    logging.exception(f"{'Ошибка обработки уровня:':<50} {tier}\n{str(e)}")
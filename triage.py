@@ -0,0 +1,127 @@
+import os
+import re
+import time
+import logging
+import argparse
+
+
+RECORD_FIELDS = ['Issue', 'Overall', 'Impact', 'Ease', 'Fix', 'Recommendation']
+
+
+class TriageRule:
+    """Правило быстрого анализа конфигурации.
+
+    Правило срабатывает, если в конфигурации есть строка, совпадающая с 'match',
+    или если нет ни одной строки, совпадающей с 'absent'. Поля записи
+    (Issue, Overall, Impact, Ease, Fix, Recommendation) берутся из описания правила.
+    """
+    def __init__(self, spec):
+        self.record = {field: spec.get(field, '') for field in RECORD_FIELDS}
+        if not self.record['Issue']:
+            raise ValueError("Правило быстрого анализа без поля 'Issue'")
+        if bool(spec.get('match')) == bool(spec.get('absent')):
+            raise ValueError(f"Правило '{self.record['Issue']}': нужно ровно одно из 'match' или 'absent'")
+        self.present = bool(spec.get('match'))
+        self.pattern = re.compile(spec.get('match') or spec.get('absent'))
+
+
+def compile_rules(rule_specs, excluded_issues=()):
+    """Компиляция описаний правил; некорректные правила пропускаются с предупреждением.
+
+    excluded_issues - EXCLUDED_ISSUES: о правилах, находки которых будут
+    исключены из отчета, выводится предупреждение.
+    """
+    rules = []
+    for spec in rule_specs:
+        try:
+            rules.append(TriageRule(spec))
+        except (ValueError, re.error) as e:
+            logging.warning(f"{'Некорректное правило анализа:':<50} {str(e)}")
+    for rule in rules:
+        for pattern in excluded_issues:
+            try:
+                if re.search(pattern, rule.record['Issue']):
+                    logging.warning(f"{'Правило анализа исключено EXCLUDED_ISSUES:':<50} {rule.record['Issue']}")
+                    break
+            except re.error:
+                break
+    return rules
+
+
+def analyze_config(path, rules):
+    """Построчный анализ одной конфигурации.
+
+    Возвращает список записей в формате extract_recommendations_from_html.
+    Файл читается потоком; проверка строки прекращается для уже совпавших правил.
+    """
+    pending = list(rules)
+    matched = set()
+    with open(path, 'r', encoding='utf-8', errors='replace') as f:
+        for line in f:
+            hits = [rule for rule in pending if rule.pattern.search(line)]
+            if hits:
+                matched.update(id(rule) for rule in hits)
+                pending = [rule for rule in pending if id(rule) not in matched]
+                if not pending:
+                    break
+
+    return [dict(rule.record) for rule in rules
+            if (id(rule) in matched) == rule.present]
+
+
+def triage_configs(configs_dir, rules, files=None):
+    """Быстрый анализ всех конфигураций в папке.
+
+    Возвращает словарь {хост: [записи]} (хост - имя файла без расширения).
+    """
+    try:
+        if files is None:
+            files = [f for f in os.listdir(configs_dir) if f.lower().endswith('.txt')]
+        if not files:
+            logging.warning(f"{'Файлы для быстрого анализа:':<50} не найдены")
+            return {}
+
+        start_time = time.time()
+        results = {}
+        for filename in files:
+            host = os.path.splitext(filename)[0]
+            try:
+                results[host] = analyze_config(os.path.join(configs_dir, filename), rules)
+            except OSError as e:
+                logging.error(f"{'Ошибка чтения конфигурации:':<50} {filename}\n{str(e)}")
+
+        elapsed = max(time.time() - start_time, 1e-6)
+        findings = sum(len(recs) for recs in results.values())
+        logging.info(f"{'Быстрый анализ:':<50} {len(results)} конфигураций, {findings} находок, "
+                     f"{len(results) / elapsed:.0f} конф./сек")
+        return results
+    except Exception as e:
+        logging.exception(f"{'Ошибка быстрого анализа:':<50} {str(e)}")
+        return {}
+
+
+def main():
+    from config import load_settings
+    from reporting import build_final_report
+
+    settings = load_settings()
+
+    parser = argparse.ArgumentParser(description='Быстрый анализ конфигураций без nipper')
+    parser.add_argument('configs_dir', nargs='?', default=settings.CONFIGS_DIR, help='Папка с конфигурациями (.txt)')
+    parser.add_argument('--no-report', action='store_true', help='Только вывести находки, без Excel-отчета')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+
+    results = triage_configs(args.configs_dir, compile_rules(settings.TRIAGE_RULES, settings.EXCLUDED_ISSUES))
+    if args.no_report:
+        for host, records in sorted(results.items()):
+            for record in records:
+                print(f"{host:<20} {record['Overall']:<10} {record['Issue']}")
+        return
+    build_final_report(results, settings.FINAL_RESULTS_DIR, settings.TRIAGE_REPORT_PREFIX,
+                       excluded_issues=settings.EXCLUDED_ISSUES)
+
+
+if __name__ == "__main__":
+    main()
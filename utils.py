@@ -4,40 +4,130 @@ import time
 import shutil
 import logging.handlers
 import sys
+import threading
+import queue
+import atexit
+from collections import deque
+
+def file_size(path):
+    """Размер файла в байтах (0, если файл недоступен)"""
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+def format_bytes(num):
+    """Человекочитаемый размер: 1.5 MB"""
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if abs(num) < 1024 or unit == 'GB':
+            return f"{num:.1f} {unit}" if unit != 'B' else f"{num:.0f} {unit}"
+        num /= 1024
 
 class ProgressBar:
-    """Класс для отображения прогресс-бара в консоли"""
-    def __init__(self, total, description="Прогресс", width=50):
+    """Прогресс-бар в консоли, безопасный для вызова из нескольких потоков.
+
+    Перерисовка выполняется не чаще раза в min_interval секунд; скорость
+    (элементы/сек, байты/сек) и ETA считаются по последним window секундам.
+    Если вывод не в терминал, вместо бара раз в log_interval секунд пишется
+    строка в лог. Результаты рабочих процессов учитываются через update()
+    в основном процессе (по мере получения результатов).
+    """
+    def __init__(self, total, description="Прогресс", width=50, min_interval=0.2,
+                 log_interval=10.0, window=10.0, stream=None):
         self.total = total
         self.description = description
         self.width = width
+        self.min_interval = min_interval
+        self.log_interval = log_interval
+        self.window = window
+        self.stream = stream or sys.stdout
+        self.is_tty = hasattr(self.stream, 'isatty') and self.stream.isatty()
         self.start_time = time.time()
         self.completed = 0
-        
-    def update(self, n=1):
-        """Обновить прогресс"""
-        self.completed += n
-        elapsed = time.time() - self.start_time
-        percent = self.completed / self.total
-        bar_length = int(self.width * percent)
-        bar = '█' * bar_length + '-' * (self.width - bar_length)
-        
-        # Расчет оставшегося времени
-        if percent > 0:
-            eta = elapsed * (1 - percent) / percent
-            eta_str = f"ETA: {eta:.1f}s"
+        self.bytes_done = 0
+        self._lock = threading.Lock()
+        self._last_draw = 0.0 if self.is_tty else self.start_time
+        self._samples = deque([(self.start_time, 0, 0)])
+        self._finished = False
+
+    def _rates(self, now):
+        """Скорость по скользящему окну: (элементов/сек, байт/сек)"""
+        self._samples.append((now, self.completed, self.bytes_done))
+        while len(self._samples) > 2 and now - self._samples[1][0] > self.window:
+            self._samples.popleft()
+        t0, items0, bytes0 = self._samples[0]
+        elapsed = max(now - t0, 1e-6)
+        return (self.completed - items0) / elapsed, (self.bytes_done - bytes0) / elapsed
+
+    def _line(self, now):
+        items_rate, bytes_rate = self._rates(now)
+        percent = self.completed / self.total if self.total else 1.0
+        if self.completed >= self.total:
+            eta_str = "ETA: 0s"
+        elif items_rate > 0:
+            eta_str = f"ETA: {(self.total - self.completed) / items_rate:.1f}s"
         else:
             eta_str = "ETA: ?"
-        
-        # Форматирование вывода
-        print(f"\r{self.description}: [{bar}] {percent:.0%} ({self.completed}/{self.total}) {eta_str}", end='')
-        
-        if self.completed == self.total:
-            print(f"\n{self.description} выполнено за {elapsed:.1f} секунд")
+        speed = f"{items_rate:.1f}/s"
+        if self.bytes_done:
+            speed += f", {format_bytes(bytes_rate)}/s"
+        return percent, f"({self.completed}/{self.total}) {speed} {eta_str}"
+
+    def update(self, n=1, nbytes=0):
+        """Обновить прогресс на n элементов (и nbytes обработанных байт)"""
+        with self._lock:
+            self.completed += n
+            self.bytes_done += nbytes
+            now = time.time()
+            done = self.completed >= self.total
+            interval = self.min_interval if self.is_tty else self.log_interval
+            if not done and now - self._last_draw < interval:
+                return
+            self._last_draw = now
+            percent, stats = self._line(now)
+
+            if self.is_tty:
+                bar_length = int(self.width * min(percent, 1.0))
+                bar = '█' * bar_length + '-' * (self.width - bar_length)
+                self.stream.write(f"\r{self.description}: [{bar}] {percent:.0%} {stats}")
+                self.stream.flush()
+            elif not done:
+                logging.info(f"{self.description + ':':<50} {percent:.0%} {stats}")
+
+            if done and not self._finished:
+                self._finish(now)
+
+    def _finish(self, now):
+        self._finished = True
+        elapsed = now - self.start_time
+        if self.is_tty:
+            self.stream.write(f"\n{self.description} выполнено за {elapsed:.1f} секунд\n")
+            self.stream.flush()
+        else:
+            logging.info(f"{self.description + ':':<50} выполнено за {elapsed:.1f} сек ({self.completed} шт.)")
+
+    def close(self):
+        """Завершение прогресса, если обработаны не все элементы (ошибки, прерывание)"""
+        with self._lock:
+            if not self._finished:
+                self._finish(time.time())
+
+# Обработчики логирования работают в отдельном потоке QueueListener: рабочие
+# потоки (и процессы) только кладут записи в очередь и не ждут записи на диск.
+_log_listeners = []
+_log_handlers = []
+_process_log_queue = None
+_root_queue_handler = None
+_stop_registered = False
+
 
 def setup_logging(log_dir, log_level, log_format, log_date_format, max_size=10*1024*1024, backup_count=5):
-    """Настройка системы логирования с ротацией"""
+    """Настройка системы логирования с ротацией через очередь (QueueHandler/QueueListener).
+
+    Повторный вызов заменяет предыдущую настройку."""
+    global _root_queue_handler, _stop_registered
     try:
+        stop_logging()
         os.makedirs(log_dir, exist_ok=True)
         log_file = os.path.join(log_dir, f"nipper_log_{time.strftime('%Y%m%d_%H%M%S')}.txt")
         
@@ -48,20 +138,29 @@ def setup_logging(log_dir, log_level, log_format, log_date_format, max_size=10*1
             backupCount=backup_count
         )
         
-        # Форматирование
+        # Форматирование (только у конечных обработчиков: QueueHandler передает готовое сообщение)
         formatter = logging.Formatter(log_format, log_date_format)
         handler.setFormatter(formatter)
+        console = logging.StreamHandler()
+        console.setFormatter(formatter)
+        _log_handlers[:] = [handler, console]
         
         # Уровень логирования
         log_level_value = getattr(logging, log_level.upper(), logging.INFO)
         
-        # Настройка базовой конфигурации
-        logging.basicConfig(
-            level=log_level_value,
-            handlers=[handler, logging.StreamHandler()],
-            format=log_format,
-            datefmt=log_date_format
-        )
+        # Корневой логгер пишет только в очередь
+        log_queue = queue.SimpleQueue()
+        listener = logging.handlers.QueueListener(log_queue, *_log_handlers, respect_handler_level=True)
+        listener.start()
+        _log_listeners.append(listener)
+        if not _stop_registered:
+            atexit.register(stop_logging)
+            _stop_registered = True
+
+        root = logging.getLogger()
+        root.setLevel(log_level_value)
+        _root_queue_handler = logging.handlers.QueueHandler(log_queue)
+        root.addHandler(_root_queue_handler)
         
         logging.info("="*80)
         logging.info(f"{'Логирование запущено':^80}")
@@ -74,6 +173,44 @@ def setup_logging(log_dir, log_level, log_format, log_date_format, max_size=10*1
         print(f"CRITICAL: Не удалось настроить логирование: {str(e)}")
         sys.exit(1)
 
+def get_process_log_queue():
+    """Очередь логирования для рабочих процессов (создается при первом вызове).
+
+    Передается в пул процессов вместе с init_worker_logging:
+    ProcessPoolExecutor(initializer=init_worker_logging, initargs=(get_process_log_queue(), level)).
+    """
+    global _process_log_queue
+    if _process_log_queue is None:
+        import multiprocessing
+        _process_log_queue = multiprocessing.Queue(-1)
+        listener = logging.handlers.QueueListener(_process_log_queue, *_log_handlers, respect_handler_level=True)
+        listener.start()
+        _log_listeners.append(listener)
+    return _process_log_queue
+
+def init_worker_logging(log_queue, log_level=logging.INFO):
+    """Инициализатор рабочего процесса: все записи лога отправляются в очередь основного процесса"""
+    root = logging.getLogger()
+    root.handlers[:] = [logging.handlers.QueueHandler(log_queue)]
+    root.setLevel(log_level)
+
+def stop_logging():
+    """Остановка слушателей очереди с записью всех накопленных сообщений"""
+    global _process_log_queue, _root_queue_handler
+    _process_log_queue = None
+    if _root_queue_handler:
+        # Без слушателя очередь никто не читает: записи в нее только копились бы
+        logging.getLogger().removeHandler(_root_queue_handler)
+        _root_queue_handler = None
+    while _log_listeners:
+        listener = _log_listeners.pop()
+        try:
+            listener.stop()
+        except Exception:
+            pass
+    for handler in _log_handlers:
+        handler.flush()
+
 def cleanup_directories(configs_dir, reports_dir):
     """Удаление временных папок"""
     try: